@@ -1,41 +1,243 @@
-from fastapi import APIRouter, HTTPException
-from typing import List, Dict
+import base64
+import binascii
+import json
+from pathlib import Path
 
-from app.models.schemas.frame import FrameResponse, FrameBatchAnalysis
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from typing import List, Dict, Optional
+
+from app.models.schemas.frame import AnalysisMode, FrameImageSize, FramePage, FrameResponse, FrameBatchAnalysis
 from app.services.frame.frame_service import FrameService
+from app.services.frame.contact_sheets import contact_sheet_packer
+from app.services.frame.frame_images import etag_matches, frame_image_etag, frame_image_store
 from app.core.config import settings
 from app.services.openai.openai_service import OpenAIService
+from app.services.cache.analysis_cache import analysis_cache
+from app.services.openai.frame_selector import frame_selector
+from app.services.openai.frame_captioner import FrameCaptioner, is_captioned
+from app.services.storage.storage_manager import storage_manager
 
 router = APIRouter()
 frame_service = FrameService()
 openai_service = OpenAIService()
+frame_captioner = FrameCaptioner(openai_service, frame_service)
 @router.get("/{video_id}", response_model=List[FrameResponse])
 async def get_frames(video_id: str):
+    storage_manager.touch(video_id)
     try:
         frames = await frame_service.get_frames_by_video_id(video_id)
         return [FrameResponse(**frame.dict()) for frame in frames]
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get frames: {str(e)}")
 
+@router.get("/{video_id}/page", response_model=FramePage)
+async def get_frames_page(
+    video_id: str,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    start: Optional[float] = Query(None, ge=0, description="Seconds, first timestamp included"),
+    end: Optional[float] = Query(None, ge=0, description="Seconds, last timestamp included")
+):
+    """Frames of a video in timestamp order, a page at a time, optionally within a time range"""
+    after = _decode_cursor(cursor) if cursor else None
+    storage_manager.touch(video_id)
+    frames, has_more = await frame_service.get_frames_page(video_id, limit, after, start, end)
+    return FramePage(
+        frames=frames,
+        next_cursor=_encode_cursor(frames[-1].timestamp) if has_more else None,
+        total=await frame_service.count_frames(video_id, start, end) if cursor is None else None
+    )
+
+def _encode_cursor(timestamp: float) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"after": timestamp}).encode()).decode().rstrip("=")
+
+def _decode_cursor(cursor: str) -> float:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return float(payload["after"])
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def _prepare_analysis(batch_analysis: FrameBatchAnalysis):
+    """Pick the analysis mode and frames for a request, and the cache key of its answer"""
+    storage_manager.touch(batch_analysis.video_id)
+    records = await frame_service.get_batch_frames(batch_analysis)
+    if batch_analysis.retrieve_frames:
+        # Follow-up questions only send the frames their captions and timestamps point to
+        records = await frame_captioner.retrieve(
+            records, batch_analysis.sequence_prompt, batch_analysis.language, batch_analysis.retrieve_top_k
+        )
+    # The threshold counts images sent, a contact sheet carries several frames
+    frames_per_image = settings.ANALYSIS_SHEET_COLUMNS * settings.ANALYSIS_SHEET_ROWS if batch_analysis.pack_frames else 1
+    image_count = -(-len(records) // frames_per_image)
+    analysis_mode = batch_analysis.analysis_mode or (
+        AnalysisMode.MAP_REDUCE if image_count > settings.ANALYSIS_MAP_REDUCE_THRESHOLD else AnalysisMode.SINGLE
+    )
+    # Map-reduce budgets each window call instead of the whole sequence
+    window_size = settings.ANALYSIS_WINDOW_SIZE if analysis_mode == AnalysisMode.MAP_REDUCE else None
+    selection = frame_selector.select(
+        records, batch_analysis.token_budget, batch_analysis.latency_budget, window_size, batch_analysis.pack_frames
+    )
+    cache_key = analysis_cache.make_key(
+        content_hashes=[
+            f"{record.content_hash or record.file_path}@{selection.max_size}/{selection.detail}"
+            for record in selection.frames
+        ],
+        prompt="\n".join([
+            analysis_mode.value, f"window={selection.window_size}", f"pack={selection.frames_per_image}",
+            batch_analysis.analysis_type, batch_analysis.description, batch_analysis.sequence_prompt
+        ]),
+        model=batch_analysis.model,
+        language=batch_analysis.language,
+        history=batch_analysis.messages[:-1]
+    )
+    return analysis_mode, selection, cache_key
+
+async def _encode_selection(selection):
+    if selection.frames_per_image > 1:
+        # Compositing decodes every frame, keep it off the event loop
+        return await run_in_threadpool(contact_sheet_packer.pack, selection.frames)
+    return await frame_service.encode_frames(selection.frames, selection.max_size, selection.detail)
+
 @router.post("/analyze", response_model=Dict)
 async def analyze_frames(batch_analysis: FrameBatchAnalysis):
     try:
-        frames = await frame_service.process_frames_batch(batch_analysis)
-        result = await openai_service.analyze_frames(frames, batch_analysis)
-        return result
+        analysis_mode, selection, cache_key = await _prepare_analysis(batch_analysis)
+        
+        if not batch_analysis.bypass_cache:
+            cached = analysis_cache.get(cache_key)
+            if cached is not None:
+                return {**cached, "cached": True}
+        
+        frames = await _encode_selection(selection)
+        if analysis_mode == AnalysisMode.MAP_REDUCE:
+            result = await openai_service.analyze_frames_map_reduce(frames, batch_analysis, selection.window_size)
+        else:
+            result = await openai_service.analyze_frames(frames, batch_analysis)
+            result["analysis_mode"] = analysis_mode.value
+        result["frame_selection"] = selection.summary()
+        openai_service.record_analysis(analysis_mode.value)
+        
+        # Bypassed requests still refresh the cache with their fresh answer
+        if result.get("status") == "success":
+            analysis_cache.set(cache_key, result)
+        return {**result, "cached": False}
+    except Exception as e:
+        print("error", e)
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to process frames batch: {str(e)}"
+        )
+
+@router.post("/analyze/stream")
+async def analyze_frames_stream(batch_analysis: FrameBatchAnalysis):
+    """
+    Server-Sent Events version of /analyze: "delta" events carry the answer
+    as the model writes it ("window" events report finished map-reduce
+    windows first), and a final "done" or "error" event carries the same
+    result /analyze returns.
+    """
+    try:
+        analysis_mode, selection, cache_key = await _prepare_analysis(batch_analysis)
     except Exception as e:
         print("error", e)
         raise HTTPException(
             status_code=500,
             detail=f"Failed to process frames batch: {str(e)}"
         )
+    
+    cached = None if batch_analysis.bypass_cache else analysis_cache.get(cache_key)
+    
+    async def event_stream():
+        if cached is not None:
+            yield _sse_event("delta", {"content": cached.get("sequence_analysis", "")})
+            yield _sse_event("done", {**cached, "cached": True})
+            return
+        
+        frames = await _encode_selection(selection)
+        if analysis_mode == AnalysisMode.MAP_REDUCE:
+            events = openai_service.analyze_frames_map_reduce_stream(frames, batch_analysis, selection.window_size)
+        else:
+            events = openai_service.analyze_frames_stream(frames, batch_analysis)
+        
+        async for event in events:
+            if event["type"] == "delta":
+                yield _sse_event("delta", {"content": event["content"]})
+            elif event["type"] == "window":
+                yield _sse_event("window", event["window"])
+            else:
+                result = {**event["result"], "analysis_mode": analysis_mode.value}
+                result["frame_selection"] = selection.summary()
+                openai_service.record_analysis(analysis_mode.value)
+                if result["status"] == "success":
+                    analysis_cache.set(cache_key, result)
+                yield _sse_event(event["type"], {**result, "cached": False})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _sse_event(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.post("/{video_id}/captions", response_model=Dict, status_code=202)
+async def caption_frames(video_id: str, background_tasks: BackgroundTasks, language: str = "English"):
+    """Describe the video's frames not yet captioned in ``language`` in the background, so follow-up questions can retrieve them"""
+    frames = await frame_service.get_frames_by_video_id(video_id)
+    if not frames:
+        raise HTTPException(status_code=404, detail="No frames found for this video")
+    storage_manager.touch(video_id)
+    
+    missing = sum(1 for frame in frames if not is_captioned(frame, language))
+    if missing:
+        background_tasks.add_task(frame_captioner.caption_frames, frames, language)
+    return {"video_id": video_id, "frames": len(frames), "captioned": len(frames) - missing, "pending": missing}
+
+@router.get("/analyze/cache", response_model=Dict)
+async def get_analysis_cache_stats():
+    return analysis_cache.stats()
 
 @router.get("/{video_id}/{frame_number}", response_model=FrameResponse)
 async def get_frame(video_id: str, frame_number: int):
-    frames = await frame_service.get_frames_by_video_id(video_id)
+    frame = await frame_service.get_frame_by_number(video_id, frame_number)
     
-    for frame in frames:
-        if frame.frame_number == frame_number:
-            return FrameResponse(**frame.dict())
+    if frame is None:
+        raise HTTPException(status_code=404, detail="Frame not found")
+    storage_manager.touch(video_id)
+    
+    return FrameResponse(**frame.dict()) 
+
+@router.get("/{video_id}/{frame_key}/image")
+async def get_frame_image(
+    video_id: str,
+    frame_key: str,
+    request: Request,
+    size: FrameImageSize = FrameImageSize.PREVIEW
+):
+    """Image of a frame, resized to thumb or preview on first request and cached on disk"""
+    frame = await frame_service.get_frame_by_key(video_id, frame_key)
+    if frame is None or frame.content_hash is None:
+        raise HTTPException(status_code=404, detail="Frame not found")
+    storage_manager.touch(video_id)
+    
+    etag = frame_image_etag(frame.content_hash, size)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={settings.FRAME_CACHE_MAX_AGE}"
+    }
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    
+    try:
+        # Resizing decodes the full frame, keep it off the event loop
+        path = await run_in_threadpool(frame_image_store.get, Path(frame.file_path), size)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     
-    raise HTTPException(status_code=404, detail="Frame not found") 
\ No newline at end of file
+    # Thumbnails and previews are always JPEG, full frames keep the video's frame format
+    media_type = "image/webp" if path.suffix == ".webp" else "image/jpeg"
+    return FileResponse(path, media_type=media_type, headers=headers)
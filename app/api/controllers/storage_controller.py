@@ -0,0 +1,17 @@
+from typing import Dict
+
+from fastapi import APIRouter
+from fastapi.concurrency import run_in_threadpool
+
+from app.services.storage.storage_manager import storage_manager
+
+router = APIRouter()
+
+@router.get("/usage", response_model=Dict)
+async def get_storage_usage():
+    # Walking the storage directories can take a while on large volumes
+    return await run_in_threadpool(storage_manager.usage)
+
+@router.post("/compact", response_model=Dict)
+async def compact_storage():
+    return await run_in_threadpool(storage_manager.compact)
@@ -1,74 +1,310 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks, Form, Body
-from typing import List, Optional
+import asyncio
+import time
+import uuid
+from collections import Counter
+
+from fastapi import APIRouter, UploadFile, File, HTTPException, Form, Body, Header, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from typing import Awaitable, Callable, List, Optional, Tuple
 from pathlib import Path
 
-from app.models.schemas.video import VideoCreate, VideoResponse, VideoProcessingStatus
+from app.models.schemas.video import (
+    BatchIngest, BatchIngestResponse, BatchStatus, FrameFormat, JobPriority, SamplingMode, VideoCreate,
+    VideoResponse, VideoProcessingStatus, VideoSource
+)
 from app.services.video.video_service import VideoService
+from app.services.jobs.job_runner import job_runner, QueueFullError
+from app.services.jobs.job_state_service import JobStateService, JobStatus
+from app.services.storage.storage_manager import storage_manager
 from app.core.config import settings
+from app.core.exceptions import UnsupportedVideoFormatError, VideoTooLargeError
 
 router = APIRouter()
 video_service = VideoService()
+frame_service = video_service.frame_service
+job_state_service = JobStateService()
 
 @router.post("/upload", response_model=VideoResponse)
 async def upload_video(
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     title: Optional[str] = None,
     description: Optional[str] = None,
-    frame_interval: Optional[int] = 10
+    frame_interval: Optional[int] = 10,
+    sampling_mode: SamplingMode = SamplingMode.INTERVAL,
+    frame_format: Optional[FrameFormat] = None,
+    frame_quality: Optional[int] = Query(None, ge=1, le=100),
+    frame_max_size: Optional[int] = Query(None, ge=0),
+    tenant: Optional[str] = Header(None, alias="X-Tenant-ID", max_length=64)
 ):
-
-    # Create video file path
-    file_path = settings.VIDEO_DIR / f"{file.filename}"
-    
-    # Save uploaded file
-    try:
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to save video: {str(e)}")
-    
-    # Create video record
+    """Multipart upload, received in full before this runs, /upload/raw stores large videos as they arrive"""
     video_create = VideoCreate(
         title=title or file.filename,
         description=description or "",
         source="upload",
-        frame_interval=frame_interval
+        frame_interval=frame_interval,
+        sampling_mode=sampling_mode,
+        frame_format=frame_format,
+        frame_quality=frame_quality,
+        frame_max_size=frame_max_size
+    )
+    return await _store_upload(lambda: video_service.store_upload(file), file.size, video_create, tenant)
+
+@router.post("/upload/raw", response_model=VideoResponse)
+async def upload_video_raw(
+    request: Request,
+    filename: str = Query(..., description="Name of the uploaded file, its extension gives the video format"),
+    title: Optional[str] = None,
+    description: Optional[str] = None,
+    frame_interval: Optional[int] = 10,
+    sampling_mode: SamplingMode = SamplingMode.INTERVAL,
+    frame_format: Optional[FrameFormat] = None,
+    frame_quality: Optional[int] = Query(None, ge=1, le=100),
+    frame_max_size: Optional[int] = Query(None, ge=0),
+    tenant: Optional[str] = Header(None, alias="X-Tenant-ID", max_length=64)
+):
+    """
+    Upload with the video as the request body. It is written to VIDEO_DIR as it
+    arrives, so MAX_VIDEO_SIZE_MB stops an oversized upload while receiving it.
+    """
+    content_length = request.headers.get("content-length")
+    size = int(content_length) if content_length and content_length.isdigit() else None
+    video_create = VideoCreate(
+        title=title or filename,
+        description=description or "",
+        source="upload",
+        frame_interval=frame_interval,
+        sampling_mode=sampling_mode,
+        frame_format=frame_format,
+        frame_quality=frame_quality,
+        frame_max_size=frame_max_size
+    )
+    return await _store_upload(
+        lambda: video_service.store_stream(request.stream(), filename, size), size, video_create, tenant
     )
+
+async def _store_upload(
+    store: Callable[[], Awaitable[Tuple[Path, str]]],
+    size: Optional[int],
+    video_create: VideoCreate,
+    tenant: Optional[str]
+) -> VideoResponse:
+    # Reject before storing the file when extraction is saturated
+    try:
+        job_runner.ensure_capacity()
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    
+    # Evict least recently used data first, so extraction never runs out of disk halfway
+    if not await run_in_threadpool(storage_manager.make_room, size or 0):
+        raise HTTPException(status_code=507, detail="Not enough storage left for this video")
+
+    # Write the upload to disk in chunks, enforcing format and size limits
+    try:
+        file_path, content_hash = await store()
+    except UnsupportedVideoFormatError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except VideoTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to save video: {str(e)}")
     
-    video = await video_service.create_video(video_create, file_path, frame_interval)
+    video = await video_service.create_video(video_create, file_path, video_create.frame_interval, content_hash)
+    storage_manager.touch(video.alias_of or video.id)
     
-    # Process video in background
-    background_tasks.add_task(video_service.process_video, video)
+    # Process video in the extraction worker pool, duplicates already have their frames
+    if video.alias_of is None:
+        try:
+            job_runner.submit(video, JobPriority.INTERACTIVE, tenant)
+        except QueueFullError as e:
+            raise HTTPException(status_code=429, detail=str(e))
     
     return VideoResponse(**video.model_dump())
 
 @router.post("/youtube", response_model=VideoResponse)
 async def process_youtube_video(
-    background_tasks: BackgroundTasks,
-    video_create: VideoCreate
+    video_create: VideoCreate,
+    tenant: Optional[str] = Header(None, alias="X-Tenant-ID", max_length=64)
 ):
     if not video_create.youtube_url:
         raise HTTPException(status_code=400, detail="YouTube URL is required")
     
+    # The download runs in the extraction job, so this returns as soon as the job is queued
     try:
-        file_path = None
-        video = await video_service.create_video(video_create, file_path, video_create.frame_interval)
-        background_tasks.add_task(video_service.process_video, video)
+        job_runner.ensure_capacity()
+        video = await video_service.create_video(video_create, frame_interval=video_create.frame_interval)
+        storage_manager.touch(video.alias_of or video.id)
+        if video.alias_of is None:
+            job_runner.submit(video, JobPriority.INTERACTIVE, tenant)
         return VideoResponse(**video.model_dump())
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to process YouTube video: {str(e)}")
 
+@router.post("/batch", response_model=BatchIngestResponse)
+async def ingest_batch(
+    batch: BatchIngest,
+    tenant: Optional[str] = Header(None, alias="X-Tenant-ID", max_length=64)
+):
+    """
+    Queue YouTube URLs and the videos of a directory under BATCH_INGEST_ROOT
+    in one batch, at bulk priority unless the request says otherwise. Items
+    that can't be queued are listed under "rejected", the rest still are.
+    """
+    paths = []
+    if batch.directory is not None:
+        try:
+            paths = await run_in_threadpool(_directory_videos, batch.directory, batch.recursive)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    if not paths and not batch.urls:
+        raise HTTPException(status_code=400, detail="No URLs or videos to ingest")
+    
+    response = BatchIngestResponse(batch_id=str(uuid.uuid4()))
+    options = batch.model_dump(
+        include={"frame_interval", "sampling_mode", "frame_format", "frame_quality", "frame_max_size"}
+    )
+    for url in batch.urls:
+        video_create = VideoCreate(
+            title=str(url)[:255],
+            description=batch.description or "",
+            source=VideoSource.YOUTUBE,
+            youtube_url=url,
+            **options
+        )
+        await _ingest(response, str(url), video_create, batch.priority, tenant)
+    
+    for path in paths:
+        video_create = VideoCreate(
+            title=path.name, description=batch.description or "", source=VideoSource.UPLOAD, **options
+        )
+        try:
+            job_runner.ensure_capacity(batch.priority)
+            if not await run_in_threadpool(storage_manager.make_room, path.stat().st_size):
+                raise OSError("Not enough storage left for this video")
+            # Hashing and copying whole files, keep it off the event loop
+            file_path, content_hash = await run_in_threadpool(video_service.store_file, path)
+        except (QueueFullError, OSError, UnsupportedVideoFormatError) as e:
+            response.rejected.append({"source": str(path), "error": str(e)})
+            continue
+        await _ingest(response, str(path), video_create, batch.priority, tenant, file_path, content_hash)
+    
+    return response
+
+@router.post("/batch/upload", response_model=BatchIngestResponse)
+async def upload_batch(
+    files: List[UploadFile] = File(...),
+    description: Optional[str] = None,
+    frame_interval: Optional[int] = 10,
+    sampling_mode: SamplingMode = SamplingMode.INTERVAL,
+    frame_format: Optional[FrameFormat] = None,
+    frame_quality: Optional[int] = Query(None, ge=1, le=100),
+    frame_max_size: Optional[int] = Query(None, ge=0),
+    priority: JobPriority = JobPriority.BULK,
+    tenant: Optional[str] = Header(None, alias="X-Tenant-ID", max_length=64)
+):
+    """Several uploads in one request, queued as one batch like /batch"""
+    response = BatchIngestResponse(batch_id=str(uuid.uuid4()))
+    for file in files:
+        video_create = VideoCreate(
+            title=file.filename or "Untitled",
+            description=description or "",
+            source=VideoSource.UPLOAD,
+            frame_interval=frame_interval,
+            sampling_mode=sampling_mode,
+            frame_format=frame_format,
+            frame_quality=frame_quality,
+            frame_max_size=frame_max_size
+        )
+        try:
+            job_runner.ensure_capacity(priority)
+            if not await run_in_threadpool(storage_manager.make_room, file.size or 0):
+                raise OSError("Not enough storage left for this video")
+            file_path, content_hash = await video_service.store_upload(file)
+        except (QueueFullError, OSError, UnsupportedVideoFormatError, VideoTooLargeError) as e:
+            response.rejected.append({"source": file.filename or "", "error": str(e)})
+            continue
+        await _ingest(response, file.filename or "", video_create, priority, tenant, file_path, content_hash)
+    
+    return response
+
+@router.get("/batch/{batch_id}", response_model=BatchStatus)
+async def get_batch_status(batch_id: str):
+    statuses = await run_in_threadpool(job_state_service.get_batch_statuses, batch_id)
+    if not statuses:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    
+    return BatchStatus(
+        batch_id=batch_id,
+        total=len(statuses),
+        counts=dict(Counter(status.status for status in statuses)),
+        videos=statuses
+    )
+
+async def _ingest(
+    response: BatchIngestResponse,
+    source: str,
+    video_create: VideoCreate,
+    priority: JobPriority,
+    tenant: Optional[str],
+    file_path: Optional[Path] = None,
+    content_hash: Optional[str] = None
+):
+    try:
+        job_runner.ensure_capacity(priority)
+        video = await video_service.create_video(
+            video_create, file_path, video_create.frame_interval, content_hash, batch_id=response.batch_id
+        )
+        storage_manager.touch(video.alias_of or video.id)
+        if video.alias_of is None:
+            job_runner.submit(video, priority, tenant)
+    except QueueFullError as e:
+        response.rejected.append({"source": source, "error": str(e)})
+        return
+    response.videos.append(VideoResponse(**video.model_dump()))
+
+def _directory_videos(directory: str, recursive: bool) -> List[Path]:
+    """Supported videos in a directory under BATCH_INGEST_ROOT, by name"""
+    if settings.BATCH_INGEST_ROOT is None:
+        raise ValueError("Directory ingestion is disabled, set BATCH_INGEST_ROOT to allow it")
+    root = settings.BATCH_INGEST_ROOT.resolve()
+    path = (root / directory).resolve()
+    if not path.is_relative_to(root):
+        raise ValueError(f"{directory} is outside BATCH_INGEST_ROOT")
+    if not path.is_dir():
+        raise ValueError(f"{directory} is not a directory")
+    
+    return sorted(
+        candidate for candidate in path.glob("**/*" if recursive else "*")
+        if candidate.is_file()
+        and not candidate.name.startswith(".")
+        and candidate.suffix.lower() in settings.SUPPORTED_VIDEO_FORMATS
+    )
+
+@router.post("/{video_id}/cancel", response_model=VideoProcessingStatus)
+async def cancel_video_processing(video_id: str):
+    if not job_runner.cancel(video_id):
+        raise HTTPException(status_code=404, detail="No queued or running extraction for this video")
+    
+    return VideoProcessingStatus(
+        video_id=video_id,
+        status="cancelling",
+        message="Extraction cancellation requested"
+    )
+
 @router.get("/{video_id}/status", response_model=VideoProcessingStatus)
 async def get_video_status(video_id: str):
-    # In a real application, this would check the processing status in the database
-    # For now, we'll check if frames exist
-    frame_pattern = f"{video_id}_*.jpg"
-    frames = list(settings.FRAME_DIR.glob(frame_pattern))
+    status = job_state_service.get_status(video_id)
+    if status is not None:
+        return status
+    return await _untracked_status(video_id)
 
+async def _untracked_status(video_id: str) -> VideoProcessingStatus:
+    # Videos extracted before job tracking existed only have their frames to go by
+    frame_count = await frame_service.count_frames(video_id)
     
-    if not frames:
+    if not frame_count:
         return VideoProcessingStatus(
             video_id=video_id,
             status="pending",
@@ -80,13 +316,55 @@ async def get_video_status(video_id: str):
         video_id=video_id,
         status="completed",
         progress=100.0,
-        message=f"Processing completed. {len(frames)} frames extracted"
+        message=f"Processing completed. {frame_count} frames extracted"
+    )
+
+@router.get("/{video_id}/events")
+async def stream_video_status(video_id: str):
+    """Server-Sent Events stream of processing status, closed once processing ends"""
+    if (
+        job_state_service.get_status(video_id) is None
+        and await video_service.get_video(video_id) is None
+        and not await frame_service.count_frames(video_id)
+    ):
+        # An unknown id would report "pending" forever
+        raise HTTPException(status_code=404, detail="Video not found")
+    
+    async def event_stream():
+        last_payload = None
+        last_sent = started = time.monotonic()
+        while True:
+            status = job_state_service.get_status(video_id)
+            # Without a job only a submit racing this request can still change the status
+            untracked = status is None
+            if untracked:
+                status = await _untracked_status(video_id)
+            payload = status.model_dump_json()
+            
+            if payload != last_payload:
+                yield f"event: status\ndata: {payload}\n\n"
+                last_payload = payload
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= 15:
+                # Comment line keeps proxies from closing an idle connection
+                yield ": keep-alive\n\n"
+                last_sent = time.monotonic()
+            
+            if status.status in JobStatus.TERMINAL:
+                break
+            if untracked and time.monotonic() - started >= settings.PROGRESS_UNTRACKED_TIMEOUT:
+                break
+            await asyncio.sleep(settings.PROGRESS_POLL_INTERVAL)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
 @router.get("/{video_id}/frames", response_model=List[str])
 async def get_video_frames(video_id: str):
-    frame_pattern = f"{video_id}_*.jpg"
-    frames = list(settings.FRAME_DIR.glob(frame_pattern))
-    # Sort frames by numeric postfix
-    sorted_frames = sorted(frames, key=lambda x: int(x.stem.split('_')[-1]))
-    return [str(frame) for frame in sorted_frames]
\ No newline at end of file
+    storage_manager.touch(video_id)
+    # Frames come back from the index already ordered by timestamp
+    frames = await frame_service.get_frames_by_video_id(video_id)
+    return [frame.file_path for frame in frames]
@@ -0,0 +1,61 @@
+import json
+import time
+
+from app.core.config import settings
+from app.core.metrics import RequestTiming, metrics, request_timing
+
+http_request_seconds = metrics.histogram(
+    "http_request_seconds",
+    "Time to handle HTTP requests, including streamed response bodies",
+    ("method", "route", "status")
+)
+
+
+class RequestTimingMiddleware:
+    """
+    Times every HTTP request and logs it as one JSON line with the pipeline
+    stages it went through.
+
+    A plain ASGI middleware rather than BaseHTTPMiddleware, so streamed
+    responses (Server-Sent Events) are timed until their last chunk.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        timing = RequestTiming()
+        token = request_timing.set(timing)
+        started = time.perf_counter()
+        status = 500
+        
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            request_timing.reset(token)
+            elapsed = time.perf_counter() - started
+            # Route templates rather than paths keep one series per endpoint
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            http_request_seconds.observe(elapsed, method=scope["method"], route=route_path, status=status)
+            if settings.REQUEST_TIMING_LOG and scope["path"] not in settings.REQUEST_TIMING_LOG_EXCLUDE:
+                print(json.dumps({
+                    "event": "request",
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "route": route_path,
+                    "status": status,
+                    "duration_ms": round(elapsed * 1000, 2),
+                    "stages_ms": {name: round(seconds * 1000, 2) for name, seconds in timing.stages.items()},
+                    **({"counts": timing.counts} if timing.counts else {})
+                }))
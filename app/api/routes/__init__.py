@@ -1,2 +1,3 @@
 from app.api.controllers.video_controller import router as video_router
-from app.api.controllers.frame_controller import router as frame_router 
\ No newline at end of file
+from app.api.controllers.frame_controller import router as frame_router
+from app.api.controllers.storage_controller import router as storage_router 
\ No newline at end of file
@@ -16,14 +16,127 @@ class Settings(BaseSettings):
     STORAGE_DIR: Path = BASE_DIR / "storage"
     VIDEO_DIR: Path = STORAGE_DIR / "videos"
     FRAME_DIR: Path = STORAGE_DIR / "frames"
+    DATABASE_PATH: Path = STORAGE_DIR / "metadata.db"
     
     # Video processing settings
     FRAME_INTERVAL: int = 10  # Extract frame every 10 seconds
     MAX_VIDEO_SIZE_MB: int = 500
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024  # Bytes read per chunk when streaming uploads to disk
     SUPPORTED_VIDEO_FORMATS: set = {".mp4", ".avi", ".mov", ".mkv"}
+    EXTRACTION_MODE: str = "auto"  # "auto", "seek" or "sequential"
+    EXTRACTION_GOP_SIZE: Optional[int] = None  # Keyframe spacing in frames, estimated when unset
+    VIDEO_DECODER_BACKEND: str = "opencv"  # "opencv", "pyav" (needs the av package) or "ffmpeg"
+    VIDEO_DECODER_KEYFRAMES_ONLY: bool = True  # pyav/ffmpeg: use the keyframe at or before each sample
+    FFMPEG_PATH: str = "ffmpeg"
+    EXTRACTION_WORKERS: Optional[int] = None  # Extraction processes, defaults to the CPU count
+    EXTRACTION_QUEUE_SIZE: int = 8  # Interactive jobs allowed to wait for a worker before uploads get 429
+    EXTRACTION_BULK_QUEUE_SIZE: int = 10000  # Bulk ingestion jobs allowed to wait, queued in the database
+    EXTRACTION_TENANT_MAX_RUNNING: int = 0  # Jobs one tenant may run at once, 0 only limits by workers
+    BATCH_INGEST_ROOT: Optional[Path] = None  # Server directory batch ingestion may read from, unset disables it
+    EXTRACTION_SHARDING: bool = True  # Split long videos into time ranges extracted in parallel
+    EXTRACTION_SHARD_MIN_DURATION: int = 600  # Only shard videos at least this many seconds long
+    # Threads per job, capped at the cores not taken by the other running jobs (one core each)
+    # when the job starts, so a job running alone shards over every core
+    EXTRACTION_MAX_SHARDS: Optional[int] = None
+    EXTRACTION_MIN_SAMPLES_PER_SHARD: int = 20
+    PROGRESS_FLUSH_INTERVAL: float = 0.5  # Seconds between progress writes from extraction workers
+    PROGRESS_POLL_INTERVAL: float = 1.0  # Seconds between job state checks for event streams
+    PROGRESS_UNTRACKED_TIMEOUT: float = 60.0  # Seconds an event stream waits for a job on a video without one
+    
+    # Extracted frame images, overridable per video
+    FRAME_FORMAT: str = "jpeg"  # "jpeg" or "webp"
+    FRAME_QUALITY: int = 90
+    FRAME_MAX_SIZE: int = 1920  # Longest side in pixels, 0 keeps the source resolution
+    FRAME_ENCODE_THREADS: int = 2  # Threads annotating and encoding frames while the next ones decode
+    FRAME_PIPELINE_DEPTH: int = 8  # Frames buffered between decoding, encoding and writing
+    
+    # YouTube ingestion
+    YOUTUBE_TARGET_HEIGHT: int = 576  # The smallest stream at least this tall is downloaded
+    YOUTUBE_FOLLOW_MARGIN: float = 5.0  # Seconds of video kept behind the estimated download position
+    YOUTUBE_FOLLOW_INTERVAL: float = 2.0  # Seconds between extraction rounds while the download runs
+    
+    # Storage quotas, least recently used videos are evicted first
+    STORAGE_VIDEO_QUOTA_MB: int = 0  # Source videos in VIDEO_DIR, 0 disables the quota
+    STORAGE_FRAME_QUOTA_MB: int = 0  # Frames and derived images in FRAME_DIR, 0 disables the quota
+    STORAGE_MIN_FREE_MB: int = 0  # Free disk space kept for running extractions, 0 disables the check
+    STORAGE_DELETE_SOURCE_AFTER_EXTRACTION: bool = False  # Frames stay, the video can't be re-extracted
+    STORAGE_COMPACTION_INTERVAL: float = 300.0  # Seconds between background compactions, 0 disables them
+    STORAGE_TOUCH_INTERVAL: float = 60.0  # Seconds between last-access writes for the same video
+    STORAGE_ORPHAN_AGE: int = 3600  # Seconds before a file in VIDEO_DIR without a video record is deleted
+    
+    # Scene-change sampling
+    SCENE_ANALYSIS_FPS: float = 4.0  # Decoded frames scored per second of video
+    SCENE_ANALYSIS_WIDTH: int = 160  # Approximate width, in pixels, of the scored grayscale frame
+    SCENE_PIXEL_DELTA: int = 25  # Brightness change (0-255) that counts a pixel as changed
+    SCENE_THRESHOLD: float = 0.02  # Change score (0-1) that starts a new frame
+    SCENE_MIN_SPACING: float = 1.0  # Seconds, at most one frame per burst of activity
+    SCENE_MAX_SPACING: float = 30.0  # Seconds, a frame is kept at least this often even without change
     
     # OpenAI settings (if needed later)
     OPENAI_API_KEY: Optional[str] = None
+    OPENAI_BASE_URL: Optional[str] = None  # Point at a local stub server for load testing
+    OPENAI_TIMEOUT: float = 120.0
+    OPENAI_MAX_CONNECTIONS: int = 20
+    OPENAI_MAX_CONCURRENCY: int = 8  # Vision requests in flight per API worker
+    OPENAI_REQUESTS_PER_MINUTE: int = 500  # 0 disables the limit
+    OPENAI_TOKENS_PER_MINUTE: int = 200000  # 0 disables the limit
+    OPENAI_MAX_RETRIES: int = 4
+    OPENAI_BACKOFF_BASE: float = 1.0  # Seconds, doubled per attempt before jitter
+    OPENAI_BACKOFF_MAX: float = 30.0
+    
+    # Analysis image variants
+    ANALYSIS_MAX_SIZE: int = 1024  # Longest side, in pixels, of images sent to the model
+    ANALYSIS_JPEG_QUALITY: int = 80
+    ANALYSIS_VARIANTS_AT_EXTRACTION: bool = True  # Otherwise created on first analysis
+    ANALYSIS_VARIANT_CACHE_MB: int = 64  # Memory for base64 payloads of recently used frames
+    
+    # Frame images served over HTTP
+    FRAME_THUMB_SIZE: int = 256  # Longest side, in pixels
+    FRAME_PREVIEW_SIZE: int = 768
+    FRAME_IMAGE_QUALITY: int = 80  # JPEG quality of thumbnails and previews
+    FRAME_CACHE_MAX_AGE: int = 86400  # Seconds clients may reuse a frame image before revalidating
+    
+    # Frame selection budget per analyze request
+    ANALYSIS_REDUCED_SIZE: int = 512  # Fallback resolution when full size frames don't fit the budget
+    ANALYSIS_TOKEN_BUDGET: int = 20000  # Estimated image tokens
+    ANALYSIS_LATENCY_BUDGET: float = 30.0  # Estimated seconds
+    ANALYSIS_LATENCY_BASE: float = 1.5  # Seconds of model latency regardless of images
+    ANALYSIS_LATENCY_PER_1K_IMAGE_TOKENS: float = 0.4  # 0 leaves only the token budget limiting frames
+    
+    # Contact sheets packing several frames into one analysis image
+    ANALYSIS_SHEET_COLUMNS: int = 3
+    ANALYSIS_SHEET_ROWS: int = 3
+    ANALYSIS_SHEET_MAX_SIZE: int = 2048  # Longest side the model keeps at high detail
+    ANALYSIS_SHEET_SHORT_SIZE: int = 768  # Shortest side the model keeps at high detail
+    
+    # Map-reduce analysis of long frame sequences
+    ANALYSIS_MAP_REDUCE_THRESHOLD: int = 24  # Frames above which auto mode analyzes in windows
+    ANALYSIS_WINDOW_SIZE: int = 12  # Frames per window call
+    ANALYSIS_WINDOW_OVERLAP: int = 2  # Frames shared by neighbouring windows
+    ANALYSIS_REDUCE_FAN_IN: int = 16  # Window summaries merged per reduce call
+    
+    # Frame captions for retrieving the frames a follow-up question is about
+    CAPTION_MODEL: str = "gpt-4o-mini"
+    CAPTION_BATCH_SIZE: int = 8  # Frames described per call
+    CAPTION_IMAGE_SIZE: int = 512  # Longest side, in pixels, of frames sent at low detail for captioning
+    CAPTION_MAX_TOKENS: int = 60  # Per frame
+    CAPTION_RETRIEVAL_TOP_K: int = 4  # Frames sent for a follow-up question
+    
+    # Analysis result cache
+    ANALYSIS_CACHE_MEMORY_ENTRIES: int = 256
+    ANALYSIS_CACHE_TTL: int = 7 * 24 * 3600  # Seconds
+    ANALYSIS_CACHE_MAX_MB: int = 100
+    
+    # Chat history sent with analyze requests
+    CHAT_HISTORY_TOKEN_BUDGET: int = 2000  # Estimated tokens of history before older turns are summarized
+    CHAT_HISTORY_RECENT_TOKENS: int = 1000  # Recent turns kept verbatim when the rest is summarized
+    CHAT_SUMMARY_MAX_TOKENS: int = 300
+    CHAT_SUMMARY_MODEL: Optional[str] = None  # Defaults to the model of the request
+    CHAT_SUMMARY_TTL: int = 7 * 24 * 3600  # Seconds a conversation summary is kept after its last update
+    
+    # Metrics and request logs
+    REQUEST_TIMING_LOG: bool = True  # One JSON line per request with its stage timings
+    REQUEST_TIMING_LOG_EXCLUDE: set = {"/metrics", "/health"}  # Paths too frequent to log
     
     class Config:
         env_file = ".env"
@@ -0,0 +1,102 @@
+import os
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Iterator, Optional
+
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import DeclarativeBase, Session, sessionmaker
+
+from app.core.config import settings
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+_engine: Optional[Engine] = None
+_engine_pid: Optional[int] = None
+_session_factory: Optional[sessionmaker] = None
+
+
+def _configure_sqlite(dbapi_connection, connection_record):
+    # WAL lets the API read while extraction processes write frame records
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=30000")
+    cursor.close()
+
+
+def get_engine() -> Engine:
+    """Return the metadata engine, creating one per process and the schema on first use"""
+    global _engine, _engine_pid, _session_factory
+
+    # Engines must not be shared across fork/spawn boundaries
+    if _engine is None or _engine_pid != os.getpid():
+        _engine = create_engine(
+            f"sqlite:///{settings.DATABASE_PATH}",
+            connect_args={"check_same_thread": False, "timeout": 30},
+        )
+        event.listen(_engine, "connect", _configure_sqlite)
+        _engine_pid = os.getpid()
+        _session_factory = sessionmaker(bind=_engine, expire_on_commit=False)
+        init_db(_engine)
+
+    return _engine
+
+
+def init_db(engine: Engine):
+    # Import the models so they are registered on Base.metadata
+    from app.models.domain import analysis_cache, conversation, frame, job, video  # noqa: F401
+
+    Base.metadata.create_all(engine)
+    _add_missing_columns(engine)
+    _add_missing_indexes(engine)
+
+
+def _add_missing_columns(engine: Engine):
+    """
+    create_all only creates missing tables, so columns added to a model after
+    its table exists are appended here. New columns must be nullable.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {column_type}'))
+
+
+def _add_missing_indexes(engine: Engine):
+    """Indexes added to a model after its table exists, create_all skips them too"""
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(engine, checkfirst=True)
+
+
+@contextmanager
+def session_scope() -> Iterator[Session]:
+    """Transactional session: commits on success, rolls back on error"""
+    get_engine()
+    session = _session_factory()
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def as_utc(value: datetime) -> datetime:
+    """SQLite hands datetimes back without tzinfo, everything is stored in UTC"""
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
@@ -0,0 +1,10 @@
+class VideoUploadError(Exception):
+    """Base class for uploads rejected before a video record is created"""
+
+
+class UnsupportedVideoFormatError(VideoUploadError):
+    pass
+
+
+class VideoTooLargeError(VideoUploadError):
+    pass
@@ -0,0 +1,269 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+# Seconds, from a cached lookup to a long extraction job
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+class _Metric:
+    type = ""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        function: Optional[Callable[[], object]] = None
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        # Read at scrape time instead of being updated, e.g. queue lengths owned by another object
+        self.function = function
+        self._values: Dict[LabelValues, object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, object]) -> LabelValues:
+        if len(labels) != len(self.labels) or any(name not in labels for name in self.labels):
+            raise ValueError(f"Metric {self.name} takes labels {list(self.labels)}, got {sorted(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def _current(self) -> Dict[LabelValues, float]:
+        if self.function is None:
+            with self._lock:
+                return dict(self._values)
+        value = self.function()
+        if not self.labels:
+            return {(): value}
+        return {key if isinstance(key, tuple) else (key,): item for key, item in value.items()}
+
+    def samples(self) -> Iterator[Tuple[str, LabelValues, Tuple[str, ...], float]]:
+        """(sample name, label values, extra label names, value) for the text format"""
+        for key, value in sorted(self._current().items()):
+            yield self.name, key, (), value
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        # Per-bucket counts, made cumulative when rendered
+        index = next(index for index, bound in enumerate(self.buckets) if value <= bound)
+        with self._lock:
+            counts, total, count = self._values.get(key) or ((0,) * len(self.buckets), 0.0, 0)
+            # Replaced rather than updated, so snapshots and scrapes never see a half-written value
+            counts = counts[:index] + (counts[index] + 1,) + counts[index + 1:]
+            self._values[key] = (counts, total + value, count + 1)
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> Iterator[Tuple[str, LabelValues, Tuple[str, ...], float]]:
+        for key, (counts, total, count) in sorted(self._current().items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", key + (_format_value(bound),), ("le",), cumulative
+            yield f"{self.name}_sum", key, (), total
+            yield f"{self.name}_count", key, (), count
+
+
+class MetricsRegistry:
+    """
+    Metrics of this process, rendered in the Prometheus text format.
+
+    Extraction runs in worker processes with registries of their own: a
+    worker sends ``snapshot(reset=True)`` after each job and the API process
+    ``merge``s it, so counters and histograms cover every process. Gauges
+    describe the process they live in and are never merged.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = (), function=None) -> Counter:
+        return self._register(Counter(name, documentation, labels, function))
+
+    def gauge(self, name: str, documentation: str, labels: Sequence[str] = (), function=None) -> Gauge:
+        return self._register(Gauge(name, documentation, labels, function))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labels, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {_escape_help(metric.documentation)}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, values, extra_labels, value in metric.samples():
+                labels = ",".join(
+                    f'{label}="{_escape_label(label_value)}"'
+                    for label, label_value in zip(metric.labels + extra_labels, values)
+                )
+                lines.append(f"{name}{{{labels}}} {_format_value(value)}" if labels else f"{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self, reset: bool = False) -> Dict[str, Dict[LabelValues, object]]:
+        """Counter and histogram values, picklable so they can cross process boundaries"""
+        with self._lock:
+            metrics = [
+                metric for metric in self._metrics.values()
+                if metric.function is None and isinstance(metric, (Counter, Histogram))
+            ]
+        snapshot = {}
+        for metric in metrics:
+            with metric._lock:
+                if metric._values:
+                    snapshot[metric.name] = dict(metric._values)
+                if reset:
+                    metric._values = {}
+        return snapshot
+
+    def merge(self, snapshot: Dict[str, Dict[LabelValues, object]]):
+        """Add the values of another process's ``snapshot`` to this registry"""
+        for name, values in snapshot.items():
+            metric = self._metrics.get(name)
+            if metric is None:
+                continue
+            with metric._lock:
+                for key, value in values.items():
+                    if isinstance(metric, Histogram):
+                        counts, total, count = metric._values.get(key) or ((0,) * len(metric.buckets), 0.0, 0)
+                        other_counts, other_total, other_count = value
+                        metric._values[key] = (
+                            tuple(mine + theirs for mine, theirs in zip(counts, other_counts)),
+                            total + other_total,
+                            count + other_count
+                        )
+                    else:
+                        metric._values[key] = metric._values.get(key, 0) + value
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape_help(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+metrics = MetricsRegistry()
+
+stage_seconds = metrics.histogram(
+    "pipeline_stage_seconds",
+    "Time spent in each stage of the ingestion and analysis pipeline",
+    ("service", "stage")
+)
+
+
+@dataclass
+class RequestTiming:
+    """Stage timings and counts collected while handling one HTTP request"""
+    stages: Dict[str, float] = field(default_factory=dict)
+    counts: Dict[str, int] = field(default_factory=dict)
+
+    def add_stage(self, name: str, seconds: float):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def add_count(self, name: str, amount: int = 1):
+        self.counts[name] = self.counts.get(name, 0) + amount
+
+
+# Set by RequestTimingMiddleware; tasks and threadpool calls of the request share the same object
+request_timing: ContextVar[Optional[RequestTiming]] = ContextVar("request_timing", default=None)
+
+
+def current_timing() -> Optional[RequestTiming]:
+    return request_timing.get()
+
+
+def add_count(name: str, amount: int = 1):
+    """Add to a count of the current request's timing log, if there is a request"""
+    timing = request_timing.get()
+    if timing is not None:
+        timing.add_count(name, amount)
+
+
+def record_stage(service: str, stage: str, seconds: float):
+    """Observe a pipeline stage in ``pipeline_stage_seconds`` and the current request's timing log"""
+    stage_seconds.observe(seconds, service=service, stage=stage)
+    timing = request_timing.get()
+    if timing is not None:
+        timing.add_stage(f"{service}.{stage}", seconds)
+
+
+@contextmanager
+def timed(service: str, stage: str) -> Iterator[None]:
+    """record_stage for the time spent in the block"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(service, stage, time.perf_counter() - started)
@@ -1,7 +1,13 @@
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from app.api.routes import video_router, frame_router
+from app.api.middleware import RequestTimingMiddleware
+from app.api.routes import video_router, frame_router, storage_router
 from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.jobs.job_runner import job_runner
+from app.services.storage.storage_manager import storage_manager
+from app.api.controllers.frame_controller import openai_service
 
 app = FastAPI(
     title="Video Processing API",
@@ -17,10 +23,23 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(RequestTimingMiddleware)
 
 # Include routers
 app.include_router(video_router, prefix="/api/v1/videos", tags=["videos"])
 app.include_router(frame_router, prefix="/api/v1/frames", tags=["frames"])
+app.include_router(storage_router, prefix="/api/v1/storage", tags=["storage"])
+
+@app.on_event("startup")
+async def start_services():
+    storage_manager.start()
+    job_runner.start()
+
+@app.on_event("shutdown")
+async def shutdown_services():
+    await storage_manager.stop()
+    job_runner.shutdown()
+    await openai_service.aclose()
 
 @app.get("/")
 async def root():
@@ -28,4 +47,10 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"} 
\ No newline at end of file
+    return {"status": "healthy"}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Metrics of the API and its extraction workers in the Prometheus text format"""
+    job_runner.collect_metrics()
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8") 
\ No newline at end of file
@@ -0,0 +1,33 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import Boolean, DateTime, Float, Index, Integer, String, Text, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.core.database import Base
+
+
+class FrameRecord(Base):
+    __tablename__ = "frames"
+    __table_args__ = (
+        # frame_key is the "{timestamp}" suffix of "{video_id}_{timestamp}.jpg",
+        # which is what clients send as frame ids
+        UniqueConstraint("video_id", "frame_key", name="uq_frames_video_key"),
+        Index("ix_frames_video_timestamp", "video_id", "timestamp"),
+        Index("ix_frames_video_number", "video_id", "frame_number"),
+    )
+
+    id: Mapped[str] = mapped_column(String(36), primary_key=True)
+    video_id: Mapped[str] = mapped_column(String(36))
+    frame_key: Mapped[str] = mapped_column(String(64))
+    timestamp: Mapped[float] = mapped_column(Float)
+    frame_number: Mapped[int] = mapped_column(Integer)
+    file_path: Mapped[str] = mapped_column(String(4096))
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    processed: Mapped[bool] = mapped_column(Boolean, default=False)
+    content_hash: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    # One sentence written once by CAPTION_MODEL, searched to pick frames for follow-up questions
+    caption: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    caption_model: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    # Questions are only matched against captions written in their language
+    caption_language: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
@@ -0,0 +1,28 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import DateTime, Index, Integer, String, Text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.core.database import Base
+
+
+class ExtractionJobRecord(Base):
+    __tablename__ = "extraction_jobs"
+    __table_args__ = (
+        # Waiting jobs are the scheduler's queue
+        Index("ix_extraction_jobs_queue", "status", "priority", "tenant", "created_at"),
+    )
+
+    video_id: Mapped[str] = mapped_column(String(36), primary_key=True)
+    status: Mapped[str] = mapped_column(String(16))
+    frames_done: Mapped[int] = mapped_column(Integer, default=0)
+    frames_expected: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    started_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    # Scheduling, NULL for jobs queued before the scheduler existed: interactive, default tenant
+    priority: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    tenant: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
@@ -0,0 +1,45 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import Boolean, DateTime, Float, Integer, String, Text, select
+from sqlalchemy.orm import Mapped, Session, mapped_column
+
+from app.core.database import Base
+
+
+class VideoRecord(Base):
+    __tablename__ = "videos"
+
+    id: Mapped[str] = mapped_column(String(36), primary_key=True)
+    title: Mapped[str] = mapped_column(String(255))
+    description: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    source: Mapped[str] = mapped_column(String(16))
+    youtube_url: Mapped[Optional[str]] = mapped_column(String(2048), nullable=True)
+    filename: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    file_path: Mapped[Optional[str]] = mapped_column(String(4096), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    processed: Mapped[bool] = mapped_column(Boolean, default=False)
+    duration: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    frame_count: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    frame_interval: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    # "interval" or "scene", NULL for videos stored before scene sampling existed
+    sampling_mode: Mapped[Optional[str]] = mapped_column(String(16), nullable=True)
+    # Stored frame images, NULL for videos extracted before these were configurable
+    frame_format: Mapped[Optional[str]] = mapped_column(String(8), nullable=True)
+    frame_quality: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    frame_max_size: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    content_hash: Mapped[Optional[str]] = mapped_column(String(64), nullable=True, index=True)
+    # "sha256:<hex>" for uploads, "youtube:<id>" for YouTube URLs
+    content_key: Mapped[Optional[str]] = mapped_column(String(128), nullable=True, index=True)
+    # Set when this video reuses the frames of an earlier video with the same content
+    alias_of: Mapped[Optional[str]] = mapped_column(String(36), nullable=True)
+    # Last time an endpoint used the video's frames, for least recently used eviction
+    last_accessed_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    # Set for videos queued together by batch ingestion
+    batch_id: Mapped[Optional[str]] = mapped_column(String(36), nullable=True, index=True)
+
+
+def resolve_video_id(session: Session, video_id: str) -> str:
+    """Return the id of the video whose frames back ``video_id``"""
+    alias_of = session.scalar(select(VideoRecord.alias_of).where(VideoRecord.id == video_id))
+    return alias_of or video_id
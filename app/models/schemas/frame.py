@@ -1,6 +1,7 @@
 from pydantic import BaseModel, Field
 from typing import Optional, List, Dict
 from datetime import datetime
+from enum import Enum
 
 class FrameBase(BaseModel):
     video_id: str
@@ -12,7 +13,11 @@ class FrameCreate(FrameBase):
 
 class FrameInDB(FrameBase):
     id: str
+    frame_key: Optional[str] = None
     file_path: str
+    content_hash: Optional[str] = None
+    caption: Optional[str] = None
+    caption_language: Optional[str] = None
     created_at: datetime
     processed: bool = False
     analysis_result: Optional[dict] = None
@@ -23,6 +28,29 @@ class FrameInDB(FrameBase):
 class FrameResponse(FrameInDB):
     pass
 
+class FrameSummary(BaseModel):
+    """What a frame grid needs, images are fetched separately"""
+    id: str
+    frame_key: str
+    timestamp: float
+    frame_number: int
+
+class FramePage(BaseModel):
+    frames: List[FrameSummary]
+    # Pass back as ``cursor`` for the following page, unset on the last one
+    next_cursor: Optional[str] = None
+    # Frames in the time range, only counted for the first page
+    total: Optional[int] = None
+
+class FrameImageSize(str, Enum):
+    THUMB = "thumb"
+    PREVIEW = "preview"
+    FULL = "full"
+
+class AnalysisMode(str, Enum):
+    SINGLE = "single"  # Every frame in one request
+    MAP_REDUCE = "map_reduce"  # Overlapping windows analyzed concurrently, then merged
+
 class FrameBatchAnalysis(BaseModel):
     video_id: str = Field(..., description="Video ID")
     frame_ids: List[str] = Field(..., description="Frame IDs")
@@ -30,5 +58,19 @@ class FrameBatchAnalysis(BaseModel):
     sequence_prompt: str = Field(..., description="Prompt for sequence analysis")
     description: str = Field(..., description="Description of the video")
     messages: List[Dict] = Field(..., description="Chat history")
+    conversation_id: Optional[str] = Field(
+        None, max_length=64, description="Identifies the chat so summaries of its older turns are reused"
+    )
     model: str = Field(..., description="Model to use for analysis")
-    language: str = Field(..., description="Language to use for analysis")
\ No newline at end of file
+    language: str = Field(..., description="Language to use for analysis")
+    bypass_cache: bool = Field(False, description="Skip cached results and always call the model")
+    token_budget: Optional[int] = Field(None, gt=0, description="Estimated image tokens allowed for this request")
+    latency_budget: Optional[float] = Field(None, gt=0, description="Estimated model latency allowed, in seconds")
+    pack_frames: bool = Field(False, description="Send frames tiled into labeled contact sheets instead of one image each")
+    retrieve_frames: bool = Field(
+        False, description="Send only the frames whose captions and timestamps best match the question"
+    )
+    retrieve_top_k: Optional[int] = Field(None, gt=0, description="Frames retrieved, defaults to CAPTION_RETRIEVAL_TOP_K")
+    analysis_mode: Optional[AnalysisMode] = Field(
+        None, description="Defaults to map_reduce above ANALYSIS_MAP_REDUCE_THRESHOLD frames, single otherwise"
+    )
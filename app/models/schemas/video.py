@@ -1,5 +1,5 @@
 from pydantic import BaseModel, HttpUrl, Field
-from typing import Optional, List
+from typing import Dict, Optional, List
 from datetime import datetime
 from enum import Enum
 
@@ -7,6 +7,18 @@ class VideoSource(str, Enum):
     UPLOAD = "upload"
     YOUTUBE = "youtube"
 
+class SamplingMode(str, Enum):
+    INTERVAL = "interval"  # One frame every frame_interval seconds
+    SCENE = "scene"  # One frame per scene change or burst of motion
+
+class FrameFormat(str, Enum):
+    JPEG = "jpeg"
+    WEBP = "webp"
+
+class JobPriority(str, Enum):
+    INTERACTIVE = "interactive"  # Someone is waiting for the frames
+    BULK = "bulk"  # Backfills, run whenever no interactive job is waiting
+
 class VideoBase(BaseModel):
     title: str = Field(..., min_length=1, max_length=255)
     description: Optional[str] = None
@@ -15,18 +27,32 @@ class VideoCreate(VideoBase):
     source: VideoSource
     youtube_url: Optional[HttpUrl] = None
     frame_interval: Optional[int] = 10
+    sampling_mode: SamplingMode = SamplingMode.INTERVAL
+    # Stored frame images, the FRAME_* settings apply when unset
+    frame_format: Optional[FrameFormat] = None
+    frame_quality: Optional[int] = Field(None, ge=1, le=100)
+    frame_max_size: Optional[int] = Field(None, ge=0)  # 0 keeps the source resolution
     
 class VideoInDB(VideoBase):
     id: str
-    filename: str
+    # Unset until a YouTube video has been downloaded by its extraction job
+    filename: Optional[str] = None
     source: VideoSource
     youtube_url: Optional[HttpUrl] = None
     created_at: datetime
     processed: bool = False
-    file_path: str
+    file_path: Optional[str] = None
     duration: Optional[float] = None
     frame_count: Optional[int] = None
     frame_interval: Optional[int] = None
+    sampling_mode: Optional[SamplingMode] = SamplingMode.INTERVAL
+    frame_format: Optional[FrameFormat] = None
+    frame_quality: Optional[int] = None
+    frame_max_size: Optional[int] = None
+    content_hash: Optional[str] = None
+    content_key: Optional[str] = None
+    alias_of: Optional[str] = None
+    batch_id: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -38,4 +64,32 @@ class VideoProcessingStatus(BaseModel):
     video_id: str
     status: str
     progress: float = 0.0
-    message: Optional[str] = None 
\ No newline at end of file
+    message: Optional[str] = None
+    frames_done: Optional[int] = None
+    frames_expected: Optional[int] = None
+    frames_per_second: Optional[float] = None
+    eta_seconds: Optional[float] = None 
+class BatchIngest(BaseModel):
+    """YouTube URLs and/or a server-side directory of videos to extract in one batch"""
+    urls: List[HttpUrl] = Field(default_factory=list, description="YouTube URLs")
+    directory: Optional[str] = Field(None, description="Directory under BATCH_INGEST_ROOT, relative or absolute")
+    recursive: bool = Field(False, description="Include videos in subdirectories")
+    description: Optional[str] = None
+    frame_interval: Optional[int] = 10
+    sampling_mode: SamplingMode = SamplingMode.INTERVAL
+    frame_format: Optional[FrameFormat] = None
+    frame_quality: Optional[int] = Field(None, ge=1, le=100)
+    frame_max_size: Optional[int] = Field(None, ge=0)
+    priority: JobPriority = JobPriority.BULK
+
+class BatchIngestResponse(BaseModel):
+    batch_id: str
+    videos: List[VideoResponse] = []
+    # Items that could not be queued, with the reason
+    rejected: List[Dict[str, str]] = []
+
+class BatchStatus(BaseModel):
+    batch_id: str
+    total: int
+    counts: Dict[str, int]
+    videos: List[VideoProcessingStatus]
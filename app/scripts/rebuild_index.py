@@ -0,0 +1,17 @@
+"""
+Rebuild the frame metadata index from the files in FRAME_DIR.
+
+Usage: python -m app.scripts.rebuild_index
+"""
+import asyncio
+
+from app.services.frame.frame_service import FrameService
+
+
+def main():
+    frame_count = asyncio.run(FrameService().rebuild_index())
+    print(f"Indexed {frame_count} frames")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, func, select
+
+from app.core.config import settings
+from app.core.database import as_utc, session_scope
+from app.core.metrics import metrics
+from app.models.domain.analysis_cache import AnalysisCacheRecord
+
+
+class AnalysisCache:
+    """
+    Two-tier cache of vision analysis results.
+
+    A bounded in-memory LRU sits in front of a table in the metadata database,
+    so hot answers come back without touching disk and everything survives a
+    restart. Entries expire after ``ttl_seconds``; the disk tier is trimmed to
+    ``max_disk_bytes`` by least recent access.
+    """
+
+    def __init__(
+        self,
+        max_memory_entries: Optional[int] = None,
+        ttl_seconds: Optional[int] = None,
+        max_disk_bytes: Optional[int] = None
+    ):
+        self.max_memory_entries = max_memory_entries or settings.ANALYSIS_CACHE_MEMORY_ENTRIES
+        self.ttl_seconds = ttl_seconds or settings.ANALYSIS_CACHE_TTL
+        self.max_disk_bytes = max_disk_bytes or settings.ANALYSIS_CACHE_MAX_MB * 1024 * 1024
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(
+        content_hashes: List[str],
+        prompt: str,
+        model: str,
+        language: str,
+        history: List[Dict]
+    ) -> str:
+        # Only role and stripped text matter, extra client-side fields don't change the answer
+        normalized_history = [
+            [message.get("role"), str(message.get("content", "")).strip()]
+            for message in history
+        ]
+        payload = json.dumps(
+            {
+                "frames": content_hashes,
+                "prompt": prompt.strip(),
+                "model": model,
+                "language": language,
+                "history": normalized_history
+            },
+            ensure_ascii=False,
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return value
+                del self._memory[key]
+
+        value = self._get_from_disk(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self._remember(key, value, now + self.ttl_seconds)
+        return value
+
+    def set(self, key: str, value: dict):
+        self._remember(key, value, time.time() + self.ttl_seconds)
+
+        serialized = json.dumps(value, ensure_ascii=False)
+        now = datetime.now(timezone.utc)
+        with session_scope() as session:
+            session.merge(AnalysisCacheRecord(
+                key=key,
+                value=serialized,
+                size=len(serialized.encode("utf-8")),
+                created_at=now,
+                expires_at=now + timedelta(seconds=self.ttl_seconds),
+                last_accessed_at=now
+            ))
+        self._evict_disk()
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            memory_entries = len(self._memory)
+        with session_scope() as session:
+            disk_entries, disk_bytes = session.execute(
+                select(func.count(), func.coalesce(func.sum(AnalysisCacheRecord.size), 0))
+            ).one()
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": memory_entries,
+            "disk_entries": disk_entries,
+            "disk_bytes": disk_bytes
+        }
+
+    def hit_rate(self) -> float:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+        return hits / lookups if lookups else 0.0
+
+    def _remember(self, key: str, value: dict, expires_at: float):
+        with self._lock:
+            self._memory[key] = (expires_at, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def _get_from_disk(self, key: str) -> Optional[dict]:
+        now = datetime.now(timezone.utc)
+        with session_scope() as session:
+            record = session.get(AnalysisCacheRecord, key)
+            if record is None:
+                return None
+            if as_utc(record.expires_at) <= now:
+                session.delete(record)
+                return None
+            record.last_accessed_at = now
+            return json.loads(record.value)
+
+    def _evict_disk(self):
+        now = datetime.now(timezone.utc)
+        with session_scope() as session:
+            session.execute(delete(AnalysisCacheRecord).where(AnalysisCacheRecord.expires_at <= now))
+
+            total = session.scalar(select(func.coalesce(func.sum(AnalysisCacheRecord.size), 0)))
+            if total <= self.max_disk_bytes:
+                return
+
+            # Drop least recently used entries until the store fits again
+            for key, size in session.execute(
+                select(AnalysisCacheRecord.key, AnalysisCacheRecord.size)
+                .order_by(AnalysisCacheRecord.last_accessed_at)
+            ):
+                session.execute(delete(AnalysisCacheRecord).where(AnalysisCacheRecord.key == key))
+                total -= size
+                if total <= self.max_disk_bytes:
+                    break
+
+
+
+analysis_cache = AnalysisCache()
+
+metrics.counter(
+    "analysis_cache_lookups_total",
+    "Analysis cache lookups by outcome",
+    ("result",),
+    function=lambda: {
+        "memory_hit": analysis_cache.memory_hits,
+        "disk_hit": analysis_cache.disk_hits,
+        "miss": analysis_cache.misses
+    }
+)
+metrics.gauge(
+    "analysis_cache_hit_ratio",
+    "Share of analysis cache lookups answered from memory or disk since start",
+    function=analysis_cache.hit_rate
+)
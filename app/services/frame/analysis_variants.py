@@ -0,0 +1,143 @@
+import base64
+import io
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+variant_lookups = metrics.counter(
+    "analysis_variant_lookups_total",
+    "Analysis variant lookups by where the variant came from: memory, disk or encoded from the frame",
+    ("result",)
+)
+
+
+@dataclass
+class AnalysisVariant:
+    base64: str
+    width: int
+    height: int
+
+    @property
+    def data_url(self) -> str:
+        return f"data:image/jpeg;base64,{self.base64}"
+
+
+def encode_analysis_variant(
+    image: np.ndarray,
+    max_size: Optional[int] = None,
+    quality: Optional[int] = None
+) -> Tuple[bytes, int, int]:
+    """Downscale a BGR frame to fit max_size and JPEG-encode it, returns (bytes, width, height)"""
+    max_size = max_size or settings.ANALYSIS_MAX_SIZE
+    quality = quality or settings.ANALYSIS_JPEG_QUALITY
+
+    image = fit_to_size(image, max_size)
+    height, width = image.shape[:2]
+    _, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return encoded.tobytes(), width, height
+
+
+def fit_to_size(image: np.ndarray, max_size: int) -> np.ndarray:
+    """Downscale a frame so its longest side is at most max_size, never upscale"""
+    height, width = image.shape[:2]
+    if max(width, height) <= max_size:
+        return image
+    ratio = max_size / max(width, height)
+    # INTER_AREA is the cheap choice that still avoids aliasing when shrinking
+    return cv2.resize(image, (int(width * ratio), int(height * ratio)), interpolation=cv2.INTER_AREA)
+
+
+def write_atomic(path: Path, data: bytes):
+    """Write then rename so a concurrent reader never sees half a file"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as buffer:
+            buffer.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        Path(temp_path).unlink(missing_ok=True)
+        raise
+
+
+def variant_path(frame_path: Path, max_size: Optional[int] = None) -> Path:
+    """Analysis variants live in FRAME_DIR/analysis_<max_size>/ under the frame's file name, as JPEG"""
+    max_size = max_size or settings.ANALYSIS_MAX_SIZE
+    return settings.FRAME_DIR / f"analysis_{max_size}" / Path(frame_path).with_suffix(".jpg").name
+
+
+class AnalysisVariantStore:
+    """
+    Resized, re-encoded copies of frames ready to send to the vision model.
+
+    Variants are written next to the frames, either at extraction time or the
+    first time a frame is analyzed, and the base64 payloads of recently used
+    ones are kept in a memory LRU bounded by ``max_memory_bytes``.
+    """
+
+    def __init__(self, max_memory_bytes: Optional[int] = None):
+        self.max_memory_bytes = max_memory_bytes or settings.ANALYSIS_VARIANT_CACHE_MB * 1024 * 1024
+        self._memory: "OrderedDict[Tuple[str, int], AnalysisVariant]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+
+    def write(self, frame_path: Path, image: np.ndarray, max_size: Optional[int] = None) -> AnalysisVariant:
+        """Encode and persist the variant of an already decoded frame"""
+        data, width, height = encode_analysis_variant(image, max_size)
+        write_atomic(variant_path(frame_path, max_size), data)
+        return AnalysisVariant(base64.b64encode(data).decode("utf-8"), width, height)
+
+    def get(self, frame_path: Path, max_size: Optional[int] = None) -> AnalysisVariant:
+        max_size = max_size or settings.ANALYSIS_MAX_SIZE
+        key = (str(frame_path), max_size)
+
+        with self._lock:
+            variant = self._memory.get(key)
+            if variant is not None:
+                self._memory.move_to_end(key)
+                variant_lookups.inc(result="memory")
+                return variant
+
+        path = variant_path(frame_path, max_size)
+        data = path.read_bytes() if path.exists() else None
+        if data is not None:
+            # Opening with PIL only parses the header, the pixels are never decoded
+            with Image.open(io.BytesIO(data)) as image:
+                width, height = image.size
+            variant = AnalysisVariant(base64.b64encode(data).decode("utf-8"), width, height)
+            variant_lookups.inc(result="disk")
+        else:
+            image = cv2.imread(str(frame_path))
+            if image is None:
+                raise ValueError(f"Could not read frame: {frame_path}")
+            variant = self.write(frame_path, image, max_size)
+            variant_lookups.inc(result="encoded")
+
+        self._remember(key, variant)
+        return variant
+
+    def _remember(self, key: Tuple[str, int], variant: AnalysisVariant):
+        size = len(variant.base64)
+        with self._lock:
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self._memory_bytes -= len(previous.base64)
+            self._memory[key] = variant
+            self._memory_bytes += size
+            while self._memory_bytes > self.max_memory_bytes and len(self._memory) > 1:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted.base64)
+
+
+analysis_variant_store = AnalysisVariantStore()
@@ -0,0 +1,103 @@
+import re
+import zlib
+from typing import List, Sequence
+
+import numpy as np
+
+# Hashed feature space, small enough that an index of a few thousand captions stays in a few MB
+DIMENSIONS = 2 ** 11
+
+_WORD = re.compile(r"[^\W\d_]+")
+_CLOCK = re.compile(r"\b(\d{1,2}):(\d{2})(?::(\d{2}))?\b")
+_SECONDS = re.compile(r"(\d+(?:[.,]\d+)?)\s*(?:s|sec|secs|seconds?|с|сек\w*)(?!\w)", re.IGNORECASE)
+_MINUTES = re.compile(r"(\d+(?:[.,]\d+)?)\s*(?:m|min|mins|minutes?|хв\w*)(?!\w)", re.IGNORECASE)
+
+
+def caption_features(text: str) -> List[str]:
+    """
+    Lowercase words, plus character 4-grams of longer words so inflected forms
+    ("chickens", "курки" and "курчата") still share features.
+    """
+    features = []
+    for word in _WORD.findall(text.lower()):
+        if len(word) < 2:
+            continue
+        features.append(word)
+        if len(word) >= 5:
+            padded = f"#{word}#"
+            features.extend(padded[start:start + 4] for start in range(len(padded) - 3))
+    return features
+
+
+def parse_times(text: str) -> List[float]:
+    """Seconds mentioned in a question: "120 s", "2 min", "1:30" or "0:01:30", in any order"""
+    times = []
+    for match in _CLOCK.finditer(text):
+        if match.group(3):
+            hours, minutes, seconds = match.group(1), match.group(2), match.group(3)
+        else:
+            hours, minutes, seconds = 0, match.group(1), match.group(2)
+        times.append(int(hours) * 3600 + int(minutes) * 60 + int(seconds))
+    text = _CLOCK.sub(" ", text)
+    times.extend(float(match.group(1).replace(",", ".")) for match in _SECONDS.finditer(text))
+    times.extend(float(match.group(1).replace(",", ".")) * 60 for match in _MINUTES.finditer(text))
+    return times
+
+
+class CaptionIndex:
+    """
+    TF-IDF vectors of frame captions over hashed features, searched by cosine
+    similarity with NumPy. Built in memory from the stored captions, nothing
+    leaves the process.
+    """
+
+    def __init__(self, captions: Sequence[str], timestamps: Sequence[float]):
+        self.timestamps = np.asarray(timestamps, dtype=np.float64)
+        counts = np.zeros((len(captions), DIMENSIONS), dtype=np.float32)
+        for row, caption in enumerate(captions):
+            for feature in caption_features(caption or ""):
+                counts[row, _bucket(feature)] += 1
+
+        document_frequency = np.count_nonzero(counts, axis=0)
+        self.idf = (np.log((1 + len(captions)) / (1 + document_frequency)) + 1).astype(np.float32)
+        self.vectors = _normalize(np.log1p(counts) * self.idf)
+
+        gaps = np.diff(np.sort(self.timestamps))
+        # Time proximity is measured in frames, whatever the sampling interval
+        self.spacing = float(np.median(gaps[gaps > 0])) if np.any(gaps > 0) else 1.0
+
+    def scores(self, question: str) -> np.ndarray:
+        """Cosine similarity of each caption to the question, plus up to 1 for frames near a mentioned time"""
+        query = np.zeros(DIMENSIONS, dtype=np.float32)
+        for feature in caption_features(question):
+            query[_bucket(feature)] += 1
+        query = _normalize((np.log1p(query) * self.idf)[np.newaxis, :])[0]
+        scores = self.vectors @ query
+
+        times = parse_times(question)
+        if times and len(self.timestamps):
+            distances = np.min(np.abs(self.timestamps[:, np.newaxis] - np.asarray(times)[np.newaxis, :]), axis=1)
+            scores = scores + 1 / (1 + distances / self.spacing)
+        return scores
+
+    def search(self, question: str, top_k: int) -> List[int]:
+        """Row indexes of the best matching captions in timestamp order, evenly spaced rows if nothing matches"""
+        count = len(self.timestamps)
+        if count <= top_k:
+            return list(range(count))
+        scores = self.scores(question)
+        if not np.any(scores > 0):
+            rows = np.linspace(0, count - 1, top_k).round().astype(int)
+        else:
+            rows = np.argsort(-scores, kind="stable")[:top_k]
+        return sorted(set(rows.tolist()), key=lambda row: self.timestamps[row])
+
+
+def _bucket(feature: str) -> int:
+    # crc32 rather than hash(), which is salted per process
+    return zlib.crc32(feature.encode("utf-8")) % DIMENSIONS
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
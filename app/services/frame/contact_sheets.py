@@ -0,0 +1,169 @@
+import base64
+import hashlib
+import math
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from app.core.config import settings
+from app.core.metrics import timed
+from app.models.schemas.frame import FrameInDB
+from app.services.frame.analysis_variants import variant_path, write_atomic
+from app.services.frame.overlay import draw_timestamp
+from app.services.openai.token_estimator import estimate_image_tokens
+
+
+@dataclass
+class SheetLayout:
+    columns: int
+    rows: int
+    tile_width: int
+    tile_height: int
+
+    @property
+    def capacity(self) -> int:
+        return self.columns * self.rows
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self.columns * self.tile_width, self.rows * self.tile_height
+
+    def key(self) -> str:
+        return f"{self.columns}x{self.rows}@{self.tile_width}x{self.tile_height}"
+
+
+def sheet_layout(frame_size: Tuple[int, int], count: Optional[int] = None) -> SheetLayout:
+    """
+    Grid for ``count`` frames of ``frame_size`` (at most a full sheet), with
+    tiles scaled so the whole sheet fits the size the model analyzes at high
+    detail without downscaling it again.
+    """
+    capacity = settings.ANALYSIS_SHEET_COLUMNS * settings.ANALYSIS_SHEET_ROWS
+    count = min(count or capacity, capacity)
+    columns = min(settings.ANALYSIS_SHEET_COLUMNS, count)
+    rows = math.ceil(count / columns)
+
+    width, height = frame_size
+    sheet_width, sheet_height = columns * width, rows * height
+    scale = min(
+        1.0,
+        settings.ANALYSIS_SHEET_MAX_SIZE / max(sheet_width, sheet_height),
+        settings.ANALYSIS_SHEET_SHORT_SIZE / min(sheet_width, sheet_height)
+    )
+    return SheetLayout(columns, rows, max(int(width * scale), 1), max(int(height * scale), 1))
+
+
+def compose_contact_sheet(images: List[np.ndarray], timestamps: List[float], layout: SheetLayout) -> np.ndarray:
+    """Tile BGR frames in reading order, each labeled with its timestamp"""
+    tiles = np.zeros((layout.capacity, layout.tile_height, layout.tile_width, 3), dtype=np.uint8)
+    font_scale = min(max(layout.tile_height / 512, 0.4), 1.0)
+
+    for index, (image, timestamp) in enumerate(zip(images, timestamps)):
+        # Resize straight into the tile buffer
+        cv2.resize(image, (layout.tile_width, layout.tile_height), dst=tiles[index], interpolation=cv2.INTER_AREA)
+        draw_timestamp(tiles[index], timestamp, font_scale)
+
+    # White separators on the right and bottom edge of every tile
+    tiles[:, -2:, :] = 255
+    tiles[:, :, -2:] = 255
+    # (rows * columns, h, w, 3) -> (rows * h, columns * w, 3)
+    return (
+        tiles.reshape(layout.rows, layout.columns, layout.tile_height, layout.tile_width, 3)
+        .swapaxes(1, 2)
+        .reshape(layout.rows * layout.tile_height, layout.columns * layout.tile_width, 3)
+    )
+
+
+def sheet_tokens_per_frame(frame_size: Optional[Tuple[int, int]]) -> int:
+    """Estimated image tokens each frame costs when sent on a full contact sheet"""
+    layout = sheet_layout(frame_size or (settings.ANALYSIS_MAX_SIZE, settings.ANALYSIS_MAX_SIZE))
+    width, height = layout.size
+    return math.ceil(estimate_image_tokens(width, height, "high") / layout.capacity)
+
+
+class ContactSheetPacker:
+    """
+    Packs timestamp-ordered frames into labeled grid images, so one image_url
+    carries ANALYSIS_SHEET_COLUMNS x ANALYSIS_SHEET_ROWS frames.
+
+    Sheets are cached in FRAME_DIR/sheets/ under a hash of the frame content
+    hashes and the layout, so asking about the same frames again reuses them.
+    """
+
+    def pack(self, records: List[FrameInDB]) -> List[dict]:
+        """Encoded sheets in the same shape FrameService.encode_frames returns frames"""
+        if not records:
+            return []
+
+        with timed("frame", "pack"):
+            frame_size = self._frame_size(records)
+            capacity = settings.ANALYSIS_SHEET_COLUMNS * settings.ANALYSIS_SHEET_ROWS
+            sheets = []
+            for start in range(0, len(records), capacity):
+                group = records[start:start + capacity]
+                try:
+                    sheets.append(self._encode_sheet(group, sheet_layout(frame_size, len(group)), len(sheets)))
+                except Exception as e:
+                    print(f"Error packing frames {group[0].frame_key} to {group[-1].frame_key}: {str(e)}")
+        return sheets
+
+    def sheet_path(self, records: List[FrameInDB], layout: SheetLayout) -> Path:
+        digest = hashlib.sha256()
+        for record in records:
+            digest.update(f"{record.content_hash or record.file_path}@{record.timestamp}\n".encode("utf-8"))
+        digest.update(f"{layout.key()}q{settings.ANALYSIS_JPEG_QUALITY}".encode("utf-8"))
+        return settings.FRAME_DIR / "sheets" / f"{digest.hexdigest()}.jpg"
+
+    def _encode_sheet(self, records: List[FrameInDB], layout: SheetLayout, index: int) -> dict:
+        path = self.sheet_path(records, layout)
+        if path.exists():
+            data = path.read_bytes()
+        else:
+            images = [self._read_frame(record) for record in records]
+            sheet = compose_contact_sheet(images, [record.timestamp for record in records], layout)
+            _, encoded = cv2.imencode(".jpg", sheet, [cv2.IMWRITE_JPEG_QUALITY, settings.ANALYSIS_JPEG_QUALITY])
+            data = encoded.tobytes()
+            write_atomic(path, data)
+
+        width, height = layout.size
+        return {
+            "id": f"sheet_{index}",
+            "timestamp": records[0].timestamp,
+            "end_timestamp": records[-1].timestamp,
+            "frame_ids": [record.frame_key for record in records],
+            "timestamps": [record.timestamp for record in records],
+            "file_path": str(path),
+            "width": width,
+            "height": height,
+            "image_url": {
+                "url": f"data:image/jpeg;base64,{base64.b64encode(data).decode('utf-8')}",
+                "detail": "high"
+            }
+        }
+
+    @staticmethod
+    def _read_frame(record: FrameInDB) -> np.ndarray:
+        # The analysis variant is already downscaled and cheaper to decode
+        for path in (variant_path(Path(record.file_path)), Path(record.file_path)):
+            if path.exists():
+                image = cv2.imread(str(path))
+                if image is not None:
+                    return image
+        raise ValueError(f"Could not read frame: {record.file_path}")
+
+    @staticmethod
+    def _frame_size(records: List[FrameInDB]) -> Tuple[int, int]:
+        for record in records:
+            try:
+                with Image.open(Path(record.file_path)) as image:
+                    return image.size
+            except OSError:
+                continue
+        return settings.ANALYSIS_MAX_SIZE, settings.ANALYSIS_MAX_SIZE
+
+
+contact_sheet_packer = ContactSheetPacker()
@@ -0,0 +1,79 @@
+from pathlib import Path
+from typing import Optional
+
+import cv2
+
+from app.core.config import settings
+from app.core.metrics import metrics, timed
+from app.models.schemas.frame import FrameImageSize
+from app.services.frame.analysis_variants import encode_analysis_variant, write_atomic
+
+
+def frame_image_max_size(size: FrameImageSize) -> Optional[int]:
+    """Longest side of a served frame image, None for the original frame"""
+    if size == FrameImageSize.THUMB:
+        return settings.FRAME_THUMB_SIZE
+    if size == FrameImageSize.PREVIEW:
+        return settings.FRAME_PREVIEW_SIZE
+    return None
+
+
+def frame_image_path(frame_path: Path, size: FrameImageSize) -> Path:
+    """Resized frames live in FRAME_DIR/<size>_<max_size>/ under the frame's file name, as JPEG"""
+    max_size = frame_image_max_size(size)
+    if max_size is None:
+        return Path(frame_path)
+    return settings.FRAME_DIR / f"{size.value}_{max_size}" / Path(frame_path).with_suffix(".jpg").name
+
+
+def frame_image_etag(content_hash: str, size: FrameImageSize) -> str:
+    """
+    Strong ETag of a served frame image. Resized images are a pure function of
+    the frame bytes and the resize settings, so both go into the tag.
+    """
+    max_size = frame_image_max_size(size)
+    if max_size is None:
+        return f'"{content_hash}"'
+    return f'"{content_hash}-{size.value}{max_size}q{settings.FRAME_IMAGE_QUALITY}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison, so W/ prefixes are ignored
+    candidates = [candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")]
+    return etag in candidates
+
+
+frame_image_lookups = metrics.counter(
+    "frame_image_lookups_total",
+    "Thumbnail and preview lookups, found on disk or generated",
+    ("size", "result")
+)
+
+
+class FrameImageStore:
+    """
+    Thumbnail and preview copies of frames for HTTP clients, generated the
+    first time they are requested and kept on disk next to the frames.
+    """
+
+    def get(self, frame_path: Path, size: FrameImageSize) -> Path:
+        path = frame_image_path(frame_path, size)
+        if path.exists():
+            frame_image_lookups.inc(size=size.value, result="disk")
+            return path
+
+        with timed("frame", "resize"):
+            image = cv2.imread(str(frame_path))
+            if image is None:
+                raise ValueError(f"Could not read frame: {frame_path}")
+            data, _, _ = encode_analysis_variant(image, frame_image_max_size(size), settings.FRAME_IMAGE_QUALITY)
+            write_atomic(path, data)
+        frame_image_lookups.inc(size=size.value, result="generated")
+        return path
+
+
+frame_image_store = FrameImageStore()
@@ -1,106 +1,266 @@
 import uuid
+from collections import defaultdict
 from pathlib import Path
 from datetime import datetime
-from typing import List, Optional
-from PIL import Image
-import base64
-import io
+from typing import Dict, List, Optional, Tuple
+import hashlib
 # from app.services.openai.openai_service import OpenAIService
 
-from app.models.schemas.frame import FrameCreate, FrameInDB, FrameBatchAnalysis
+from sqlalchemy import func, or_, select
+
+from app.models.schemas.frame import FrameCreate, FrameInDB, FrameBatchAnalysis, FrameSummary
+from app.models.domain.frame import FrameRecord
+from app.models.domain.video import resolve_video_id
 from app.core.config import settings
+from app.core.database import session_scope
+from app.core.metrics import timed
+from app.services.frame.analysis_variants import analysis_variant_store
 
 class FrameService:
+    def __init__(self):
+        self.variant_store = analysis_variant_store
+
     async def create_frame(
         self,
         video_id: str,
         timestamp: float,
         frame_number: int,
-        file_path: str
+        file_path: str,
+        content_hash: Optional[str] = None
     ) -> FrameInDB:
-        frame_data = {
-            "id": str(uuid.uuid4()),
-            "video_id": video_id,
-            "timestamp": timestamp,
-            "frame_number": frame_number,
-            "file_path": file_path,
-            "created_at": datetime.utcnow(),
-            "processed": False
-        }
+        frame_key = self.frame_key_from_path(video_id, file_path)
         
-        return FrameInDB(**frame_data)
+        with session_scope() as session:
+            record = session.scalar(
+                select(FrameRecord).where(
+                    FrameRecord.video_id == video_id,
+                    FrameRecord.frame_key == frame_key
+                )
+            )
+            # Re-extracting a video overwrites its frames, keep the existing ids stable
+            if record is None:
+                record = FrameRecord(id=str(uuid.uuid4()), video_id=video_id, frame_key=frame_key)
+                session.add(record)
+            
+            record.timestamp = timestamp
+            record.frame_number = frame_number
+            record.file_path = file_path
+            record.created_at = datetime.utcnow()
+            record.processed = False
+            if record.content_hash != content_hash:
+                # A different image, its caption no longer describes it
+                record.caption = None
+                record.caption_model = None
+                record.caption_language = None
+            record.content_hash = content_hash
+            session.flush()
+            
+            return FrameInDB.model_validate(record)
+
+    @staticmethod
+    def frame_key_from_path(video_id: str, file_path: str) -> str:
+        """The "{timestamp}" part of a "{video_id}_{timestamp}.jpg" (or .webp) frame file"""
+        return Path(file_path).stem[len(video_id) + 1:]
 
     async def get_frames_by_video_id(self, video_id: str) -> List[FrameInDB]:
-        # In a real application, this would fetch from a database
-        # For now, we'll scan the frames directory
-        frames = []
-        frame_pattern = f"{video_id}_*.jpg"
+        with session_scope() as session:
+            records = session.scalars(
+                select(FrameRecord)
+                .where(FrameRecord.video_id == resolve_video_id(session, video_id))
+                .order_by(FrameRecord.timestamp)
+            )
+            return [FrameInDB.model_validate(record) for record in records]
+
+    async def get_frame_by_number(self, video_id: str, frame_number: int) -> Optional[FrameInDB]:
+        with session_scope() as session:
+            record = session.scalar(
+                select(FrameRecord).where(
+                    FrameRecord.video_id == resolve_video_id(session, video_id),
+                    FrameRecord.frame_number == frame_number
+                )
+            )
+            return FrameInDB.model_validate(record) if record else None
+
+    async def get_frames_by_keys(self, video_id: str, frame_ids: List[str]) -> List[FrameInDB]:
+        """Look up frames of a video by frame key (timestamp suffix) or frame id"""
+        with session_scope() as session:
+            records = session.scalars(
+                select(FrameRecord)
+                .where(
+                    FrameRecord.video_id == resolve_video_id(session, video_id),
+                    or_(FrameRecord.frame_key.in_(frame_ids), FrameRecord.id.in_(frame_ids))
+                )
+                .order_by(FrameRecord.timestamp)
+            )
+            return [FrameInDB.model_validate(record) for record in records]
+
+    async def get_frames_page(
+        self,
+        video_id: str,
+        limit: int,
+        after: Optional[float] = None,
+        start: Optional[float] = None,
+        end: Optional[float] = None
+    ) -> Tuple[List[FrameSummary], bool]:
+        """
+        Up to ``limit`` frames after timestamp ``after``, within [start, end],
+        and whether more follow. Seeks the timestamp index instead of skipping
+        rows, so every page costs the same however deep into the video it is.
+        """
+        with session_scope() as session:
+            query = (
+                select(FrameRecord.id, FrameRecord.frame_key, FrameRecord.timestamp, FrameRecord.frame_number)
+                .where(FrameRecord.video_id == resolve_video_id(session, video_id))
+            )
+            if start is not None:
+                query = query.where(FrameRecord.timestamp >= start)
+            if end is not None:
+                query = query.where(FrameRecord.timestamp <= end)
+            # Frame keys are derived from timestamps, so a timestamp identifies one frame
+            if after is not None:
+                query = query.where(FrameRecord.timestamp > after)
+            rows = session.execute(query.order_by(FrameRecord.timestamp).limit(limit + 1)).all()
+
+        frames = [FrameSummary(**row._mapping) for row in rows[:limit]]
+        return frames, len(rows) > limit
+
+    async def count_frames(self, video_id: str, start: Optional[float] = None, end: Optional[float] = None) -> int:
+        with session_scope() as session:
+            query = (
+                select(func.count()).select_from(FrameRecord)
+                .where(FrameRecord.video_id == resolve_video_id(session, video_id))
+            )
+            if start is not None:
+                query = query.where(FrameRecord.timestamp >= start)
+            if end is not None:
+                query = query.where(FrameRecord.timestamp <= end)
+            return session.scalar(query)
+
+    async def rebuild_index(self) -> int:
+        """
+        Bring the frame records in line with the files in FRAME_DIR, returns the frame count.
+
+        Records of files still on disk keep their ids and captions, unless the file
+        was written after the record; records of missing files are deleted.
+        """
+        frames_by_video = defaultdict(list)
+        for frame_path in settings.FRAME_DIR.glob("*_*"):
+            if frame_path.suffix not in (".jpg", ".webp"):
+                continue
+            video_id, frame_key = frame_path.stem.split("_", 1)
+            try:
+                frames_by_video[video_id].append((float(frame_key), frame_key, frame_path))
+            except ValueError:
+                print(f"Skipping unrecognised frame file: {frame_path.name}")
         
-        for frame_path in settings.FRAME_DIR.glob(frame_pattern):
-            timestamp = float(frame_path.stem.split('_')[1])
-            frame_number = len(frames) + 1
+        now = datetime.utcnow()
+        with session_scope() as session:
+            records = {(record.video_id, record.frame_key): record for record in session.scalars(select(FrameRecord))}
+            for video_id, frames in frames_by_video.items():
+                for frame_number, (timestamp, frame_key, frame_path) in enumerate(sorted(frames), start=1):
+                    record = records.pop((video_id, frame_key), None)
+                    if record is None:
+                        record = FrameRecord(
+                            id=str(uuid.uuid4()), video_id=video_id, frame_key=frame_key, created_at=now, processed=False
+                        )
+                        session.add(record)
+                    elif datetime.utcfromtimestamp(frame_path.stat().st_mtime) > record.created_at:
+                        # Replaced on disk since it was indexed, its hash and caption describe the old image
+                        record.created_at = now
+                        record.content_hash = None
+                        record.caption = None
+                        record.caption_model = None
+                        record.caption_language = None
+                    record.timestamp = timestamp
+                    record.frame_number = frame_number
+                    record.file_path = str(frame_path)
             
-            frame = await self.create_frame(
-                video_id=video_id,
-                timestamp=timestamp,
-                frame_number=frame_number,
-                file_path=str(frame_path)
-            )
-            frames.append(frame)
+            # Records whose file is gone
+            for record in records.values():
+                session.delete(record)
         
-        return sorted(frames, key=lambda x: x.timestamp)
+        return sum(len(frames) for frames in frames_by_video.values())
 
     async def prepare_frame_for_analysis(self, frame_path: Path) -> str:
         """Convert frame to base64 for API processing"""
-        with Image.open(frame_path) as img:
-            # Resize if needed (e.g., for OpenAI API requirements)
-            max_size = 1024
-            if max(img.size) > max_size:
-                ratio = max_size / max(img.size)
-                new_size = tuple(int(dim * ratio) for dim in img.size)
-                img = img.resize(new_size, Image.Resampling.LANCZOS)
-            
-            # Convert to RGB if needed
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-            
-            # Convert to base64
-            buffer = io.BytesIO()
-            img.save(buffer, format='JPEG')
-            return base64.b64encode(buffer.getvalue()).decode('utf-8')
+        return self.variant_store.get(frame_path).base64
 
-    async def process_frames_batch(
+    async def get_batch_frames(self, batch_analysis: FrameBatchAnalysis) -> List[FrameInDB]:
+        """Frame records for a batch, ordered by timestamp, with content hashes filled in"""
+        with timed("frame", "lookup"):
+            frames = await self.get_frames_by_keys(batch_analysis.video_id, batch_analysis.frame_ids)
+            self._fill_content_hashes(frames)
+        return frames
+
+    async def get_frame_by_key(self, video_id: str, frame_key: str) -> Optional[FrameInDB]:
+        """A single frame by frame key or id, with its content hash filled in"""
+        frames = await self.get_frames_by_keys(video_id, [frame_key])
+        self._fill_content_hashes(frames)
+        return frames[0] if frames else None
+
+    def _fill_content_hashes(self, frames: List[FrameInDB]):
+        # Frames indexed before hashing existed get hashed once, on first use
+        missing = [frame for frame in frames if frame.content_hash is None]
+        if missing:
+            with session_scope() as session:
+                for frame in missing:
+                    try:
+                        frame.content_hash = hashlib.sha256(Path(frame.file_path).read_bytes()).hexdigest()
+                    except OSError as e:
+                        print(f"Error hashing frame {frame.frame_key}: {str(e)}")
+                        continue
+                    record = session.get(FrameRecord, frame.id)
+                    if record is not None:
+                        record.content_hash = frame.content_hash
+
+    async def save_captions(self, captions: Dict[str, str], model: str, language: str):
+        """Store captions by frame id, written in ``language``"""
+        with session_scope() as session:
+            for frame_id, caption in captions.items():
+                record = session.get(FrameRecord, frame_id)
+                if record is not None:
+                    record.caption = caption
+                    record.caption_model = model
+                    record.caption_language = language
+
+    async def encode_frames(
         self,
-        batch_analysis: FrameBatchAnalysis
+        records: List[FrameInDB],
+        max_size: Optional[int] = None,
+        detail: str = "auto"
     ) -> List[dict]:
-        """Process a batch of frames using OpenAI Vision API"""
+        """Base64 payloads sent to the vision model, from the precomputed analysis variants"""
         frames = []
         
-        for frame_id in batch_analysis.frame_ids:
-            frame_path = next(settings.FRAME_DIR.glob(f"*_{frame_id}.jpg"), None)
-            
-            if frame_path:
-                try:
-                    # Get frame data
-                    timestamp = float(frame_path.stem.split('_')[1])
-                    
-                    # Read and encode image to base64
-                    with open(frame_path, "rb") as image_file:
-                        base64_image = base64.b64encode(image_file.read()).decode("utf-8")
-                    
-                    frame = {
-                        "id": frame_id,
-                        "timestamp": timestamp,
-                        "file_path": str(frame_path),
-                        "image_url": {
-                            "url": f"data:image/jpeg;base64,{base64_image}"
-                        }
+        for record in records:
+            try:
+                with timed("frame", "encode"):
+                    variant = self.variant_store.get(Path(record.file_path), max_size)
+                
+                frame = {
+                    "id": record.frame_key,
+                    "timestamp": record.timestamp,
+                    "file_path": record.file_path,
+                    "width": variant.width,
+                    "height": variant.height,
+                    "image_url": {
+                        "url": variant.data_url,
+                        "detail": detail
                     }
-                    frames.append(frame)
-                except Exception as e:
-                    print(f"Error processing frame {frame_id}: {str(e)}")
-                    continue
+                }
+                frames.append(frame)
+            except Exception as e:
+                print(f"Error processing frame {record.frame_key}: {str(e)}")
+                continue
         
         # Sort frames by timestamp
         sorted_frames = sorted(frames, key=lambda x: x["timestamp"])
-        return sorted_frames 
\ No newline at end of file
+        return sorted_frames
+
+    async def process_frames_batch(
+        self,
+        batch_analysis: FrameBatchAnalysis
+    ) -> List[dict]:
+        """Process a batch of frames using OpenAI Vision API"""
+        records = await self.get_frames_by_keys(batch_analysis.video_id, batch_analysis.frame_ids)
+        return await self.encode_frames(records)
@@ -0,0 +1,20 @@
+import cv2
+import numpy as np
+
+
+def draw_timestamp(image: np.ndarray, seconds: float, font_scale: float = 1.0, thickness: int = 1) -> np.ndarray:
+    """
+    Draw the "<seconds> sec" label in the top left corner of a BGR image, in place.
+
+    Extracted frames get it at scale 1 so the model can read timestamps off
+    the images; contact sheet tiles use a smaller scale.
+    """
+    # Add timestamp text to frame
+    # Add black background rectangle for better text visibility
+    text = f"{int(seconds)} sec"
+    font = cv2.FONT_HERSHEY_SIMPLEX
+    (text_width, text_height), _ = cv2.getTextSize(text, font, font_scale, thickness)
+    margin = max(int(round(5 * font_scale)), 1)
+    cv2.rectangle(image, (margin, margin), (text_width + 3 * margin, text_height + 3 * margin), (100, 100, 100), -1)
+    cv2.putText(image, text, (2 * margin, int(round(30 * font_scale))), font, font_scale, (255, 255, 255), thickness)
+    return image
@@ -0,0 +1,292 @@
+import asyncio
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.database import session_scope
+from app.core.metrics import metrics
+from app.models.domain.video import VideoRecord
+from app.models.schemas.video import JobPriority, VideoInDB
+from app.services.jobs.job_state_service import DEFAULT_TENANT, JobStateService, JobStatus, QueueHead
+
+# Lower runs first
+PRIORITY_RANKS = {JobPriority.INTERACTIVE: 0, JobPriority.BULK: 1}
+
+
+class QueueFullError(Exception):
+    """Raised when the extraction queue cannot take another job"""
+
+
+def _run_extraction_job(video_data: dict, cancel_event, metrics_queue=None) -> Tuple[int, List[str]]:
+    # Runs inside a pool process, so import the service lazily to keep the
+    # parent's import graph out of the pickled call
+    from app.services.storage.storage_manager import storage_manager
+    from app.services.video.video_service import VideoService
+
+    video = VideoInDB(**video_data)
+    try:
+        result = asyncio.run(VideoService().process_video(video, cancel_event=cancel_event))
+        if settings.STORAGE_DELETE_SOURCE_AFTER_EXTRACTION and not cancel_event.is_set():
+            storage_manager.release_source(video.id)
+        return result
+    finally:
+        # Failed jobs report what they measured too
+        if metrics_queue is not None:
+            metrics_queue.put(metrics.snapshot(reset=True))
+
+
+@dataclass
+class ExtractionJob:
+    video_id: str
+    tenant: str
+    future: Future
+    cancel_event: object
+    # Cancelled by a user rather than interrupted by a shutdown
+    cancel_requested: bool = False
+
+    @property
+    def running(self) -> bool:
+        return self.future.running()
+
+
+class ExtractionJobRunner:
+    """
+    Schedules frame extraction onto a process pool so OpenCV decode and JPEG
+    encoding never block the API event loop.
+
+    Waiting jobs stay in the extraction_jobs table, so the queue survives a
+    restart, and a job is only handed to the pool when one of ``max_workers``
+    processes is free. The next job is the oldest of the highest priority
+    waiting (interactive before bulk), from the tenant with the fewest jobs
+    running and, between those, the one served least recently, so one
+    tenant's backfill can't take every worker. A tenant runs at most
+    EXTRACTION_TENANT_MAX_RUNNING jobs at once when that is set.
+
+    Beyond ``max_queue_size`` waiting interactive jobs, or
+    EXTRACTION_BULK_QUEUE_SIZE bulk ones, submit raises QueueFullError so
+    callers can apply backpressure.
+
+    Only one API process may run the scheduler against a database: jobs are
+    not marked with the process running them, so start() takes every job
+    left processing for one interrupted by a restart.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, max_queue_size: Optional[int] = None):
+        self.max_workers = max_workers or settings.EXTRACTION_WORKERS or os.cpu_count() or 1
+        self.max_queue_size = settings.EXTRACTION_QUEUE_SIZE if max_queue_size is None else max_queue_size
+        self.max_bulk_queue_size = settings.EXTRACTION_BULK_QUEUE_SIZE
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._manager = None
+        self._metrics_queue = None
+        # Jobs handed to the pool
+        self._jobs: Dict[str, ExtractionJob] = {}
+        self._last_started: Dict[str, float] = {}
+        self._stopping = False
+        self._lock = threading.RLock()
+        self.job_state_service = JobStateService()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Spawn instead of fork: the API process has a running event loop and threads
+            context = multiprocessing.get_context("spawn")
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+            self._manager = context.Manager()
+            self._metrics_queue = self._manager.Queue()
+        return self._executor
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue_size
+
+    @property
+    def running_count(self) -> int:
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job.running)
+
+    @property
+    def queue_depth(self) -> int:
+        with self._lock:
+            dispatched = list(self._jobs)
+        return self.job_state_service.count_waiting(exclude=dispatched)
+
+    def _queue_limit(self, priority: JobPriority) -> int:
+        return self.max_queue_size if priority == JobPriority.INTERACTIVE else self.max_bulk_queue_size
+
+    def has_capacity(self, priority: JobPriority = JobPriority.INTERACTIVE) -> bool:
+        with self._lock:
+            dispatched = list(self._jobs)
+        waiting = self.job_state_service.count_waiting(PRIORITY_RANKS[priority], exclude=dispatched)
+        # Free workers take jobs right away
+        return waiting < self._queue_limit(priority) + max(self.max_workers - len(dispatched), 0)
+
+    def ensure_capacity(self, priority: JobPriority = JobPriority.INTERACTIVE):
+        if not self.has_capacity(priority):
+            raise QueueFullError(
+                f"Extraction queue is full ({self._queue_limit(priority)} {priority.value} jobs waiting), "
+                f"try again later"
+            )
+
+    def start(self):
+        """
+        Queue again the jobs a previous API process was running when it died,
+        and start waiting jobs. Assumes no other API process uses the database.
+        """
+        requeued = self.job_state_service.requeue()
+        if requeued:
+            print(f"Requeued {requeued} extraction jobs interrupted by a restart")
+        self._stopping = False
+        self._dispatch()
+
+    def submit(
+        self,
+        video: VideoInDB,
+        priority: JobPriority = JobPriority.INTERACTIVE,
+        tenant: Optional[str] = None
+    ):
+        """Queue extraction of a video, it starts as soon as the scheduler picks it"""
+        with self._lock:
+            self.ensure_capacity(priority)
+            self.job_state_service.create(video.id, PRIORITY_RANKS[priority], tenant or DEFAULT_TENANT)
+        self._dispatch()
+
+    def cancel(self, video_id: str) -> bool:
+        """Cancel a waiting job or ask a running one to stop after the current frame"""
+        with self._lock:
+            job = self._jobs.get(video_id)
+            if job is None:
+                return self.job_state_service.cancel_waiting(video_id)
+            job.cancel_requested = True
+
+        if not job.future.cancel():
+            job.cancel_event.set()
+        return True
+
+    def get_job(self, video_id: str) -> Optional[ExtractionJob]:
+        with self._lock:
+            return self._jobs.get(video_id)
+
+    def _dispatch(self):
+        """Hand waiting jobs to free workers, best candidate first"""
+        while True:
+            with self._lock:
+                if self._stopping or len(self._jobs) >= self.max_workers:
+                    return
+                head = self._next_job()
+                if head is None:
+                    return
+                job = self._start_job(head)
+            if job is not None:
+                job.future.add_done_callback(partial(self._on_job_done, job.video_id))
+
+    def _next_job(self) -> Optional[QueueHead]:
+        running = Counter(job.tenant for job in self._jobs.values())
+        tenant_limit = settings.EXTRACTION_TENANT_MAX_RUNNING
+        heads = [
+            head for head in self.job_state_service.queue_heads(exclude=list(self._jobs))
+            if not tenant_limit or running[head.tenant] < tenant_limit
+        ]
+        if not heads:
+            return None
+        return min(heads, key=lambda head: (
+            head.priority,
+            running[head.tenant],
+            self._last_started.get(head.tenant, 0.0),
+            head.created_at
+        ))
+
+    def _start_job(self, head: QueueHead) -> Optional[ExtractionJob]:
+        with session_scope() as session:
+            record = session.get(VideoRecord, head.video_id)
+            video = VideoInDB.model_validate(record) if record else None
+        if video is None:
+            # Deleted, e.g. evicted, while it waited
+            self.job_state_service.finish(head.video_id, JobStatus.FAILED, error="Video no longer exists")
+            return None
+
+        executor = self._get_executor()
+        cancel_event = self._manager.Event()
+        future = executor.submit(
+            _run_extraction_job,
+            video.model_dump(mode="json"),
+            cancel_event,
+            self._metrics_queue
+        )
+        job = ExtractionJob(video_id=video.id, tenant=head.tenant, future=future, cancel_event=cancel_event)
+        self._jobs[video.id] = job
+        self._last_started[head.tenant] = time.monotonic()
+        return job
+
+    def collect_metrics(self):
+        """Merge the metrics workers sent after their jobs into this process's registry"""
+        if self._metrics_queue is None:
+            return
+        while True:
+            try:
+                snapshot = self._metrics_queue.get_nowait()
+            except (queue.Empty, OSError, EOFError):
+                # Empty, or the manager is already shut down
+                return
+            metrics.merge(snapshot)
+
+    def _on_job_done(self, video_id: str, future: Future):
+        with self._lock:
+            self._jobs.pop(video_id, None)
+        self.collect_metrics()
+
+        if future.cancelled():
+            print(f"Extraction job {video_id} cancelled before it started")
+            self.job_state_service.finish(video_id, JobStatus.CANCELLED)
+        else:
+            error = future.exception()
+            if error is not None:
+                print(f"Extraction job {video_id} failed: {str(error)}")
+                self.job_state_service.finish(video_id, JobStatus.FAILED, error=str(error))
+
+        # The worker is free for the next job
+        self._dispatch()
+
+    def shutdown(self):
+        with self._lock:
+            self._stopping = True
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            job.future.cancel()
+            job.cancel_event.set()
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        if self._manager is not None:
+            self.collect_metrics()
+            self._manager.shutdown()
+            self._manager = None
+            self._metrics_queue = None
+
+        # Interrupted jobs run again from the start after the restart, cancelled
+        # ones stay cancelled and requeue leaves jobs that completed meanwhile
+        interrupted = [job.video_id for job in jobs if not job.cancel_requested]
+        if interrupted:
+            self.job_state_service.requeue(interrupted)
+
+
+job_runner = ExtractionJobRunner()
+
+metrics.gauge(
+    "extraction_jobs",
+    "Extraction jobs of this API process by state",
+    ("state",),
+    function=lambda: {"queued": job_runner.queue_depth, "running": job_runner.running_count}
+)
+metrics.gauge(
+    "extraction_queue_capacity",
+    "Extraction jobs accepted at once, running and queued",
+    function=lambda: job_runner.capacity
+)
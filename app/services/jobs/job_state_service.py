@@ -0,0 +1,283 @@
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Collection, List, Optional
+
+from sqlalchemy import func, select, update
+
+from app.core.config import settings
+from app.core.database import as_utc, session_scope
+from app.models.domain.job import ExtractionJobRecord
+from app.models.domain.video import VideoRecord, resolve_video_id
+from app.models.schemas.video import VideoProcessingStatus
+
+
+class JobStatus:
+    PENDING = "pending"
+    PROCESSING = "processing"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+    TERMINAL = {COMPLETED, FAILED, CANCELLED}
+
+
+# Tenant of requests that don't name one, and of jobs queued before tenants existed
+DEFAULT_TENANT = "default"
+
+
+@dataclass
+class QueueHead:
+    """The oldest waiting job of one priority and tenant"""
+    video_id: str
+    priority: int
+    tenant: str
+    created_at: datetime
+
+
+class JobStateService:
+    """
+    Extraction progress shared between the API and the extraction processes.
+
+    Records live in the metadata database, so shard processes can each bump
+    the frame counter and the API can read a consistent view without any
+    in-memory coordination.
+    """
+
+    def create(self, video_id: str, priority: int = 0, tenant: str = DEFAULT_TENANT):
+        now = datetime.now(timezone.utc)
+        with session_scope() as session:
+            session.merge(ExtractionJobRecord(
+                video_id=video_id,
+                status=JobStatus.PENDING,
+                frames_done=0,
+                frames_expected=None,
+                created_at=now,
+                started_at=None,
+                updated_at=now,
+                finished_at=None,
+                error=None,
+                priority=priority,
+                tenant=tenant
+            ))
+
+    def queue_heads(self, exclude: Collection[str] = ()) -> List[QueueHead]:
+        """The oldest waiting job of each priority and tenant, leaving out jobs already handed to a worker"""
+        priority = func.coalesce(ExtractionJobRecord.priority, 0)
+        tenant = func.coalesce(ExtractionJobRecord.tenant, DEFAULT_TENANT)
+        ranked = (
+            select(
+                ExtractionJobRecord.video_id,
+                priority.label("priority"),
+                tenant.label("tenant"),
+                ExtractionJobRecord.created_at,
+                func.row_number().over(
+                    partition_by=(priority, tenant),
+                    order_by=(ExtractionJobRecord.created_at, ExtractionJobRecord.video_id)
+                ).label("position")
+            )
+            .where(ExtractionJobRecord.status == JobStatus.PENDING, ExtractionJobRecord.video_id.not_in(exclude))
+            .subquery()
+        )
+        with session_scope() as session:
+            rows = session.execute(
+                select(ranked.c.video_id, ranked.c.priority, ranked.c.tenant, ranked.c.created_at)
+                .where(ranked.c.position == 1)
+            ).all()
+        return [QueueHead(row.video_id, row.priority, row.tenant, as_utc(row.created_at)) for row in rows]
+
+    def count_waiting(self, priority: Optional[int] = None, exclude: Collection[str] = ()) -> int:
+        query = (
+            select(func.count())
+            .select_from(ExtractionJobRecord)
+            .where(ExtractionJobRecord.status == JobStatus.PENDING, ExtractionJobRecord.video_id.not_in(exclude))
+        )
+        if priority is not None:
+            query = query.where(func.coalesce(ExtractionJobRecord.priority, 0) == priority)
+        with session_scope() as session:
+            return session.scalar(query)
+
+    def count_running(self) -> int:
+        query = (
+            select(func.count())
+            .select_from(ExtractionJobRecord)
+            .where(ExtractionJobRecord.status == JobStatus.PROCESSING)
+        )
+        with session_scope() as session:
+            return session.scalar(query)
+
+    def requeue(self, video_ids: Optional[Collection[str]] = None) -> int:
+        """
+        Put jobs back in the queue to start over: the given ones, e.g. interrupted
+        by a shutdown, or every job left processing by a process that died.
+
+        Given jobs are only requeued while processing or cancelled, the state a
+        shutdown leaves them in, so one that completed meanwhile is never
+        extracted again.
+        """
+        query = update(ExtractionJobRecord)
+        if video_ids is None:
+            query = query.where(ExtractionJobRecord.status == JobStatus.PROCESSING)
+        else:
+            query = query.where(
+                ExtractionJobRecord.video_id.in_(video_ids),
+                ExtractionJobRecord.status.in_((JobStatus.PROCESSING, JobStatus.CANCELLED))
+            )
+        with session_scope() as session:
+            result = session.execute(query.values(
+                status=JobStatus.PENDING,
+                frames_done=0,
+                started_at=None,
+                finished_at=None,
+                error=None,
+                updated_at=datetime.now(timezone.utc)
+            ))
+            return result.rowcount
+
+    def get_batch_statuses(self, batch_id: str) -> List[VideoProcessingStatus]:
+        """Status of every video queued by a batch ingestion, in the order they were queued"""
+        with session_scope() as session:
+            video_ids = session.scalars(
+                select(VideoRecord.id)
+                .where(VideoRecord.batch_id == batch_id)
+                .order_by(VideoRecord.created_at, VideoRecord.id)
+            ).all()
+        statuses = []
+        for video_id in video_ids:
+            status = self.get_status(video_id)
+            # Duplicates of videos extracted before job tracking existed
+            statuses.append(status or VideoProcessingStatus(
+                video_id=video_id, status=JobStatus.COMPLETED, progress=100.0
+            ))
+        return statuses
+
+    def start(self, video_id: str, frames_expected: int):
+        now = datetime.now(timezone.utc)
+        with session_scope() as session:
+            record = session.get(ExtractionJobRecord, video_id)
+            if record is None:
+                record = ExtractionJobRecord(video_id=video_id, created_at=now)
+                session.add(record)
+            record.status = JobStatus.PROCESSING
+            record.frames_done = 0
+            record.frames_expected = frames_expected
+            record.started_at = now
+            record.updated_at = now
+            record.finished_at = None
+            record.error = None
+
+    def advance(self, video_id: str, frames: int):
+        # Incremented in SQL so concurrent shard processes don't overwrite each other
+        with session_scope() as session:
+            session.execute(
+                update(ExtractionJobRecord)
+                .where(ExtractionJobRecord.video_id == video_id)
+                .values(
+                    frames_done=ExtractionJobRecord.frames_done + frames,
+                    updated_at=datetime.now(timezone.utc)
+                )
+            )
+
+    def finish(
+        self,
+        video_id: str,
+        status: str,
+        error: Optional[str] = None,
+        frames_done: Optional[int] = None
+    ):
+        """
+        ``frames_done`` replaces the progress counter with the number of frames
+        actually stored, for jobs whose progress counted something else.
+        """
+        now = datetime.now(timezone.utc)
+        with session_scope() as session:
+            record = session.get(ExtractionJobRecord, video_id)
+            if record is None or record.status in JobStatus.TERMINAL:
+                return
+            if frames_done is not None:
+                record.frames_done = frames_done
+                record.frames_expected = frames_done
+            record.status = status
+            record.error = error
+            record.updated_at = now
+            record.finished_at = now
+
+    def cancel_waiting(self, video_id: str) -> bool:
+        """Cancel a job that hasn't started, False when there is no such job"""
+        now = datetime.now(timezone.utc)
+        with session_scope() as session:
+            result = session.execute(
+                update(ExtractionJobRecord)
+                .where(ExtractionJobRecord.video_id == video_id, ExtractionJobRecord.status == JobStatus.PENDING)
+                .values(status=JobStatus.CANCELLED, updated_at=now, finished_at=now)
+            )
+            return result.rowcount == 1
+
+    def get_status(self, video_id: str) -> Optional[VideoProcessingStatus]:
+        with session_scope() as session:
+            # Deduplicated videos report the progress of the extraction they reuse
+            record = session.get(ExtractionJobRecord, resolve_video_id(session, video_id))
+            if record is None:
+                return None
+            status = self._to_status(record)
+            status.video_id = video_id
+            return status
+
+    def _to_status(self, record: ExtractionJobRecord) -> VideoProcessingStatus:
+        frames_per_second = None
+        eta_seconds = None
+        progress = 0.0
+
+        if record.status == JobStatus.COMPLETED:
+            progress = 100.0
+        elif record.frames_expected:
+            progress = min(100.0 * record.frames_done / record.frames_expected, 100.0)
+
+        if record.started_at is not None and record.frames_done:
+            end = as_utc(record.finished_at) if record.finished_at else datetime.now(timezone.utc)
+            elapsed = (end - as_utc(record.started_at)).total_seconds()
+            if elapsed > 0:
+                frames_per_second = record.frames_done / elapsed
+            if record.status == JobStatus.PROCESSING and frames_per_second and record.frames_expected:
+                eta_seconds = max(record.frames_expected - record.frames_done, 0) / frames_per_second
+
+        messages = {
+            JobStatus.PENDING: "Waiting for an extraction worker",
+            JobStatus.PROCESSING: f"Extracting frames: {record.frames_done}/{record.frames_expected or '?'}",
+            JobStatus.COMPLETED: f"Processing completed. {record.frames_done} frames extracted",
+            JobStatus.FAILED: f"Processing failed: {record.error}",
+            JobStatus.CANCELLED: f"Processing cancelled after {record.frames_done} frames",
+        }
+
+        return VideoProcessingStatus(
+            video_id=record.video_id,
+            status=record.status,
+            progress=round(progress, 1),
+            message=messages.get(record.status),
+            frames_done=record.frames_done,
+            frames_expected=record.frames_expected,
+            frames_per_second=round(frames_per_second, 2) if frames_per_second else None,
+            eta_seconds=round(eta_seconds, 1) if eta_seconds is not None else None
+        )
+
+
+class ProgressReporter:
+    """Batches per-frame progress so the database is written at most every PROGRESS_FLUSH_INTERVAL"""
+
+    def __init__(self, video_id: str, job_state_service: Optional[JobStateService] = None):
+        self.video_id = video_id
+        self.job_state_service = job_state_service or JobStateService()
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+    def advance(self, frames: int = 1):
+        self._pending += frames
+        if time.monotonic() - self._last_flush >= settings.PROGRESS_FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            self.job_state_service.advance(self.video_id, self._pending)
+            self._pending = 0
+        self._last_flush = time.monotonic()
+
@@ -0,0 +1,158 @@
+import hashlib
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete
+
+from app.core.config import settings
+from app.core.database import session_scope
+from app.core.metrics import metrics, timed
+from app.models.domain.conversation import ConversationSummaryRecord
+from app.models.schemas.frame import FrameBatchAnalysis
+from app.services.openai.token_estimator import estimate_message_tokens
+
+conversation_summaries = metrics.counter(
+    "conversation_summaries_total",
+    "Rolling summaries of chat history by outcome: reused, rolled, truncated or failed",
+    ("result",)
+)
+
+SUMMARY_PROMPT = ("Summarize this conversation between a user and an assistant analyzing a video, so the "
+                  "assistant can continue it without the full transcript. Keep the user's questions, the "
+                  "findings of the answers with their timestamps, and anything the user asked to keep in "
+                  "mind. Write the summary in the language of the conversation, in at most {words} words.")
+
+
+def normalize_history(messages: List[Dict]) -> List[Dict]:
+    """User and assistant turns as plain text chat messages, whatever else the client stored with them"""
+    history = []
+    for message in messages:
+        role = message.get("role")
+        if role not in ("user", "assistant"):
+            continue
+        content = message.get("content", "")
+        if isinstance(content, list):
+            content = "\n".join(part.get("text", "") for part in content if part.get("type") == "text")
+        content = str(content).strip()
+        if content:
+            history.append({"role": role, "content": content})
+    return history
+
+
+def history_hash(messages: List[Dict]) -> str:
+    payload = json.dumps([[message["role"], message["content"]] for message in messages], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ConversationHistory:
+    """
+    Chat history of analyze requests, sent as chat messages of bounded size.
+
+    Once the turns since the last summary exceed ``token_budget`` estimated
+    tokens, the older ones are folded into a rolling summary and about
+    ``recent_tokens`` of the latest turns stay verbatim. Summaries are stored
+    per conversation id together with the count and hash of the messages they
+    cover, so following turns reuse them and a summary call is only made
+    every few turns, however long the conversation gets. Requests without a
+    conversation id just drop the older turns.
+    """
+
+    def __init__(self, openai_service, token_budget: Optional[int] = None, recent_tokens: Optional[int] = None):
+        self.openai_service = openai_service
+        self.token_budget = token_budget or settings.CHAT_HISTORY_TOKEN_BUDGET
+        self.recent_tokens = min(recent_tokens or settings.CHAT_HISTORY_RECENT_TOKENS, self.token_budget)
+
+    async def prepare(self, batch_analysis: FrameBatchAnalysis) -> List[Dict]:
+        """Messages to send ahead of the current question, the last message of the request"""
+        history = normalize_history(batch_analysis.messages[:-1])
+        if estimate_message_tokens(history) <= self.token_budget:
+            return history
+
+        conversation_id = batch_analysis.conversation_id
+        if not conversation_id:
+            conversation_summaries.inc(result="truncated")
+            return history[self._recent_start(history):]
+
+        summary, covered = self._load(conversation_id, history)
+        recent = history[covered:]
+        if estimate_message_tokens(recent) <= self.token_budget:
+            conversation_summaries.inc(result="reused")
+            return self._compose(summary, recent)
+
+        cutoff = covered + self._recent_start(recent)
+        if cutoff == covered:
+            # A single turn longer than the budget, nothing older to fold
+            return self._compose(summary, recent)
+        try:
+            with timed("openai", "summarize"):
+                summary = await self._summarize(summary, history[covered:cutoff], batch_analysis.model)
+        except Exception as e:
+            print(f"Failed to summarize conversation {conversation_id}: {str(e)}")
+            conversation_summaries.inc(result="failed")
+            return self._compose(summary, history[cutoff:])
+
+        self._save(conversation_id, summary, history[:cutoff])
+        conversation_summaries.inc(result="rolled")
+        return self._compose(summary, history[cutoff:])
+
+    def _recent_start(self, messages: List[Dict]) -> int:
+        """Index of the first of the latest messages fitting ``recent_tokens``, keeping at least the last one"""
+        start = len(messages) - 1
+        tokens = estimate_message_tokens(messages[start:])
+        while start > 0:
+            tokens += estimate_message_tokens(messages[start - 1:start])
+            if tokens > self.recent_tokens:
+                break
+            start -= 1
+        return start
+
+    @staticmethod
+    def _compose(summary: Optional[str], recent: List[Dict]) -> List[Dict]:
+        if not summary:
+            return recent
+        return [{"role": "system", "content": f"Summary of the earlier conversation: {summary}"}] + recent
+
+    async def _summarize(self, summary: Optional[str], messages: List[Dict], model: str) -> str:
+        transcript = "\n\n".join(
+            f"{'User' if message['role'] == 'user' else 'Assistant'}: {message['content']}"
+            for message in messages
+        )
+        earlier = f"Summary of the conversation before these turns:\n{summary}\n\n" if summary else ""
+        prompt = (f"{SUMMARY_PROMPT.format(words=settings.CHAT_SUMMARY_MAX_TOKENS * 2 // 3)}\n\n"
+                  f"{earlier}"
+                  f"Conversation:\n{transcript}")
+        response = await self.openai_service.create_chat_completion(
+            model=settings.CHAT_SUMMARY_MODEL or model,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=settings.CHAT_SUMMARY_MAX_TOKENS
+        )
+        return response.choices[0].message.content.strip()
+
+    @staticmethod
+    def _load(conversation_id: str, history: List[Dict]) -> Tuple[Optional[str], int]:
+        """The stored summary and the messages it covers, unless the history no longer starts with them"""
+        with session_scope() as session:
+            record = session.get(ConversationSummaryRecord, conversation_id)
+            if record is None:
+                return None, 0
+            if record.message_count > len(history) or record.history_hash != history_hash(history[:record.message_count]):
+                # The client cleared or edited its history under the same id
+                return None, 0
+            return record.summary, record.message_count
+
+    @staticmethod
+    def _save(conversation_id: str, summary: str, covered: List[Dict]):
+        now = datetime.now(timezone.utc)
+        with session_scope() as session:
+            session.merge(ConversationSummaryRecord(
+                conversation_id=conversation_id,
+                summary=summary,
+                message_count=len(covered),
+                history_hash=history_hash(covered),
+                updated_at=now
+            ))
+            session.execute(
+                delete(ConversationSummaryRecord)
+                .where(ConversationSummaryRecord.updated_at < now - timedelta(seconds=settings.CHAT_SUMMARY_TTL))
+            )
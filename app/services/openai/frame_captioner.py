@@ -0,0 +1,167 @@
+import asyncio
+import hashlib
+import json
+import re
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.metrics import metrics, timed
+from app.models.schemas.frame import FrameInDB
+from app.services.frame.caption_index import CaptionIndex
+
+frame_captions = metrics.counter(
+    "frame_captions_total",
+    "Frames described by the caption model, or left without a caption when its answer couldn't be read",
+    ("result",)
+)
+
+CAPTION_PROMPT = ("Each image is a frame of a video, in time order. Describe each frame in one short sentence "
+                  "in {language}: the animals or people visible, what they are doing and where. Answer with a "
+                  'JSON object {{"captions": [...]}} holding exactly {count} captions, one per image, in order.')
+
+_NUMBERED_LINE = re.compile(r"^\s*(?:\[?\d+[\].:)]\s*)?(.+?)\s*$")
+
+
+def is_captioned(record: FrameInDB, language: str) -> bool:
+    """Whether the frame has a caption to search with questions in ``language``"""
+    return bool(record.caption) and record.caption_language == language
+
+
+def parse_captions(text: str, count: int) -> List[Optional[str]]:
+    """Captions from the model's answer, None for frames it didn't describe"""
+    try:
+        captions = json.loads(text)["captions"]
+    except (ValueError, KeyError, TypeError):
+        captions = None
+    if not isinstance(captions, list):
+        # Plain or numbered lines when the answer isn't the requested JSON
+        captions = [_NUMBERED_LINE.match(line).group(1) for line in text.splitlines() if line.strip()]
+        if len(captions) != count:
+            return [None] * count
+    captions = [str(caption).strip() or None for caption in captions[:count]]
+    return captions + [None] * (count - len(captions))
+
+
+class FrameCaptioner:
+    """
+    Describes each frame once with a cheap model and picks the frames a
+    follow-up question is about by searching those captions.
+
+    Captions are stored on the frame records, so a frame is only captioned
+    again after its image changes. Retrieval runs on an in-memory
+    CaptionIndex of the captions, kept for recently searched frame sets.
+    """
+
+    def __init__(self, openai_service, frame_service, max_indexes: int = 16):
+        self.openai_service = openai_service
+        self.frame_service = frame_service
+        self.max_indexes = max_indexes
+        self._indexes: "OrderedDict[str, CaptionIndex]" = OrderedDict()
+        # Background captioning and the first follow-up question would otherwise describe the same
+        # frames. Entries hold the lock and how many calls use it, and go once no call does.
+        self._locks: Dict[str, List] = {}
+
+    @asynccontextmanager
+    async def _video_lock(self, video_id: str) -> AsyncIterator[None]:
+        entry = self._locks.setdefault(video_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[video_id]
+
+    async def caption_frames(self, records: List[FrameInDB], language: str) -> List[FrameInDB]:
+        """
+        The records with a caption in ``language`` filled in for every frame the
+        model described. Captions written in another language are replaced.
+        """
+        if not records:
+            return records
+        async with self._video_lock(records[0].video_id):
+            missing = [record for record in records if not is_captioned(record, language)]
+            # Frames captioned by an earlier call while this one waited for the lock
+            stored = {
+                frame.id: frame.caption
+                for frame in await self.frame_service.get_frames_by_keys(
+                    records[0].video_id, [record.id for record in missing]
+                )
+                if is_captioned(frame, language)
+            } if missing else {}
+            missing = [record for record in missing if record.id not in stored]
+
+            batch_size = max(settings.CAPTION_BATCH_SIZE, 1)
+            batches = [missing[start:start + batch_size] for start in range(0, len(missing), batch_size)]
+            with timed("frame", "caption"):
+                results = await asyncio.gather(*[self._caption_batch(batch, language) for batch in batches])
+            captions = {frame_id: caption for result in results for frame_id, caption in result.items()}
+            if captions:
+                await self.frame_service.save_captions(captions, settings.CAPTION_MODEL, language)
+
+        captions.update(stored)
+        # Frames left without a caption in this language aren't searched with a caption in another
+        return [
+            record if is_captioned(record, language)
+            else record.model_copy(update={"caption": captions.get(record.id), "caption_language": language})
+            for record in records
+        ]
+
+    async def retrieve(
+        self,
+        records: List[FrameInDB],
+        question: str,
+        language: str,
+        top_k: Optional[int] = None
+    ) -> List[FrameInDB]:
+        """The ``top_k`` frames whose captions and timestamps best match the question, in timestamp order"""
+        top_k = top_k or settings.CAPTION_RETRIEVAL_TOP_K
+        if len(records) <= top_k:
+            return records
+        records = await self.caption_frames(records, language)
+        with timed("frame", "retrieve"):
+            rows = self._index(records).search(question, top_k)
+        return [records[row] for row in rows]
+
+    def _index(self, records: List[FrameInDB]) -> CaptionIndex:
+        key = hashlib.sha256(
+            json.dumps([[record.id, record.caption] for record in records], ensure_ascii=False).encode("utf-8")
+        ).hexdigest()
+        index = self._indexes.get(key)
+        if index is None:
+            index = CaptionIndex([record.caption or "" for record in records], [record.timestamp for record in records])
+            self._indexes[key] = index
+            while len(self._indexes) > self.max_indexes:
+                self._indexes.popitem(last=False)
+        self._indexes.move_to_end(key)
+        return index
+
+    async def _caption_batch(self, records: List[FrameInDB], language: str) -> Dict[str, str]:
+        frames = await self.frame_service.encode_frames(records, settings.CAPTION_IMAGE_SIZE, detail="low")
+        if not frames:
+            return {}
+        content = [{"type": "text", "text": CAPTION_PROMPT.format(language=language, count=len(frames))}]
+        content.extend({"type": "image_url", "image_url": frame["image_url"]} for frame in frames)
+        try:
+            response = await self.openai_service.create_chat_completion(
+                model=settings.CAPTION_MODEL,
+                messages=[{"role": "user", "content": content}],
+                image_sizes=[(frame.get("width"), frame.get("height")) for frame in frames],
+                max_tokens=settings.CAPTION_MAX_TOKENS * len(frames) + 20,
+                response_format={"type": "json_object"}
+            )
+        except Exception as e:
+            print(f"OpenAI API Error while captioning frames: {str(e)}")
+            frame_captions.inc(len(frames), result="failed")
+            return {}
+
+        captions = parse_captions(response.choices[0].message.content or "", len(frames))
+        # encode_frames sorts by timestamp and skips unreadable frames, match captions back by frame key
+        ids = {record.frame_key: record.id for record in records}
+        result = {ids[frame["id"]]: caption for frame, caption in zip(frames, captions) if caption}
+        frame_captions.inc(len(result), result="captioned")
+        frame_captions.inc(len(frames) - len(result), result="failed")
+        return result
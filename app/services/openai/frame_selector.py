@@ -0,0 +1,180 @@
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from app.core.config import settings
+from app.models.schemas.frame import FrameInDB
+from app.services.frame.contact_sheets import sheet_tokens_per_frame
+from app.services.openai.token_estimator import estimate_image_tokens
+
+
+@dataclass
+class FrameSelection:
+    frames: List[FrameInDB]
+    frames_requested: int
+    max_size: int
+    detail: str
+    tokens_per_image: int
+    token_budget: int
+    latency_budget: float
+    window_size: Optional[int] = None
+    # Frames per image sent, above 1 when frames are packed into contact sheets
+    frames_per_image: int = 1
+
+    @property
+    def frames_per_call(self) -> int:
+        if not self.window_size:
+            return len(self.frames)
+        return min(len(self.frames), self.window_size * self.frames_per_image)
+
+    @property
+    def estimated_image_tokens(self) -> int:
+        return self.tokens_per_image * len(self.frames)
+
+    @property
+    def estimated_latency(self) -> float:
+        # Windows run concurrently, so a windowed analysis costs one window plus the reduce call
+        latency = estimate_latency(self.frames_per_call, self.tokens_per_image)
+        if len(self.frames) > self.frames_per_call:
+            latency += settings.ANALYSIS_LATENCY_BASE
+        return latency
+
+    def summary(self) -> dict:
+        return {
+            "frame_ids": [frame.frame_key for frame in self.frames],
+            "frames_requested": self.frames_requested,
+            "frames_selected": len(self.frames),
+            "max_size": self.max_size,
+            "detail": self.detail,
+            "estimated_image_tokens": self.estimated_image_tokens,
+            "estimated_latency_seconds": round(self.estimated_latency, 2),
+            "token_budget": self.token_budget,
+            "latency_budget_seconds": self.latency_budget,
+            "window_size": self.window_size,
+            "frames_per_image": self.frames_per_image
+        }
+
+
+def estimate_latency(image_count: int, tokens_per_image: int) -> float:
+    """Rough model latency: fixed overhead plus a cost proportional to image tokens"""
+    return (
+        settings.ANALYSIS_LATENCY_BASE
+        + image_count * tokens_per_image * settings.ANALYSIS_LATENCY_PER_1K_IMAGE_TOKENS / 1000
+    )
+
+
+class FrameSelector:
+    """
+    Picks which frames to send, and at what resolution and detail, so the
+    estimated image tokens and latency stay inside the request budget.
+
+    Every frame is kept when possible, degrading resolution and then detail
+    first. Only when even low detail does not fit are frames dropped, evenly
+    over time so the whole sequence stays covered.
+
+    With ``window_size`` the budget applies to each window call of a
+    map-reduce analysis rather than to the whole sequence, and windows are
+    made smaller instead of dropping frames.
+
+    With ``pack_frames`` frames go out on contact sheets at high detail, and
+    ``tokens_per_image`` is the share of a sheet's tokens each frame costs.
+    """
+
+    def select(
+        self,
+        frames: List[FrameInDB],
+        token_budget: Optional[int] = None,
+        latency_budget: Optional[float] = None,
+        window_size: Optional[int] = None,
+        pack_frames: bool = False
+    ) -> FrameSelection:
+        token_budget = token_budget or settings.ANALYSIS_TOKEN_BUDGET
+        latency_budget = latency_budget or settings.ANALYSIS_LATENCY_BUDGET
+        source_size = self._source_size(frames)
+        frames_per_image = settings.ANALYSIS_SHEET_COLUMNS * settings.ANALYSIS_SHEET_ROWS if pack_frames else 1
+        per_call = min(len(frames), (window_size or len(frames)) * frames_per_image)
+
+        tiers = self._tiers(pack_frames)
+        for max_size, detail in tiers:
+            tokens_per_image = self._tokens_per_image(source_size, max_size, detail, pack_frames)
+            if per_call <= self._max_frames(tokens_per_image, token_budget, latency_budget):
+                return FrameSelection(
+                    frames, len(frames), max_size, detail, tokens_per_image,
+                    token_budget, latency_budget, window_size, frames_per_image
+                )
+
+        max_size, detail = tiers[-1]
+        tokens_per_image = self._tokens_per_image(source_size, max_size, detail, pack_frames)
+        limit = max(self._max_frames(tokens_per_image, token_budget, latency_budget), 1)
+        if window_size:
+            # Windowed analysis keeps every frame and uses smaller windows instead
+            return FrameSelection(
+                frames, len(frames), max_size, detail, tokens_per_image,
+                token_budget, latency_budget, max(min(window_size, limit // frames_per_image), 1), frames_per_image
+            )
+        return FrameSelection(
+            self._subsample(frames, limit), len(frames), max_size, detail,
+            tokens_per_image, token_budget, latency_budget, window_size, frames_per_image
+        )
+
+    @staticmethod
+    def _tiers(pack_frames: bool = False) -> List[Tuple[int, str]]:
+        if pack_frames:
+            # Contact sheets are only legible at high detail
+            return [(settings.ANALYSIS_SHEET_MAX_SIZE, "high")]
+        # From most to least detailed
+        return [
+            (settings.ANALYSIS_MAX_SIZE, "high"),
+            (settings.ANALYSIS_REDUCED_SIZE, "high"),
+            (settings.ANALYSIS_REDUCED_SIZE, "low"),
+        ]
+
+    @staticmethod
+    def _source_size(frames: List[FrameInDB]) -> Optional[Tuple[int, int]]:
+        # All frames of a video share its resolution, one header read is enough
+        for frame in frames:
+            try:
+                with Image.open(Path(frame.file_path)) as image:
+                    return image.size
+            except OSError:
+                continue
+        return None
+
+    @staticmethod
+    def _tokens_per_image(
+        source_size: Optional[Tuple[int, int]],
+        max_size: int,
+        detail: str,
+        pack_frames: bool = False
+    ) -> int:
+        if pack_frames:
+            return sheet_tokens_per_frame(source_size)
+        if source_size is None:
+            return estimate_image_tokens(max_size, max_size, detail)
+        width, height = source_size
+        ratio = min(1.0, max_size / max(width, height))
+        return estimate_image_tokens(int(width * ratio), int(height * ratio), detail)
+
+    @staticmethod
+    def _max_frames(tokens_per_image: int, token_budget: int, latency_budget: float) -> int:
+        by_tokens = token_budget // tokens_per_image
+        per_image_latency = tokens_per_image * settings.ANALYSIS_LATENCY_PER_1K_IMAGE_TOKENS / 1000
+        if per_image_latency <= 0:
+            # No latency cost configured, only the token budget limits the frames
+            return max(by_tokens, 0)
+        by_latency = int((latency_budget - settings.ANALYSIS_LATENCY_BASE) / per_image_latency)
+        return max(min(by_tokens, by_latency), 0)
+
+    @staticmethod
+    def _subsample(frames: List[FrameInDB], limit: int) -> List[FrameInDB]:
+        if len(frames) <= limit:
+            return frames
+        # Evenly spaced over the sequence, always keeping the first and last frame
+        indices = np.unique(np.linspace(0, len(frames) - 1, limit).round().astype(int))
+        return [frames[index] for index in indices]
+
+
+frame_selector = FrameSelector()
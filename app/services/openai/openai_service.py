@@ -1,16 +1,247 @@
-from typing import List, Dict
+from typing import AsyncIterator, List, Dict, Optional
+from contextlib import asynccontextmanager
+import asyncio
 import os
-from openai import OpenAI
+import random
+import time
+import httpx
+from openai import AsyncOpenAI, APIConnectionError, APIStatusError, APITimeoutError
 from pathlib import Path
 from app.core.config import settings
+from app.core.metrics import add_count, current_timing, metrics, record_stage, timed
 from app.models.schemas.frame import FrameBatchAnalysis
+from app.services.openai.conversation_history import ConversationHistory
+from app.services.openai.rate_limiter import RateLimiter
+from app.services.openai.token_estimator import estimate_message_tokens
 # from app.services.frame.frame_service import FrameService
 
+openai_requests = metrics.counter(
+    "openai_requests_total",
+    "Chat completion attempts by outcome: success, retried or failed",
+    ("model", "outcome")
+)
+openai_tokens = metrics.counter(
+    "openai_tokens_total",
+    "Prompt and completion tokens reported by the API",
+    ("model", "kind")
+)
+openai_requests_pending = metrics.gauge(
+    "openai_requests_pending",
+    "Chat completions waiting for a concurrency slot or in flight",
+    ("state",)
+)
+analysis_images = metrics.histogram(
+    "analysis_images_per_call",
+    "Images sent to the model per analyze request, over all of its calls",
+    ("mode",),
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)
+)
+analysis_tokens = metrics.histogram(
+    "analysis_tokens_per_call",
+    "Prompt and completion tokens per analyze request, over all of its calls",
+    ("mode", "kind"),
+    buckets=(100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000)
+)
+
+NO_FRAMES_ERROR = "None of the requested frames could be read"
+
+def split_windows(frames: List[Dict], window_size: int, overlap: int) -> List[List[Dict]]:
+    """Split timestamp-ordered frames into windows sharing ``overlap`` frames with their neighbour"""
+    if len(frames) <= window_size:
+        return [frames]
+    step = max(window_size - overlap, 1)
+    windows = []
+    for start in range(0, len(frames), step):
+        windows.append(frames[start:start + window_size])
+        if start + window_size >= len(frames):
+            break
+    return windows
+
+
+def time_range(frames: List[Dict]) -> Dict:
+    # Contact sheets span several timestamps
+    return {"start": frames[0]['timestamp'], "end": frames[-1].get('end_timestamp', frames[-1]['timestamp'])}
+
+
+def frame_count(frames: List[Dict]) -> int:
+    return sum(len(frame.get("timestamps", [frame['timestamp']])) for frame in frames)
+
+
+def layout_hint(frames: List[Dict]) -> str:
+    if frames and "timestamps" in frames[0]:
+        return ("Each image is a contact sheet of consecutive frames in reading order (left to right, "
+                "top to bottom), each frame with its timestamp in its top left corner.")
+    return "Each frame has a timestamp in the top left corner."
+
+
 class OpenAIService:
     def __init__(self):
-        self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        # One pooled HTTP client shared by every request this service makes
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.OPENAI_MAX_CONNECTIONS
+            ),
+            timeout=httpx.Timeout(settings.OPENAI_TIMEOUT, connect=10.0)
+        )
+        # Retries are handled here so they go through the rate limiter
+        self.client = AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            base_url=settings.OPENAI_BASE_URL,
+            http_client=self.http_client,
+            max_retries=0
+        )
+        self.concurrency = asyncio.Semaphore(settings.OPENAI_MAX_CONCURRENCY)
+        self.rate_limiter = RateLimiter(
+            settings.OPENAI_REQUESTS_PER_MINUTE,
+            settings.OPENAI_TOKENS_PER_MINUTE
+        )
+        # Older chat turns are summarized through this service's limits
+        self.history = ConversationHistory(self)
         # self.frame_service = FrameService()
 
+    async def aclose(self):
+        await self.client.close()
+
+    @asynccontextmanager
+    async def _request_slot(self):
+        """A concurrency slot, with requests waiting for one and holding one counted"""
+        openai_requests_pending.inc(state="waiting")
+        try:
+            await self.concurrency.acquire()
+        finally:
+            openai_requests_pending.dec(state="waiting")
+        openai_requests_pending.inc(state="active")
+        try:
+            yield
+        finally:
+            openai_requests_pending.dec(state="active")
+            self.concurrency.release()
+
+    @staticmethod
+    def _record_usage(model: str, usage, image_count: int):
+        openai_tokens.inc(usage.prompt_tokens, model=model, kind="prompt")
+        openai_tokens.inc(usage.completion_tokens, model=model, kind="completion")
+        add_count("prompt_tokens", usage.prompt_tokens)
+        add_count("completion_tokens", usage.completion_tokens)
+        add_count("images", image_count)
+
+    @staticmethod
+    def record_analysis(analysis_mode: str):
+        """Observe the images and tokens the current analyze request used, once it is answered"""
+        timing = current_timing()
+        if timing is None:
+            return
+        analysis_images.observe(timing.counts.get("images", 0), mode=analysis_mode)
+        for kind in ("prompt", "completion"):
+            analysis_tokens.observe(timing.counts.get(f"{kind}_tokens", 0), mode=analysis_mode, kind=kind)
+
+    async def create_chat_completion(self, messages: List[Dict], image_sizes: Optional[List[tuple]] = None, **kwargs):
+        """
+        Chat completion through the shared pool, limited by OPENAI_MAX_CONCURRENCY
+        and the requests/tokens per minute buckets. 429, 5xx and connection
+        errors are retried with full-jitter exponential backoff.
+        """
+        estimated_tokens = estimate_message_tokens(messages, image_sizes) + kwargs.get("max_tokens", 0)
+        model = kwargs.get("model", "")
+        
+        for attempt in range(settings.OPENAI_MAX_RETRIES + 1):
+            with timed("openai", "rate_limit_wait"):
+                await self.rate_limiter.acquire(estimated_tokens)
+            try:
+                async with self._request_slot():
+                    with timed("openai", "completion"):
+                        response = await self.client.chat.completions.create(messages=messages, **kwargs)
+            except (APIConnectionError, APITimeoutError, APIStatusError) as e:
+                retryable = not isinstance(e, APIStatusError) or e.status_code == 429 or e.status_code >= 500
+                if not retryable or attempt == settings.OPENAI_MAX_RETRIES:
+                    openai_requests.inc(model=model, outcome="failed")
+                    raise
+                openai_requests.inc(model=model, outcome="retried")
+                delay = self._backoff_delay(attempt, e)
+                print(f"OpenAI request failed ({str(e)}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+            
+            openai_requests.inc(model=model, outcome="success")
+            if response.usage is not None:
+                self.rate_limiter.settle(estimated_tokens, response.usage.total_tokens)
+                self._record_usage(model, response.usage, len(image_sizes or []))
+            return response
+
+    async def stream_chat_completion(
+        self,
+        messages: List[Dict],
+        image_sizes: Optional[List[tuple]] = None,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """
+        Streaming chat completion yielding content deltas as they arrive.
+
+        Limited like create_chat_completion and retried the same way until the
+        stream opens; a stream that breaks after that raises, since its text
+        has already been forwarded.
+        """
+        estimated_tokens = estimate_message_tokens(messages, image_sizes) + kwargs.get("max_tokens", 0)
+        model = kwargs.get("model", "")
+        
+        for attempt in range(settings.OPENAI_MAX_RETRIES + 1):
+            with timed("openai", "rate_limit_wait"):
+                await self.rate_limiter.acquire(estimated_tokens)
+            async with self._request_slot():
+                started = time.perf_counter()
+                try:
+                    stream = await self.client.chat.completions.create(
+                        messages=messages,
+                        stream=True,
+                        stream_options={"include_usage": True},
+                        **kwargs
+                    )
+                except (APIConnectionError, APITimeoutError, APIStatusError) as e:
+                    error = e
+                else:
+                    first_token = True
+                    try:
+                        async for chunk in stream:
+                            if chunk.usage is not None:
+                                self.rate_limiter.settle(estimated_tokens, chunk.usage.total_tokens)
+                                self._record_usage(model, chunk.usage, len(image_sizes or []))
+                            if chunk.choices and chunk.choices[0].delta.content:
+                                if first_token:
+                                    record_stage("openai", "first_token", time.perf_counter() - started)
+                                    first_token = False
+                                yield chunk.choices[0].delta.content
+                    finally:
+                        await stream.close()
+                        record_stage("openai", "stream", time.perf_counter() - started)
+                    openai_requests.inc(model=model, outcome="success")
+                    return
+            
+            retryable = not isinstance(error, APIStatusError) or error.status_code == 429 or error.status_code >= 500
+            if not retryable or attempt == settings.OPENAI_MAX_RETRIES:
+                openai_requests.inc(model=model, outcome="failed")
+                raise error
+            openai_requests.inc(model=model, outcome="retried")
+            delay = self._backoff_delay(attempt, error)
+            print(f"OpenAI request failed ({str(error)}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    def _backoff_delay(self, attempt: int, error: Exception) -> float:
+        retry_after = None
+        if isinstance(error, APIStatusError):
+            retry_after = error.response.headers.get("retry-after")
+        if retry_after:
+            try:
+                delay = float(retry_after)
+            except ValueError:
+                delay = None
+            # A bad or hostile header must not hold the request slot for longer than our own backoff would
+            if delay is not None and 0 <= delay < float("inf"):
+                return min(delay, settings.OPENAI_BACKOFF_MAX)
+        
+        ceiling = min(settings.OPENAI_BACKOFF_MAX, settings.OPENAI_BACKOFF_BASE * 2 ** attempt)
+        return random.uniform(0, ceiling)
+
     # async def analyze_frames(self, frames: List[Dict]) -> List[Dict]:
     #     """
     #     Analyze a batch of frames using OpenAI's Vision API
@@ -74,55 +305,23 @@ class OpenAIService:
         Analyze a sequence of frames to detect patterns or changes over time
         """
         try:
-            # Create default sequence prompt if none provided
-            if not batch_analysis.sequence_prompt:
-                sequence_prompt = f"What are in these images? Analyze the sequence of frames and describe any changes, patterns, or notable differences between them. Focus on movement, behavior, and significant changes over time."
-            else:
-                sequence_prompt = batch_analysis.sequence_prompt
-
-            messages = batch_analysis.messages[:-1]
-            prompt = (f"Previous context: {messages}\n"
-                     f"Analyze the sequence of video frames.\n"
-                     f"Video description: {batch_analysis.description}\n"
-                     f"Each frame has a timestamp in the top left corner.\n"
-                     f"Answer the following questions in {batch_analysis.language}: {sequence_prompt}")
-            
-            print("batch_analysis", batch_analysis)
-            print("prompt", prompt)
-            # Prepare message content with prompt
-            message_content = [
-                {
-                    "type": "text", 
-                    "text": prompt
-                }
-            ]
-            
-            # Add each frame's image data
-            for frame in frames:
-                message_content.append({
-                    "type": "image_url",
-                    "image_url": frame["image_url"]
-                })
+            history = await self.history.prepare(batch_analysis)
+            messages = self._sequence_messages(frames, batch_analysis, history)
 
             # Make the API call
-            response = self.client.chat.completions.create(
+            response = await self.create_chat_completion(
                 model=batch_analysis.model,
                 # model="gpt-4o",
-                messages=[{
-                    "role": "user",
-                    "content": message_content
-                }],
+                messages=messages,
+                image_sizes=[(frame.get("width"), frame.get("height")) for frame in frames],
                 max_tokens=500
             )
             print("response from GPT: ", response)
             return {
                 "status": "success",
                 "sequence_analysis": response.choices[0].message.content,
-                "frame_count": len(frames),
-                "time_range": {
-                    "start": frames[0]['timestamp'],
-                    "end": frames[-1]['timestamp']
-                }
+                "frame_count": frame_count(frames),
+                "time_range": time_range(frames)
             }
 
         except Exception as e:
@@ -130,5 +329,299 @@ class OpenAIService:
             return {
                 "status": "error",
                 "error": str(e),
-                "frame_count": len(frames)
-            }
\ No newline at end of file
+                "frame_count": frame_count(frames)
+            }
+
+    async def analyze_frames_stream(self, frames: List[Dict], batch_analysis: FrameBatchAnalysis) -> AsyncIterator[Dict]:
+        """
+        Streaming analyze_frames: "delta" events with the model's text as it
+        arrives, then "done" (or "error") with the same result analyze_frames returns.
+        """
+        chunks = []
+        try:
+            history = await self.history.prepare(batch_analysis)
+            async for delta in self.stream_chat_completion(
+                model=batch_analysis.model,
+                messages=self._sequence_messages(frames, batch_analysis, history),
+                image_sizes=[(frame.get("width"), frame.get("height")) for frame in frames],
+                max_tokens=500
+            ):
+                chunks.append(delta)
+                yield {"type": "delta", "content": delta}
+        except Exception as e:
+            print(f"OpenAI API Error: {str(e)}")
+            yield {"type": "error", "result": {"status": "error", "error": str(e), "frame_count": frame_count(frames)}}
+            return
+        
+        yield {
+            "type": "done",
+            "result": {
+                "status": "success",
+                "sequence_analysis": "".join(chunks),
+                "frame_count": frame_count(frames),
+                "time_range": time_range(frames)
+            }
+        }
+
+    def _sequence_messages(self, frames: List[Dict], batch_analysis: FrameBatchAnalysis, history: List[Dict]) -> List[Dict]:
+        # Create default sequence prompt if none provided
+        if not batch_analysis.sequence_prompt:
+            sequence_prompt = f"What are in these images? Analyze the sequence of frames and describe any changes, patterns, or notable differences between them. Focus on movement, behavior, and significant changes over time."
+        else:
+            sequence_prompt = batch_analysis.sequence_prompt
+
+        prompt = (f"Analyze the sequence of video frames.\n"
+                 f"Video description: {batch_analysis.description}\n"
+                 f"{layout_hint(frames)}\n"
+                 f"Answer the following questions in {batch_analysis.language}: {sequence_prompt}")
+        
+        # Prepare message content with prompt
+        message_content = [
+            {
+                "type": "text", 
+                "text": prompt
+            }
+        ]
+        
+        # Add each frame's image data
+        for frame in frames:
+            message_content.append({
+                "type": "image_url",
+                "image_url": frame["image_url"]
+            })
+        
+        # Earlier turns go first as chat messages, so the model reads them as the conversation so far
+        return history + [{
+            "role": "user",
+            "content": message_content
+        }]
+
+    async def analyze_frames_map_reduce(
+        self,
+        frames: List[Dict],
+        batch_analysis: FrameBatchAnalysis,
+        window_size: Optional[int] = None,
+        overlap: Optional[int] = None
+    ) -> Dict:
+        """
+        Analyze a long sequence as overlapping windows and merge the window
+        summaries with a text-only reduce call.
+
+        Window calls are issued together and bounded by the shared concurrency
+        limit, so wall-clock time is about one window call plus the reduce.
+        """
+        if not frames:
+            # Every requested frame was unreadable or already evicted
+            return self._map_reduce_result(frames, [], error=NO_FRAMES_ERROR)
+        window_size = window_size or settings.ANALYSIS_WINDOW_SIZE
+        overlap = settings.ANALYSIS_WINDOW_OVERLAP if overlap is None else overlap
+        windows = split_windows(frames, window_size, overlap)
+        
+        # A history summary, when one is due, is written while the windows are analyzed
+        history, *window_results = await asyncio.gather(
+            self.history.prepare(batch_analysis),
+            *[self._analyze_window(index, window, batch_analysis) for index, window in enumerate(windows)]
+        )
+        summaries = [result for result in window_results if result["status"] == "success"]
+        if not summaries:
+            return self._map_reduce_result(frames, window_results, error=window_results[0]["error"])
+        
+        try:
+            analysis = await self._reduce_summaries(summaries, batch_analysis, history)
+        except Exception as e:
+            print(f"OpenAI API Error: {str(e)}")
+            return self._map_reduce_result(frames, window_results, error=str(e))
+        
+        return self._map_reduce_result(frames, window_results, analysis=analysis)
+
+    async def analyze_frames_map_reduce_stream(
+        self,
+        frames: List[Dict],
+        batch_analysis: FrameBatchAnalysis,
+        window_size: Optional[int] = None,
+        overlap: Optional[int] = None
+    ) -> AsyncIterator[Dict]:
+        """
+        Streaming analyze_frames_map_reduce: a "window" event per finished
+        window, "delta" events from the final reduce call, then "done" (or
+        "error") with the same result analyze_frames_map_reduce returns.
+        """
+        if not frames:
+            yield {"type": "error", "result": self._map_reduce_result(frames, [], error=NO_FRAMES_ERROR)}
+            return
+        window_size = window_size or settings.ANALYSIS_WINDOW_SIZE
+        overlap = settings.ANALYSIS_WINDOW_OVERLAP if overlap is None else overlap
+        history_task = asyncio.ensure_future(self.history.prepare(batch_analysis))
+        tasks = [
+            asyncio.ensure_future(self._analyze_window(index, window, batch_analysis))
+            for index, window in enumerate(split_windows(frames, window_size, overlap))
+        ]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield {"type": "window", "window": await finished}
+        finally:
+            # The client went away before every window finished
+            for task in tasks:
+                task.cancel()
+            if not all(task.done() for task in tasks):
+                history_task.cancel()
+        
+        window_results = [task.result() for task in tasks]
+        summaries = [result for result in window_results if result["status"] == "success"]
+        if not summaries:
+            yield {"type": "error", "result": self._map_reduce_result(frames, window_results, error=window_results[0]["error"])}
+            return
+        
+        chunks = []
+        try:
+            summaries = await self._collapse_summaries(summaries, batch_analysis)
+            async for delta in self.stream_chat_completion(
+                model=batch_analysis.model,
+                messages=self._merge_messages(summaries, batch_analysis, final=True, history=await history_task),
+                max_tokens=500
+            ):
+                chunks.append(delta)
+                yield {"type": "delta", "content": delta}
+        except Exception as e:
+            print(f"OpenAI API Error: {str(e)}")
+            yield {"type": "error", "result": self._map_reduce_result(frames, window_results, error=str(e))}
+            return
+        
+        yield {"type": "done", "result": self._map_reduce_result(frames, window_results, analysis="".join(chunks))}
+
+    @staticmethod
+    def _map_reduce_result(
+        frames: List[Dict],
+        window_results: List[Dict],
+        analysis: Optional[str] = None,
+        error: Optional[str] = None
+    ) -> Dict:
+        if error is not None:
+            return {
+                "status": "error",
+                "error": error,
+                "frame_count": frame_count(frames),
+                "analysis_mode": "map_reduce",
+                "windows": window_results
+            }
+        return {
+            "status": "success",
+            "sequence_analysis": analysis,
+            "frame_count": frame_count(frames),
+            "time_range": time_range(frames),
+            "analysis_mode": "map_reduce",
+            "windows": window_results
+        }
+
+    async def _analyze_window(self, index: int, frames: List[Dict], batch_analysis: FrameBatchAnalysis) -> Dict:
+        window_range = time_range(frames)
+        prompt = (f"Video description: {batch_analysis.description}\n"
+                  f"These frames cover {window_range['start']}s to {window_range['end']}s of a longer video. "
+                  f"{layout_hint(frames)}\n"
+                  f"Describe what happens in this part of the video, citing timestamps, "
+                  f"with the following question in mind: {self._sequence_prompt(batch_analysis)}\n"
+                  f"Report only what is visible in these frames.")
+        
+        message_content = [{"type": "text", "text": prompt}]
+        for frame in frames:
+            message_content.append({
+                "type": "image_url",
+                "image_url": frame["image_url"]
+            })
+        
+        try:
+            response = await self.create_chat_completion(
+                model=batch_analysis.model,
+                messages=[{
+                    "role": "user",
+                    "content": message_content
+                }],
+                image_sizes=[(frame.get("width"), frame.get("height")) for frame in frames],
+                max_tokens=300
+            )
+        except Exception as e:
+            print(f"OpenAI API Error in window {index}: {str(e)}")
+            return {
+                "index": index,
+                "status": "error",
+                "error": str(e),
+                "frame_count": frame_count(frames),
+                "time_range": window_range
+            }
+        
+        return {
+            "index": index,
+            "status": "success",
+            "summary": response.choices[0].message.content,
+            "frame_count": frame_count(frames),
+            "time_range": window_range
+        }
+
+    async def _collapse_summaries(self, summaries: List[Dict], batch_analysis: FrameBatchAnalysis) -> List[Dict]:
+        # Merge in groups of ANALYSIS_REDUCE_FAN_IN so no reduce prompt grows with the video
+        fan_in = max(settings.ANALYSIS_REDUCE_FAN_IN, 2)
+        while len(summaries) > fan_in:
+            groups = [summaries[start:start + fan_in] for start in range(0, len(summaries), fan_in)]
+            responses = await asyncio.gather(*[
+                self.create_chat_completion(
+                    model=batch_analysis.model,
+                    messages=self._merge_messages(group, batch_analysis, final=False),
+                    max_tokens=300
+                )
+                for group in groups
+            ])
+            summaries = [
+                {
+                    "summary": response.choices[0].message.content,
+                    "time_range": {"start": group[0]["time_range"]["start"], "end": group[-1]["time_range"]["end"]}
+                }
+                for group, response in zip(groups, responses)
+            ]
+        return summaries
+
+    async def _reduce_summaries(
+        self,
+        summaries: List[Dict],
+        batch_analysis: FrameBatchAnalysis,
+        history: List[Dict]
+    ) -> str:
+        summaries = await self._collapse_summaries(summaries, batch_analysis)
+        response = await self.create_chat_completion(
+            model=batch_analysis.model,
+            messages=self._merge_messages(summaries, batch_analysis, final=True, history=history),
+            max_tokens=500
+        )
+        return response.choices[0].message.content
+
+    def _merge_messages(
+        self,
+        summaries: List[Dict],
+        batch_analysis: FrameBatchAnalysis,
+        final: bool,
+        history: Optional[List[Dict]] = None
+    ) -> List[Dict]:
+        observations = "\n\n".join(
+            f"[{summary['time_range']['start']}s - {summary['time_range']['end']}s]\n{summary['summary']}"
+            for summary in summaries
+        )
+        if final:
+            instruction = (f"Using these observations, answer the following questions in "
+                           f"{batch_analysis.language}: {self._sequence_prompt(batch_analysis)}\n"
+                           f"Overlapping time ranges may describe the same events, don't count them twice.")
+        else:
+            instruction = ("Merge these observations into one chronological summary, citing timestamps. "
+                           "Overlapping time ranges may describe the same events, don't repeat them.")
+        
+        prompt = (f"Video description: {batch_analysis.description}\n"
+                  f"Observations from consecutive parts of the video, in time order:\n\n"
+                  f"{observations}\n\n"
+                  f"{instruction}")
+        # Only the final answer continues the conversation
+        return (history if final and history else []) + [{"role": "user", "content": prompt}]
+
+    @staticmethod
+    def _sequence_prompt(batch_analysis: FrameBatchAnalysis) -> str:
+        if not batch_analysis.sequence_prompt:
+            return ("Analyze the sequence of frames and describe any changes, patterns, or notable differences "
+                    "between them. Focus on movement, behavior, and significant changes over time.")
+        return batch_analysis.sequence_prompt
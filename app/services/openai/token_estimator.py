@@ -0,0 +1,58 @@
+import math
+from typing import Dict, List, Optional
+
+# Vision pricing for the gpt-4o family: low detail is a flat cost, high detail
+# is charged per 512px tile after the image is fitted into 2048x2048 and its
+# short side scaled down to 768px
+LOW_DETAIL_TOKENS = 85
+TILE_TOKENS = 170
+TILE_SIZE = 512
+
+# Frames are resized to this before analysis when their dimensions are unknown
+DEFAULT_IMAGE_SIZE = (1024, 1024)
+
+
+def estimate_image_tokens(width: Optional[int] = None, height: Optional[int] = None, detail: str = "auto") -> int:
+    if detail == "low":
+        return LOW_DETAIL_TOKENS
+
+    width, height = (width, height) if width and height else DEFAULT_IMAGE_SIZE
+
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+
+    tiles = math.ceil(width / TILE_SIZE) * math.ceil(height / TILE_SIZE)
+    return LOW_DETAIL_TOKENS + TILE_TOKENS * tiles
+
+
+def estimate_text_tokens(text: str) -> int:
+    # Roughly four characters per token for English, a little fewer for Cyrillic
+    return math.ceil(len(text) / 3.5)
+
+
+def estimate_message_tokens(messages: List[Dict], image_sizes: Optional[List[tuple]] = None) -> int:
+    """
+    Prompt tokens for a chat completion request, including image parts.
+
+    ``image_sizes`` gives (width, height) for the image parts in order, images
+    without a known size are costed at DEFAULT_IMAGE_SIZE.
+    """
+    image_sizes = list(image_sizes or [])
+    image_index = 0
+    total = 0
+    for message in messages:
+        total += 4  # per-message framing
+        content = message.get("content")
+        if isinstance(content, str):
+            total += estimate_text_tokens(content)
+            continue
+        for part in content or []:
+            if part.get("type") == "text":
+                total += estimate_text_tokens(part["text"])
+            elif part.get("type") == "image_url":
+                width, height = image_sizes[image_index] if image_index < len(image_sizes) else (None, None)
+                total += estimate_image_tokens(width, height, part["image_url"].get("detail", "auto"))
+                image_index += 1
+    return total
@@ -0,0 +1,375 @@
+import asyncio
+import os
+import shutil
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import delete, select, update
+
+from app.core.config import settings
+from app.core.database import as_utc, session_scope
+from app.models.domain.frame import FrameRecord
+from app.models.domain.job import ExtractionJobRecord
+from app.models.domain.video import VideoRecord, resolve_video_id
+from app.services.jobs.job_state_service import JobStatus
+
+# FRAME_DIR subdirectories of images derived from frames, all recreated on demand
+_DERIVED_PREFIXES = ("analysis_", "thumb_", "preview_", "sheets")
+
+
+@dataclass
+class _VideoGroup:
+    """An extracted video with its aliases, evicted together"""
+    video_id: str
+    last_used: datetime
+    protected: bool
+    video_ids: Set[str] = field(default_factory=set)
+
+
+@dataclass
+class _SourceFile:
+    """A source video file, shared by every record with the same content"""
+    path: Path
+    last_used: datetime
+    protected: bool
+
+
+class StorageManager:
+    """
+    Keeps VIDEO_DIR and FRAME_DIR inside their quotas and the disk above
+    STORAGE_MIN_FREE_MB.
+
+    Endpoints record when a video was last used with ``touch``; compaction then
+    frees space least recently used first:
+
+    1. source videos of finished extractions, whose frames stay usable
+    2. images derived from frames (analysis variants, thumbnails, previews,
+       contact sheets), which are recreated when next requested
+    3. whole videos: frames, derived images, source, records and aliases
+
+    Nothing a pending or running extraction needs is ever removed.
+    """
+
+    def __init__(self):
+        self._touched: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._compaction_lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.last_compaction: Optional[dict] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(settings.STORAGE_VIDEO_QUOTA_MB or settings.STORAGE_FRAME_QUOTA_MB or settings.STORAGE_MIN_FREE_MB)
+
+    def touch(self, video_id: str):
+        """Record that a video was used, written at most every STORAGE_TOUCH_INTERVAL per video"""
+        now = time.monotonic()
+        with self._lock:
+            last = self._touched.get(video_id)
+            if last is not None and now - last < settings.STORAGE_TOUCH_INTERVAL:
+                return
+            self._touched[video_id] = now
+
+        with session_scope() as session:
+            # Aliases share the frames of their original, which is what gets evicted
+            session.execute(
+                update(VideoRecord)
+                .where(VideoRecord.id == resolve_video_id(session, video_id))
+                .values(last_accessed_at=datetime.now(timezone.utc))
+            )
+
+    def usage(self) -> dict:
+        videos_bytes, videos_files = _directory_usage(settings.VIDEO_DIR)
+        frames_bytes, frames_files = _directory_usage(settings.FRAME_DIR)
+        derived_bytes = sum(_directory_usage(path)[0] for path in _derived_directories())
+        disk = shutil.disk_usage(settings.STORAGE_DIR)
+        return {
+            "videos": {
+                "bytes": videos_bytes,
+                "files": videos_files,
+                "quota_bytes": settings.STORAGE_VIDEO_QUOTA_MB * 1024 * 1024 or None
+            },
+            "frames": {
+                "bytes": frames_bytes,
+                "files": frames_files,
+                "derived_bytes": derived_bytes,
+                "quota_bytes": settings.STORAGE_FRAME_QUOTA_MB * 1024 * 1024 or None
+            },
+            "disk": {
+                "total_bytes": disk.total,
+                "free_bytes": disk.free,
+                "min_free_bytes": settings.STORAGE_MIN_FREE_MB * 1024 * 1024 or None
+            },
+            "delete_source_after_extraction": settings.STORAGE_DELETE_SOURCE_AFTER_EXTRACTION,
+            "last_compaction": self.last_compaction
+        }
+
+    def make_room(self, incoming_bytes: int = 0) -> bool:
+        """Compact so that ``incoming_bytes`` more of source video fit, False if they still don't"""
+        if not self.enabled:
+            return True
+        # A video larger than the whole quota would only empty it before being refused
+        quota = settings.STORAGE_VIDEO_QUOTA_MB * 1024 * 1024
+        if quota and incoming_bytes > quota:
+            return False
+        return self.compact(incoming_bytes)["satisfied"]
+
+    def compact(self, incoming_bytes: int = 0) -> dict:
+        with self._compaction_lock:
+            started = time.perf_counter()
+            result = {
+                "orphans_deleted": 0,
+                "sources_deleted": 0,
+                "derived_images_deleted": 0,
+                "videos_evicted": 0,
+                "bytes_freed": 0
+            }
+            # Bytes still to free for each limit, refreshed as files go
+            need_videos, need_frames, need_disk = self._needed_bytes(incoming_bytes)
+
+            for path in self._orphan_sources():
+                size = _remove(path)
+                result["orphans_deleted"] += 1
+                result["bytes_freed"] += size
+                need_videos -= size
+                need_disk -= size
+
+            sources, groups = self._candidates()
+            for source in sources:
+                if need_videos <= 0 and need_disk <= 0:
+                    break
+                size = self._delete_source(source.path)
+                result["sources_deleted"] += 1
+                result["bytes_freed"] += size
+                need_videos -= size
+                need_disk -= size
+
+            for path in self._derived_images():
+                if need_frames <= 0 and need_disk <= 0:
+                    break
+                size = _remove(path)
+                result["derived_images_deleted"] += 1
+                result["bytes_freed"] += size
+                need_frames -= size
+                need_disk -= size
+
+            for group in groups:
+                if need_frames <= 0 and need_disk <= 0:
+                    break
+                frame_bytes, source_bytes = self._evict_group(group)
+                result["videos_evicted"] += 1
+                result["bytes_freed"] += frame_bytes + source_bytes
+                need_frames -= frame_bytes
+                need_videos -= source_bytes
+                need_disk -= frame_bytes + source_bytes
+
+            result["satisfied"] = need_videos <= 0 and need_frames <= 0 and need_disk <= 0
+            result["seconds"] = round(time.perf_counter() - started, 3)
+            result["finished_at"] = datetime.now(timezone.utc).isoformat()
+            self.last_compaction = result
+
+        if result["bytes_freed"]:
+            print(
+                f"Storage compaction freed {result['bytes_freed'] / 1024 / 1024:.1f} MB: "
+                f"{result['sources_deleted']} sources, {result['derived_images_deleted']} derived images, "
+                f"{result['videos_evicted']} videos, {result['orphans_deleted']} orphaned files"
+            )
+        return result
+
+    def release_source(self, video_id: str) -> bool:
+        """Delete the source of a finished extraction unless another video still needs the file"""
+        with session_scope() as session:
+            record = session.get(VideoRecord, video_id)
+            file_path = record.file_path if record is not None else None
+        if file_path is None:
+            return False
+
+        # The extraction calling this is still marked as running
+        sources, _ = self._candidates(finished_video_id=video_id)
+        if not any(source.path == Path(file_path) for source in sources):
+            return False
+        self._delete_source(Path(file_path))
+        return True
+
+    def start(self):
+        """Run compaction every STORAGE_COMPACTION_INTERVAL on the running event loop"""
+        if self._task is None and self.enabled and settings.STORAGE_COMPACTION_INTERVAL > 0:
+            self._task = asyncio.get_running_loop().create_task(self._compaction_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _compaction_loop(self):
+        while True:
+            try:
+                # File deletion and directory scans stay off the event loop
+                await asyncio.to_thread(self.compact)
+            except Exception as e:
+                print(f"Storage compaction failed: {str(e)}")
+            await asyncio.sleep(settings.STORAGE_COMPACTION_INTERVAL)
+
+    def _needed_bytes(self, incoming_bytes: int) -> Tuple[int, int, int]:
+        need_videos = need_frames = need_disk = 0
+        if settings.STORAGE_VIDEO_QUOTA_MB:
+            used, _ = _directory_usage(settings.VIDEO_DIR)
+            need_videos = used + incoming_bytes - settings.STORAGE_VIDEO_QUOTA_MB * 1024 * 1024
+        if settings.STORAGE_FRAME_QUOTA_MB:
+            used, _ = _directory_usage(settings.FRAME_DIR)
+            need_frames = used - settings.STORAGE_FRAME_QUOTA_MB * 1024 * 1024
+        if settings.STORAGE_MIN_FREE_MB:
+            free = shutil.disk_usage(settings.STORAGE_DIR).free
+            need_disk = settings.STORAGE_MIN_FREE_MB * 1024 * 1024 + incoming_bytes - free
+        return need_videos, need_frames, need_disk
+
+    def _candidates(self, finished_video_id: Optional[str] = None) -> Tuple[List[_SourceFile], List[_VideoGroup]]:
+        """Evictable source files and videos, least recently used first"""
+        with session_scope() as session:
+            statuses = dict(session.execute(select(ExtractionJobRecord.video_id, ExtractionJobRecord.status)).all())
+            records = session.execute(
+                select(
+                    VideoRecord.id,
+                    VideoRecord.alias_of,
+                    VideoRecord.file_path,
+                    VideoRecord.processed,
+                    VideoRecord.created_at,
+                    VideoRecord.last_accessed_at
+                )
+            ).all()
+
+        processed = {record.id: record.processed for record in records}
+        groups: Dict[str, _VideoGroup] = {}
+        sources: Dict[str, _SourceFile] = {}
+        for record in records:
+            owner = record.alias_of or record.id
+            last_used = as_utc(record.last_accessed_at or record.created_at)
+            status = JobStatus.COMPLETED if owner == finished_video_id else statuses.get(owner)
+            # Running or queued, or created but not yet handed to the job runner
+            protected = (
+                status in (JobStatus.PENDING, JobStatus.PROCESSING)
+                or (status is None and not processed.get(owner, True))
+            )
+
+            group = groups.setdefault(owner, _VideoGroup(owner, last_used, protected))
+            group.video_ids.add(record.id)
+            group.last_used = max(group.last_used, last_used)
+            group.protected = group.protected or protected
+
+            if record.file_path is not None:
+                source = sources.setdefault(record.file_path, _SourceFile(Path(record.file_path), last_used, protected))
+                source.last_used = max(source.last_used, last_used)
+                source.protected = source.protected or protected
+
+        return (
+            sorted((source for source in sources.values() if not source.protected), key=lambda source: source.last_used),
+            sorted((group for group in groups.values() if not group.protected), key=lambda group: group.last_used)
+        )
+
+    def _orphan_sources(self) -> List[Path]:
+        """Files in VIDEO_DIR no video record points at, e.g. uploads of content that was already extracted"""
+        with session_scope() as session:
+            referenced = set(session.scalars(select(VideoRecord.file_path).where(VideoRecord.file_path.is_not(None))))
+        cutoff = time.time() - settings.STORAGE_ORPHAN_AGE
+        # Recent files may be uploads or downloads whose record is not written yet. Hard linked
+        # batch ingestion keeps the original's mtime, the link itself only changes ctime
+        return [
+            path for path in _files(settings.VIDEO_DIR)
+            if str(path) not in referenced and max(path.stat().st_mtime, path.stat().st_ctime) < cutoff
+        ]
+
+    def _delete_source(self, path: Path) -> int:
+        size = _remove(path)
+        with session_scope() as session:
+            # Frames stay, so the videos remain usable, they just can't be extracted again
+            session.execute(update(VideoRecord).where(VideoRecord.file_path == str(path)).values(file_path=None))
+        return size
+
+    def _derived_images(self) -> List[Path]:
+        """Derived images, oldest first"""
+        paths = [path for directory in _derived_directories() for path in _files(directory)]
+        return sorted(paths, key=_mtime)
+
+    def _evict_group(self, group: _VideoGroup) -> Tuple[int, int]:
+        """Remove a video and its aliases entirely, returns (frame bytes, source bytes) freed"""
+        with session_scope() as session:
+            frame_paths = list(session.scalars(select(FrameRecord.file_path).where(FrameRecord.video_id == group.video_id)))
+            source_paths = set(session.scalars(
+                select(VideoRecord.file_path).where(VideoRecord.id.in_(group.video_ids), VideoRecord.file_path.is_not(None))
+            ))
+            session.execute(delete(FrameRecord).where(FrameRecord.video_id == group.video_id))
+            session.execute(delete(ExtractionJobRecord).where(ExtractionJobRecord.video_id.in_(group.video_ids)))
+            session.execute(delete(VideoRecord).where(VideoRecord.id.in_(group.video_ids)))
+            # Sources shared with another extraction of the same content stay
+            still_used = set(session.scalars(select(VideoRecord.file_path).where(VideoRecord.file_path.in_(source_paths))))
+
+        frame_bytes = 0
+        derived_directories = _derived_directories()
+        for frame_path in frame_paths:
+            frame_bytes += _remove(Path(frame_path))
+            name = Path(frame_path).with_suffix(".jpg").name
+            for directory in derived_directories:
+                frame_bytes += _remove(directory / name)
+        source_bytes = sum(_remove(Path(path)) for path in source_paths - still_used)
+
+        with self._lock:
+            for video_id in group.video_ids:
+                self._touched.pop(video_id, None)
+        print(f"Evicted video {group.video_id} with {len(group.video_ids) - 1} aliases, last used {group.last_used}")
+        return frame_bytes, source_bytes
+
+
+def _files(directory: Path) -> Iterator[Path]:
+    for root, _, names in os.walk(directory):
+        for name in names:
+            yield Path(root) / name
+
+
+def _directory_usage(directory: Path) -> Tuple[int, int]:
+    """Bytes and number of files under a directory"""
+    total = 0
+    count = 0
+    for path in _files(directory):
+        try:
+            total += path.stat().st_size
+            count += 1
+        except FileNotFoundError:
+            continue
+    return total, count
+
+
+def _derived_directories() -> List[Path]:
+    if not settings.FRAME_DIR.exists():
+        return []
+    return [
+        path for path in settings.FRAME_DIR.iterdir()
+        if path.is_dir() and path.name.startswith(_DERIVED_PREFIXES)
+    ]
+
+
+def _mtime(path: Path) -> float:
+    try:
+        return path.stat().st_mtime
+    except FileNotFoundError:
+        return 0.0
+
+
+def _remove(path: Path) -> int:
+    """Delete a file if it exists, returns the bytes freed"""
+    try:
+        size = path.stat().st_size
+        path.unlink()
+        return size
+    except FileNotFoundError:
+        return 0
+
+
+storage_manager = StorageManager()
@@ -0,0 +1,285 @@
+import math
+import re
+import subprocess
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Type
+
+import cv2
+import numpy as np
+
+from app.core.config import settings
+from app.services.video.frame_extractor import ExtractionMode, ExtractionStats, FrameExtractor, sample_points
+
+# Frame time printed by ffmpeg's showinfo filter
+_SHOWINFO_TIME = re.compile(r"pts_time:\s*(-?[\d.]+)")
+
+
+class VideoDecoder(ABC):
+    """
+    Decoder backend used by VideoService to pull sampled frames out of a video.
+
+    Backends yield (timestamp, BGR frame) pairs for precomputed sample points,
+    the way FrameExtractor.extract_points does, and keep ExtractionStats for
+    the last extraction. With keyframes only, a frame is labelled with the
+    keyframe's own time rather than the sample's, and samples landing on a
+    keyframe that was already yielded are skipped.
+    """
+
+    name = ""
+
+    def __init__(self, video_path: Path, fps: float, total_frames: int):
+        self.video_path = Path(video_path)
+        self.fps = fps
+        self.total_frames = total_frames
+        self.duration = total_frames / fps if fps else 0.0
+        self.stats: Optional[ExtractionStats] = None
+
+    def sample_points(
+        self,
+        frame_interval: float,
+        start_second: float = 0,
+        end_second: Optional[float] = None
+    ) -> List[Tuple[float, int]]:
+        return sample_points(self.fps, self.duration, frame_interval, start_second, end_second)
+
+    def choose_mode(self, frame_interval: float) -> ExtractionMode:
+        return ExtractionMode.KEYFRAME if settings.VIDEO_DECODER_KEYFRAMES_ONLY else ExtractionMode.SEEK
+
+    def extract_points(
+        self,
+        points: List[Tuple[float, int]],
+        mode: ExtractionMode
+    ) -> Iterator[Tuple[float, np.ndarray]]:
+        """Yield (timestamp, BGR frame) for precomputed (timestamp, frame position) pairs"""
+        self.stats = ExtractionStats(mode=mode)
+        started = time.perf_counter()
+        try:
+            for timestamp, frame in self._decode(points, mode):
+                self.stats.frames_emitted += 1
+                self.stats.elapsed = time.perf_counter() - started
+                yield timestamp, frame
+        finally:
+            self.stats.elapsed = time.perf_counter() - started
+
+    @abstractmethod
+    def _decode(self, points: List[Tuple[float, int]], mode: ExtractionMode) -> Iterator[Tuple[float, np.ndarray]]:
+        """Yield (timestamp, BGR frame) for the sample points, counting decoded frames in ``self.stats``"""
+
+    def release(self):
+        pass
+
+    def __enter__(self) -> "VideoDecoder":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class OpenCVDecoder(VideoDecoder):
+    """The default backend: cv2.VideoCapture, seeking or decoding sequentially through FrameExtractor"""
+
+    name = "opencv"
+
+    def __init__(self, video_path: Path):
+        self.cap = cv2.VideoCapture(str(video_path))
+        if not self.cap.isOpened():
+            raise ValueError(f"Could not open video file: {video_path}")
+        self.extractor = FrameExtractor(self.cap)
+        super().__init__(video_path, self.extractor.fps, self.extractor.total_frames)
+
+    @property
+    def stats(self) -> Optional[ExtractionStats]:
+        return self.extractor.stats
+
+    @stats.setter
+    def stats(self, stats: Optional[ExtractionStats]):
+        self.extractor.stats = stats
+
+    def choose_mode(self, frame_interval: float) -> ExtractionMode:
+        return self.extractor.choose_mode(frame_interval)
+
+    def _decode(self, points: List[Tuple[float, int]], mode: ExtractionMode) -> Iterator[Tuple[float, np.ndarray]]:
+        # The extractor counts decoded frames in the stats shared through the property above
+        if mode == ExtractionMode.SEEK:
+            return self.extractor._extract_seek(points)
+        return self.extractor._extract_sequential(points)
+
+    def release(self):
+        self.cap.release()
+
+
+class PyAVDecoder(VideoDecoder):
+    """
+    Seeks with libavformat for every sample. With keyframes only, just the
+    keyframe packet at or before the sample is decoded, so each sample costs a
+    single decoded frame. Otherwise decoding continues from that keyframe up
+    to the sample's frame.
+    """
+
+    name = "pyav"
+
+    def __init__(self, video_path: Path):
+        try:
+            import av
+        except ImportError as e:
+            raise RuntimeError("VIDEO_DECODER_BACKEND=pyav needs the av package: pip install av") from e
+
+        try:
+            self.container = av.open(str(video_path))
+        except av.error.FFmpegError as e:
+            raise ValueError(f"Could not open video file: {video_path}") from e
+        self.stream = self.container.streams.video[0]
+
+        fps = float(self.stream.average_rate or self.stream.guessed_rate or 0)
+        total_frames = self.stream.frames
+        if not total_frames and self.container.duration:
+            total_frames = int(self.container.duration / av.time_base * fps)
+        super().__init__(video_path, fps, total_frames)
+
+    def _decode(self, points: List[Tuple[float, int]], mode: ExtractionMode) -> Iterator[Tuple[float, np.ndarray]]:
+        time_base = self.stream.time_base
+        # Half a frame of slack so rounding in pts never skips the sample's own frame
+        tolerance = 0.5 / self.fps if self.fps else 0.0
+        last_keyframe = None
+
+        for timestamp, _ in points:
+            self.container.seek(int(timestamp / time_base), stream=self.stream, backward=True, any_frame=False)
+            if mode == ExtractionMode.KEYFRAME:
+                keyframe = self._decode_keyframe()
+                if keyframe is None:
+                    continue
+                keyframe_time, image = keyframe
+                keyframe_time = timestamp if keyframe_time is None else keyframe_time
+                # Samples closer together than the GOP land on the same keyframe
+                if last_keyframe is not None and keyframe_time <= last_keyframe:
+                    continue
+                last_keyframe = keyframe_time
+                yield keyframe_time, image
+                continue
+            for frame in self.container.decode(self.stream):
+                self.stats.frames_decoded += 1
+                if frame.time is None or frame.time >= timestamp - tolerance:
+                    # to_ndarray wraps the converted frame's buffer without another copy
+                    yield timestamp, frame.to_ndarray(format="bgr24")
+                    break
+
+    def _decode_keyframe(self) -> Optional[Tuple[Optional[float], np.ndarray]]:
+        """The (seconds, BGR image) of the keyframe the last seek landed on, seconds None without a pts"""
+        codec = self.stream.codec_context
+        for packet in self.container.demux(self.stream):
+            if not packet.is_keyframe:
+                continue
+            # Streams with B-frames hold decoded frames back for reordering; flushing
+            # returns the keyframe now instead of after the packets of the next GOP.
+            # The next seek resets the decoder for further use.
+            frames = codec.decode(packet) or codec.decode(None)
+            self.stats.frames_decoded += 1
+            if not frames:
+                return None
+            frame = frames[0]
+            # Frames flushed out of the decoder may come without a pts, the packet still has it
+            if frame.time is not None and math.isfinite(frame.time):
+                seconds = round(frame.time, 3)
+            elif packet.pts is not None:
+                seconds = round(float(packet.pts * packet.time_base), 3)
+            else:
+                seconds = None
+            return seconds, frame.to_ndarray(format="bgr24")
+        return None
+
+    def release(self):
+        self.container.close()
+
+
+class FFmpegPipeDecoder(VideoDecoder):
+    """
+    Runs ffmpeg once per sample with an input seek and reads one raw BGR
+    frame from its stdout straight into a buffer that the yielded array
+    views, without copying. Process start-up makes it a fit for coarse
+    intervals only, where it decodes one keyframe per sample.
+    """
+
+    name = "ffmpeg"
+
+    def __init__(self, video_path: Path):
+        # Only the container header is read here, ffmpeg does the decoding
+        cap = cv2.VideoCapture(str(video_path))
+        if not cap.isOpened():
+            raise ValueError(f"Could not open video file: {video_path}")
+        try:
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            self.width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            self.height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        finally:
+            cap.release()
+        super().__init__(video_path, fps, total_frames)
+
+    def _command(self, timestamp: float, keyframes_only: bool) -> List[str]:
+        if keyframes_only:
+            # Output the keyframe the input seek lands on instead of decoding up to the timestamp.
+            # Input timestamps are kept so showinfo logs the keyframe's own time.
+            command = [settings.FFMPEG_PATH, "-nostdin", "-hide_banner", "-nostats", "-loglevel", "info",
+                       "-copyts", "-noaccurate_seek"]
+            filters = ["-vf", "showinfo"]
+        else:
+            command = [settings.FFMPEG_PATH, "-nostdin", "-loglevel", "error"]
+            filters = []
+        return command + [
+            "-ss", f"{timestamp:.3f}", "-i", str(self.video_path), *filters,
+            "-frames:v", "1", "-f", "rawvideo", "-pix_fmt", "bgr24", "pipe:1"
+        ]
+
+    def _decode(self, points: List[Tuple[float, int]], mode: ExtractionMode) -> Iterator[Tuple[float, np.ndarray]]:
+        keyframes_only = mode == ExtractionMode.KEYFRAME
+        frame_size = self.width * self.height * 3
+        last_keyframe = None
+        for timestamp, _ in points:
+            # A new buffer per frame, the consumer may still hold the previous one
+            buffer = bytearray(frame_size)
+            view = memoryview(buffer)
+            filled = 0
+            # ffmpeg's log goes to a file, a full stderr pipe would stall it while stdout is read
+            with tempfile.TemporaryFile() as log:
+                with subprocess.Popen(
+                    self._command(timestamp, keyframes_only),
+                    stdout=subprocess.PIPE,
+                    stderr=log if keyframes_only else subprocess.DEVNULL
+                ) as process:
+                    while filled < frame_size:
+                        read = process.stdout.readinto(view[filled:])
+                        if not read:
+                            break
+                        filled += read
+                self.stats.frames_decoded += 1
+                if filled != frame_size:
+                    continue
+                if keyframes_only:
+                    log.seek(0)
+                    match = _SHOWINFO_TIME.search(log.read().decode("utf-8", errors="replace"))
+                    frame_time = round(float(match.group(1)), 3) if match else timestamp
+                    # Samples closer together than the GOP land on the same keyframe
+                    if last_keyframe is not None and frame_time <= last_keyframe:
+                        continue
+                    last_keyframe = frame_time
+                else:
+                    frame_time = timestamp
+            yield frame_time, np.frombuffer(buffer, dtype=np.uint8).reshape(self.height, self.width, 3)
+
+
+DECODER_BACKENDS: Dict[str, Type[VideoDecoder]] = {
+    OpenCVDecoder.name: OpenCVDecoder,
+    PyAVDecoder.name: PyAVDecoder,
+    FFmpegPipeDecoder.name: FFmpegPipeDecoder,
+}
+
+
+def create_decoder(video_path: Path, backend: Optional[str] = None) -> VideoDecoder:
+    """Open a video with the configured VIDEO_DECODER_BACKEND, or ``backend`` when given"""
+    backend = backend or settings.VIDEO_DECODER_BACKEND
+    if backend not in DECODER_BACKENDS:
+        raise ValueError(f"Unknown video decoder backend: {backend}")
+    return DECODER_BACKENDS[backend](video_path)
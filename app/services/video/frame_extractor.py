@@ -0,0 +1,262 @@
+import time
+from dataclasses import dataclass
+from enum import Enum
+from typing import Callable, Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from app.core.config import settings
+
+
+class ExtractionMode(str, Enum):
+    SEEK = "seek"
+    SEQUENTIAL = "sequential"
+    SCENE = "scene"
+    KEYFRAME = "keyframe"
+
+
+@dataclass
+class ExtractionStats:
+    mode: ExtractionMode
+    frames_emitted: int = 0
+    frames_decoded: int = 0
+    frames_scored: int = 0
+    scoring_seconds: float = 0.0
+    elapsed: float = 0.0
+
+    @property
+    def frames_per_second(self) -> float:
+        """Sampled frames delivered per wall-clock second"""
+        return self.frames_emitted / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def decode_fps(self) -> float:
+        """Source frames pulled through the decoder per wall-clock second"""
+        return self.frames_decoded / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def scoring_share(self) -> float:
+        """Fraction of the extraction time spent scoring frames for scene changes"""
+        return self.scoring_seconds / self.elapsed if self.elapsed else 0.0
+
+
+# BGR to luma, applied with a single matrix product over the downscaled frame
+_GRAY_WEIGHTS = np.array([0.114, 0.587, 0.299], dtype=np.float32)
+_HISTOGRAM_BINS = 32
+
+
+@dataclass
+class SceneSignature:
+    gray: np.ndarray
+    histogram: np.ndarray
+
+    @classmethod
+    def from_frame(cls, frame: np.ndarray, width: int) -> "SceneSignature":
+        # Strided view instead of a resize: no interpolation, only the sampled pixels are touched
+        step = max(frame.shape[1] // width, 1)
+        gray = frame[::step, ::step].astype(np.float32) @ _GRAY_WEIGHTS
+        bins = (gray * (_HISTOGRAM_BINS / 256)).astype(np.intp).ravel()
+        histogram = np.bincount(bins, minlength=_HISTOGRAM_BINS) / bins.size
+        return cls(gray, histogram)
+
+    def score(self, previous: "SceneSignature", pixel_delta: float) -> float:
+        """
+        Change between two frames in [0, 1]: the larger of the share of pixels
+        whose brightness moved by more than ``pixel_delta``, which catches a
+        few animals moving in an otherwise still pen, and the histogram
+        distance, which catches lighting changes and scene cuts.
+        """
+        changed = float(np.count_nonzero(np.abs(self.gray - previous.gray) > pixel_delta)) / self.gray.size
+        distance = 0.5 * float(np.abs(self.histogram - previous.histogram).sum())
+        return max(changed, distance)
+
+
+def sample_points(
+    fps: float,
+    duration: float,
+    frame_interval: float,
+    start_second: float = 0,
+    end_second: Optional[float] = None
+) -> List[Tuple[float, int]]:
+    """(timestamp, frame position) pairs every ``frame_interval`` seconds of a video"""
+    end_second = duration if end_second is None else min(end_second, duration)
+    points = []
+    current_second = start_second
+    while current_second < end_second:
+        points.append((current_second, int(current_second * fps)))
+        current_second += frame_interval
+    return points
+
+
+class FrameExtractor:
+    """
+    Pulls sampled frames out of an opened cv2.VideoCapture.
+
+    Seek mode jumps to every sample point with CAP_PROP_POS_FRAMES, which makes
+    the decoder restart from the nearest keyframe each time. Sequential mode
+    decodes forward once, grab()-ing the frames in between and retrieve()-ing
+    only at sample points. Sequential wins whenever samples are closer together
+    than a GOP, since a seek would re-decode roughly the same frames anyway.
+    """
+
+    def __init__(self, cap: cv2.VideoCapture, gop_size: Optional[int] = None):
+        self.cap = cap
+        self.fps = cap.get(cv2.CAP_PROP_FPS)
+        self.total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.duration = self.total_frames / self.fps
+        self.gop_size = gop_size or settings.EXTRACTION_GOP_SIZE or self._estimate_gop_size()
+        self.stats: Optional[ExtractionStats] = None
+
+    def _estimate_gop_size(self) -> int:
+        # OpenCV does not expose the GOP length, assume the common 2 second keyframe spacing
+        return max(int(round(self.fps * 2)), 1)
+
+    def sample_points(
+        self,
+        frame_interval: float,
+        start_second: float = 0,
+        end_second: Optional[float] = None
+    ) -> List[Tuple[float, int]]:
+        """Return (timestamp, frame position) pairs for every sample in the range"""
+        return sample_points(self.fps, self.duration, frame_interval, start_second, end_second)
+
+    def choose_mode(self, frame_interval: float) -> ExtractionMode:
+        requested = settings.EXTRACTION_MODE
+        if requested in (ExtractionMode.SEEK.value, ExtractionMode.SEQUENTIAL.value):
+            return ExtractionMode(requested)
+
+        frames_between_samples = frame_interval * self.fps
+        if frames_between_samples <= self.gop_size:
+            return ExtractionMode.SEQUENTIAL
+        return ExtractionMode.SEEK
+
+    def extract(
+        self,
+        frame_interval: float,
+        start_second: float = 0,
+        end_second: Optional[float] = None,
+        mode: Optional[ExtractionMode] = None
+    ) -> Iterator[Tuple[float, np.ndarray]]:
+        """Yield (timestamp, BGR frame) for every sample point that could be decoded"""
+        mode = mode or self.choose_mode(frame_interval)
+        points = self.sample_points(frame_interval, start_second, end_second)
+        return self.extract_points(points, mode)
+
+    def extract_points(
+        self,
+        points: List[Tuple[float, int]],
+        mode: ExtractionMode
+    ) -> Iterator[Tuple[float, np.ndarray]]:
+        """Yield (timestamp, BGR frame) for precomputed (timestamp, frame position) pairs"""
+        self.stats = ExtractionStats(mode=mode)
+        started = time.perf_counter()
+
+        if mode == ExtractionMode.SEEK:
+            frames = self._extract_seek(points)
+        else:
+            frames = self._extract_sequential(points)
+
+        try:
+            for timestamp, frame in frames:
+                self.stats.frames_emitted += 1
+                self.stats.elapsed = time.perf_counter() - started
+                yield timestamp, frame
+        finally:
+            self.stats.elapsed = time.perf_counter() - started
+
+    def _extract_seek(self, points: List[Tuple[float, int]]) -> Iterator[Tuple[float, np.ndarray]]:
+        for timestamp, position in points:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, position)
+            ret, frame = self.cap.read()
+            self.stats.frames_decoded += 1
+            if ret:
+                yield timestamp, frame
+
+    def _extract_sequential(self, points: List[Tuple[float, int]]) -> Iterator[Tuple[float, np.ndarray]]:
+        if not points:
+            return
+
+        # Only seek once, to the first sample, when starting mid-stream
+        next_position = 0
+        if points[0][1] > 0:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, points[0][1])
+            next_position = points[0][1]
+
+        for timestamp, position in points:
+            while next_position <= position:
+                if not self.cap.grab():
+                    return
+                next_position += 1
+                self.stats.frames_decoded += 1
+
+            ret, frame = self.cap.retrieve()
+            if ret:
+                yield timestamp, frame
+
+    def extract_scene_changes(
+        self,
+        threshold: Optional[float] = None,
+        min_spacing: Optional[float] = None,
+        max_spacing: Optional[float] = None,
+        analysis_fps: Optional[float] = None,
+        on_sample: Optional[Callable[[], None]] = None
+    ) -> Iterator[Tuple[float, np.ndarray]]:
+        """
+        Yield (timestamp, BGR frame) whenever the picture changes.
+
+        The video is decoded forward once and ``analysis_fps`` frames per
+        second are scored against the previously scored frame. A frame is
+        emitted when its score reaches ``threshold`` and at least
+        ``min_spacing`` seconds passed since the last emitted frame, or when
+        nothing was emitted for ``max_spacing`` seconds. The first frame is
+        always emitted. ``on_sample`` is called for every scored frame.
+        """
+        threshold = settings.SCENE_THRESHOLD if threshold is None else threshold
+        min_spacing = settings.SCENE_MIN_SPACING if min_spacing is None else min_spacing
+        max_spacing = max_spacing or settings.SCENE_MAX_SPACING
+        analysis_fps = analysis_fps or settings.SCENE_ANALYSIS_FPS
+        step = max(int(round(self.fps / analysis_fps)), 1)
+
+        self.stats = ExtractionStats(mode=ExtractionMode.SCENE)
+        started = time.perf_counter()
+        previous: Optional[SceneSignature] = None
+        last_emitted: Optional[float] = None
+        position = 0
+
+        try:
+            while self.cap.grab():
+                position += 1
+                self.stats.frames_decoded += 1
+                if (position - 1) % step:
+                    continue
+
+                ret, frame = self.cap.retrieve()
+                if not ret:
+                    continue
+
+                scoring_started = time.perf_counter()
+                signature = SceneSignature.from_frame(frame, settings.SCENE_ANALYSIS_WIDTH)
+                score = signature.score(previous, settings.SCENE_PIXEL_DELTA) if previous is not None else 1.0
+                previous = signature
+                self.stats.frames_scored += 1
+                self.stats.scoring_seconds += time.perf_counter() - scoring_started
+                if on_sample is not None:
+                    on_sample()
+
+                timestamp = round((position - 1) / self.fps, 2)
+                since_last = None if last_emitted is None else timestamp - last_emitted
+                if since_last is None or since_last >= max_spacing or (
+                    score >= threshold and since_last >= min_spacing
+                ):
+                    last_emitted = timestamp
+                    self.stats.frames_emitted += 1
+                    self.stats.elapsed = time.perf_counter() - started
+                    yield timestamp, frame
+        finally:
+            self.stats.elapsed = time.perf_counter() - started
+
+    def scene_sample_count(self, analysis_fps: Optional[float] = None) -> int:
+        """Number of frames extract_scene_changes will score, used as its progress total"""
+        step = max(int(round(self.fps / (analysis_fps or settings.SCENE_ANALYSIS_FPS))), 1)
+        return -(-self.total_frames // step)
@@ -0,0 +1,177 @@
+import asyncio
+import hashlib
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AsyncIterator, Callable, Deque, Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from app.core.config import settings
+from app.core.metrics import record_stage, timed
+from app.models.schemas.video import FrameFormat, VideoInDB
+from app.services.frame.analysis_variants import AnalysisVariantStore, fit_to_size
+from app.services.frame.overlay import draw_timestamp
+
+# Marks the end of the decoded frames in the queue between stages
+_END = object()
+
+
+@dataclass(frozen=True)
+class FrameOutput:
+    """Image format, quality and longest side of the frames stored for a video"""
+    format: FrameFormat
+    quality: int
+    max_size: int  # 0 keeps the source resolution
+
+    @classmethod
+    def resolve(
+        cls,
+        frame_format: Optional[FrameFormat] = None,
+        quality: Optional[int] = None,
+        max_size: Optional[int] = None
+    ) -> "FrameOutput":
+        """Fill in unset values from the FRAME_* settings"""
+        return cls(
+            FrameFormat(frame_format or settings.FRAME_FORMAT),
+            quality or settings.FRAME_QUALITY,
+            settings.FRAME_MAX_SIZE if max_size is None else max_size
+        )
+
+    @classmethod
+    def for_video(cls, video: VideoInDB) -> "FrameOutput":
+        return cls.resolve(video.frame_format, video.frame_quality, video.frame_max_size)
+
+    @property
+    def extension(self) -> str:
+        return ".webp" if self.format == FrameFormat.WEBP else ".jpg"
+
+    @property
+    def encode_params(self) -> List[int]:
+        flag = cv2.IMWRITE_WEBP_QUALITY if self.format == FrameFormat.WEBP else cv2.IMWRITE_JPEG_QUALITY
+        return [flag, self.quality]
+
+
+@dataclass
+class EncodedFrame:
+    timestamp: float
+    path: Path
+    data: bytes
+    content_hash: str
+
+
+class FramePipeline:
+    """
+    Turns decoded frames into encoded images in three overlapping stages:
+    a thread pulls frames from the decoder, a thread pool resizes, stamps and
+    encodes them (OpenCV releases the GIL for both), and the caller writes the
+    results, in decode order, as they are yielded.
+
+    The decoded queue and the encodes in flight are both capped at
+    FRAME_PIPELINE_DEPTH, so at most about twice that many frames are held in
+    memory however fast the decoder is.
+    """
+
+    def __init__(
+        self,
+        output: FrameOutput,
+        variant_store: Optional[AnalysisVariantStore] = None,
+        encode_threads: Optional[int] = None,
+        depth: Optional[int] = None
+    ):
+        self.output = output
+        # Analysis variants are written from the decoded frame while it is at hand
+        self.variant_store = variant_store
+        self.encode_threads = encode_threads or settings.FRAME_ENCODE_THREADS
+        self.depth = depth or settings.FRAME_PIPELINE_DEPTH
+
+    def encode(self, frame: np.ndarray, timestamp: float, path: Path) -> EncodedFrame:
+        with timed("video", "encode"):
+            if self.output.max_size:
+                frame = fit_to_size(frame, self.output.max_size)
+            draw_timestamp(frame, timestamp)
+            _, encoded = cv2.imencode(self.output.extension, frame, self.output.encode_params)
+        if self.variant_store is not None:
+            with timed("video", "analysis_variant"):
+                self.variant_store.write(path, frame)
+        data = encoded.tobytes()
+        return EncodedFrame(timestamp, path, data, hashlib.sha256(data).hexdigest())
+
+    async def run(
+        self,
+        frames: Iterator[Tuple[float, np.ndarray]],
+        frame_path: Callable[[float], Path]
+    ) -> AsyncIterator[EncodedFrame]:
+        """Yield encoded frames in decode order, naming each one with ``frame_path(timestamp)``"""
+        loop = asyncio.get_running_loop()
+        decoded: queue.Queue = queue.Queue(maxsize=self.depth)
+        stop = threading.Event()
+        errors: List[BaseException] = []
+
+        def decode():
+            try:
+                for item in _timed_decode(frames):
+                    while not stop.is_set():
+                        try:
+                            decoded.put(item, timeout=0.1)
+                            break
+                        except queue.Full:
+                            continue
+                    if stop.is_set():
+                        return
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                decoded.put(_END)
+
+        decoder = threading.Thread(target=decode, name="frame-decoder", daemon=True)
+        decoder.start()
+        pool = ThreadPoolExecutor(max_workers=self.encode_threads, thread_name_prefix="frame-encoder")
+        pending: Deque[Future] = deque()
+        finished = False
+        try:
+            while True:
+                # Keep the encoders fed, only waiting on the decoder when nothing is being encoded
+                while not finished and len(pending) < self.depth:
+                    try:
+                        if pending:
+                            item = decoded.get_nowait()
+                        else:
+                            item = await loop.run_in_executor(None, decoded.get)
+                    except queue.Empty:
+                        break
+                    if item is _END:
+                        finished = True
+                        break
+                    timestamp, frame = item
+                    pending.append(pool.submit(self.encode, frame, timestamp, frame_path(timestamp)))
+
+                if not pending:
+                    break
+                yield await asyncio.wrap_future(pending.popleft())
+
+            if errors:
+                raise errors[0]
+        finally:
+            stop.set()
+            pool.shutdown(wait=True, cancel_futures=True)
+            # Unblock a decoder waiting on a full queue so the thread can exit
+            while decoder.is_alive():
+                try:
+                    decoded.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+
+
+def _timed_decode(frames: Iterator[Tuple[float, np.ndarray]]) -> Iterator[Tuple[float, np.ndarray]]:
+    """Pass frames through, observing how long the decoder took to produce each one"""
+    started = time.perf_counter()
+    for item in frames:
+        record_stage("video", "decode", time.perf_counter() - started)
+        yield item
+        started = time.perf_counter()
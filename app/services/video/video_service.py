@@ -1,23 +1,170 @@
+import asyncio
 import cv2
-import yt_dlp
+import numpy as np
+import hashlib
+import os
+import tempfile
+import re
+import shutil
+import time
 import uuid
+from contextlib import aclosing
 from pathlib import Path
-from typing import List, Tuple, Optional
+from typing import AsyncIterator, Iterator, List, Set, Tuple, Optional
 from datetime import datetime, timezone
+from fastapi import UploadFile
+from sqlalchemy import or_, select
 
 from app.core.config import settings
-from app.models.schemas.video import VideoCreate, VideoInDB, VideoSource
+from app.core.database import session_scope
+from app.core.exceptions import UnsupportedVideoFormatError, VideoTooLargeError
+from app.core.metrics import metrics, record_stage, timed
+from app.models.domain.job import ExtractionJobRecord
+from app.models.domain.video import VideoRecord
+from app.models.schemas.video import SamplingMode, VideoCreate, VideoInDB, VideoSource
 from app.services.frame.frame_service import FrameService
+from app.services.jobs.job_state_service import JobStateService, JobStatus, ProgressReporter
+from app.services.video.decoders import OpenCVDecoder, VideoDecoder, create_decoder
+from app.services.video.frame_extractor import ExtractionMode, sample_points
+from app.services.video.frame_pipeline import EncodedFrame, FrameOutput, FramePipeline
+from app.services.video.youtube_download import YouTubeDownload
+
+frames_extracted = metrics.counter(
+    "video_frames_extracted_total",
+    "Frames stored by extraction jobs",
+    ("sampling_mode",)
+)
+extraction_frames_per_second = metrics.histogram(
+    "video_extraction_frames_per_second",
+    "Frames stored per second of extraction job, per job",
+    ("sampling_mode",),
+    buckets=(0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+)
 
 class VideoService:
     def __init__(self):
         self.frame_service = FrameService()
+        self.job_state_service = JobStateService()
+
+    async def store_upload(self, upload: UploadFile) -> Tuple[Path, str]:
+        """
+        Copy a multipart upload into VIDEO_DIR, returns (path, sha256).
+
+        Starlette spools the whole file before the request handler runs, so
+        this copies a file that was already received in full. store_stream
+        writes a raw request body while it arrives instead.
+        """
+        return await self.store_stream(self._read_upload(upload), upload.filename or "", upload.size)
+
+    async def store_stream(
+        self,
+        chunks: AsyncIterator[bytes],
+        filename: str,
+        declared_size: Optional[int] = None
+    ) -> Tuple[Path, str]:
+        """
+        Write a video to VIDEO_DIR as its chunks arrive, returns (path, sha256).
+
+        Rejects a declared size over MAX_VIDEO_SIZE_MB before reading anything
+        and stops receiving once the limit is crossed. The file is written to a
+        temporary name in VIDEO_DIR and renamed into place once complete, named
+        by its content hash so concurrent uploads never clash.
+        """
+        suffix = Path(filename).suffix.lower()
+        if suffix not in settings.SUPPORTED_VIDEO_FORMATS:
+            raise UnsupportedVideoFormatError(
+                f"Unsupported video format '{suffix}', expected one of {sorted(settings.SUPPORTED_VIDEO_FORMATS)}"
+            )
+        
+        max_bytes = settings.MAX_VIDEO_SIZE_MB * 1024 * 1024
+        if declared_size is not None and declared_size > max_bytes:
+            raise VideoTooLargeError(f"Video exceeds the {settings.MAX_VIDEO_SIZE_MB} MB limit")
+        
+        digest = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=settings.VIDEO_DIR, prefix=".upload-", suffix=suffix)
+        try:
+            with timed("video", "upload"), os.fdopen(fd, "wb") as buffer:
+                async for chunk in chunks:
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise VideoTooLargeError(f"Video exceeds the {settings.MAX_VIDEO_SIZE_MB} MB limit")
+                    digest.update(chunk)
+                    buffer.write(chunk)
+            
+            content_hash = digest.hexdigest()
+            file_path = settings.VIDEO_DIR / f"{content_hash}{suffix}"
+            os.replace(temp_path, file_path)
+        except BaseException:
+            Path(temp_path).unlink(missing_ok=True)
+            raise
+        
+        return file_path, content_hash
+
+    @staticmethod
+    async def _read_upload(upload: UploadFile) -> AsyncIterator[bytes]:
+        while chunk := await upload.read(settings.UPLOAD_CHUNK_SIZE):
+            yield chunk
 
-    async def create_video(self, video_create: VideoCreate, file_path: Optional[Path] = None, frame_interval: Optional[int] = 2) -> VideoInDB:
+    def store_file(self, source: Path) -> Tuple[Path, str]:
+        """
+        Bring a video already on this server into VIDEO_DIR, returns (path, sha256).
+
+        Hard linked when VIDEO_DIR is on the same filesystem and copied
+        otherwise, so evicting the stored video never touches the original.
+        """
+        suffix = source.suffix.lower()
+        if suffix not in settings.SUPPORTED_VIDEO_FORMATS:
+            raise UnsupportedVideoFormatError(
+                f"Unsupported video format '{suffix}', expected one of {sorted(settings.SUPPORTED_VIDEO_FORMATS)}"
+            )
+        
+        digest = hashlib.sha256()
+        with timed("video", "hash"), source.open("rb") as video_file:
+            while chunk := video_file.read(settings.UPLOAD_CHUNK_SIZE):
+                digest.update(chunk)
+        content_hash = digest.hexdigest()
+        file_path = settings.VIDEO_DIR / f"{content_hash}{suffix}"
+        if file_path.exists():
+            return file_path, content_hash
+        
+        temp_path = settings.VIDEO_DIR / f".ingest-{uuid.uuid4().hex}{suffix}"
+        try:
+            with timed("video", "upload"):
+                try:
+                    os.link(source, temp_path)
+                except OSError:
+                    shutil.copyfile(source, temp_path)
+            os.replace(temp_path, file_path)
+        except BaseException:
+            temp_path.unlink(missing_ok=True)
+            raise
+        
+        return file_path, content_hash
+
+    async def create_video(
+        self,
+        video_create: VideoCreate,
+        file_path: Optional[Path] = None,
+        frame_interval: Optional[int] = 2,
+        content_hash: Optional[str] = None,
+        batch_id: Optional[str] = None
+    ) -> VideoInDB:
         video_id = str(uuid.uuid4())
+        content_key = self.content_key_for(video_create, content_hash)
+        output = FrameOutput.resolve(
+            video_create.frame_format, video_create.frame_quality, video_create.frame_max_size
+        )
         
-        if video_create.source == VideoSource.YOUTUBE:
-            file_path = await self._download_youtube_video(str(video_create.youtube_url))
+        # Same content at the same sampling and output was already extracted (or is being extracted)
+        if content_key is not None:
+            original = self._find_extracted_video(content_key, frame_interval, video_create.sampling_mode, output)
+            if original is not None:
+                return self._create_alias(video_id, video_create, original, batch_id)
+        
+        # YouTube videos are downloaded by their extraction job, unless an earlier job already did
+        if video_create.source == VideoSource.YOUTUBE and content_key is not None:
+            file_path = self._find_video_file(content_key)
         
         video_data = {
             "id": video_id,
@@ -29,66 +176,449 @@ class VideoService:
             "file_path": str(file_path) if file_path else None,
             "created_at": datetime.now(timezone.utc),
             "processed": False,
-            "frame_interval": frame_interval
+            "frame_interval": frame_interval,
+            "sampling_mode": video_create.sampling_mode,
+            "frame_format": output.format,
+            "frame_quality": output.quality,
+            "frame_max_size": output.max_size,
+            "content_hash": content_hash,
+            "content_key": content_key,
+            "batch_id": batch_id
         }
+        video = VideoInDB(**video_data)
+        
+        with session_scope() as session:
+            session.add(VideoRecord(
+                **video.model_dump(mode="json", exclude={"created_at"}),
+                created_at=video.created_at
+            ))
         
-        return VideoInDB(**video_data)
+        return video
 
-    async def _download_youtube_video(self, url: str) -> Path:
-        ydl_opts = {
-            'format': 'best[ext=mp4]',
-            'outtmpl': str(settings.VIDEO_DIR / '%(id)s.%(ext)s'),
-        }
+    @staticmethod
+    def content_key_for(video_create: VideoCreate, content_hash: Optional[str] = None) -> Optional[str]:
+        """Identify the video content without downloading or decoding it"""
+        if content_hash:
+            return f"sha256:{content_hash}"
+        if video_create.source == VideoSource.YOUTUBE and video_create.youtube_url:
+            youtube_id = _parse_youtube_id(str(video_create.youtube_url))
+            if youtube_id:
+                return f"youtube:{youtube_id}"
+        return None
+
+    def _find_extracted_video(
+        self,
+        content_key: str,
+        frame_interval: Optional[int],
+        sampling_mode: SamplingMode = SamplingMode.INTERVAL,
+        output: Optional[FrameOutput] = None
+    ) -> Optional[VideoRecord]:
+        conditions = [VideoRecord.content_key == content_key]
+        if output is not None:
+            # Videos stored before the output was configurable never match
+            conditions += [
+                VideoRecord.frame_format == output.format.value,
+                VideoRecord.frame_quality == output.quality,
+                VideoRecord.frame_max_size == output.max_size
+            ]
+        if sampling_mode == SamplingMode.SCENE:
+            # Scene sampling does not depend on the interval
+            conditions.append(VideoRecord.sampling_mode == sampling_mode.value)
+        else:
+            conditions += [
+                VideoRecord.frame_interval == frame_interval,
+                or_(VideoRecord.sampling_mode == sampling_mode.value, VideoRecord.sampling_mode.is_(None))
+            ]
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=True)
-            video_path = Path(ydl.prepare_filename(info))
-            return video_path
+        with session_scope() as session:
+            return session.scalar(
+                select(VideoRecord)
+                .outerjoin(ExtractionJobRecord, ExtractionJobRecord.video_id == VideoRecord.id)
+                .where(
+                    *conditions,
+                    VideoRecord.alias_of.is_(None),
+                    or_(
+                        VideoRecord.processed.is_(True),
+                        ExtractionJobRecord.status.in_(
+                            [JobStatus.PENDING, JobStatus.PROCESSING, JobStatus.COMPLETED]
+                        )
+                    )
+                )
+                .order_by(VideoRecord.created_at.desc())
+                .limit(1)
+            )
 
-    async def process_video(self, video: VideoInDB) -> Tuple[int, List[str]]:
-        cap = cv2.VideoCapture(str(video.file_path))
+    def _create_alias(
+        self,
+        video_id: str,
+        video_create: VideoCreate,
+        original: VideoRecord,
+        batch_id: Optional[str] = None
+    ) -> VideoInDB:
+        video = VideoInDB(
+            id=video_id,
+            title=video_create.title,
+            description=video_create.description,
+            source=video_create.source,
+            youtube_url=video_create.youtube_url,
+            filename=original.filename,
+            file_path=original.file_path,
+            created_at=datetime.now(timezone.utc),
+            processed=original.processed,
+            duration=original.duration,
+            frame_count=original.frame_count,
+            frame_interval=original.frame_interval,
+            sampling_mode=original.sampling_mode or SamplingMode.INTERVAL,
+            frame_format=original.frame_format,
+            frame_quality=original.frame_quality,
+            frame_max_size=original.frame_max_size,
+            content_hash=original.content_hash,
+            content_key=original.content_key,
+            alias_of=original.id,
+            batch_id=batch_id
+        )
         
-        if not cap.isOpened():
-            raise ValueError(f"Could not open video file: {video.file_path}")
+        with session_scope() as session:
+            session.add(VideoRecord(
+                **video.model_dump(mode="json", exclude={"created_at"}),
+                created_at=video.created_at
+            ))
+        
+        print(f"Video {video_id} reuses the frames of {original.id} ({original.content_key})")
+        return video
+
+    def _find_video_file(self, content_key: str) -> Optional[Path]:
+        """A file already on disk for this content, e.g. a YouTube video downloaded for another interval"""
+        with session_scope() as session:
+            file_paths = session.scalars(
+                select(VideoRecord.file_path)
+                .where(VideoRecord.content_key == content_key, VideoRecord.file_path.is_not(None))
+                .order_by(VideoRecord.created_at.desc())
+            )
+            for file_path in file_paths:
+                if Path(file_path).exists():
+                    return Path(file_path)
+        return None
+
+    async def get_video(self, video_id: str) -> Optional[VideoInDB]:
+        with session_scope() as session:
+            record = session.get(VideoRecord, video_id)
+            return VideoInDB.model_validate(record) if record else None
+
+    def _mark_processed(self, video_id: str, duration: float, frame_count: int, cancel_event=None):
+        if cancel_event is not None and cancel_event.is_set():
+            return
         
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        duration = total_frames / fps
+        with session_scope() as session:
+            record = session.get(VideoRecord, video_id)
+            if record is not None:
+                record.processed = True
+                record.duration = duration
+                record.frame_count = frame_count
+
+    def _set_video_file(self, video: VideoInDB, file_path: Path) -> VideoInDB:
+        with session_scope() as session:
+            record = session.get(VideoRecord, video.id)
+            if record is not None:
+                record.filename = file_path.name
+                record.file_path = str(file_path)
+        return video.model_copy(update={"filename": file_path.name, "file_path": str(file_path)})
+
+    async def process_video(self, video: VideoInDB, cancel_event=None) -> Tuple[int, List[str]]:
+        started = time.perf_counter()
+        with timed("video", "extract"):
+            frame_count, frame_paths = await self._process_video(video, cancel_event)
+        
+        elapsed = time.perf_counter() - started
+        sampling_mode = (video.sampling_mode or SamplingMode.INTERVAL).value
+        frames_extracted.inc(frame_count, sampling_mode=sampling_mode)
+        if frame_count and elapsed:
+            extraction_frames_per_second.observe(frame_count / elapsed, sampling_mode=sampling_mode)
+        return frame_count, frame_paths
+
+    async def _process_video(self, video: VideoInDB, cancel_event=None) -> Tuple[int, List[str]]:
+        if video.file_path is None and video.source == VideoSource.YOUTUBE:
+            return await self._process_youtube_video(video, cancel_event)
+        
+        if video.sampling_mode == SamplingMode.SCENE:
+            # Scene scoring needs every frame in order, which only the OpenCV backend provides
+            with timed("video", "open"):
+                decoder = OpenCVDecoder(video.file_path)
+            return await self._process_video_scenes(video, decoder, cancel_event)
+        
+        with timed("video", "open"):
+            decoder = create_decoder(video.file_path)
         frame_interval = video.frame_interval
-        frame_paths = []
+        points = decoder.sample_points(frame_interval)
+        mode = decoder.choose_mode(frame_interval)
+        
+        self.job_state_service.start(video.id, frames_expected=len(points))
+        
+        shard_count = self._shard_count(decoder.duration, len(points))
+        if shard_count > 1:
+            decoder.release()
+            frame_count, frame_paths = await self._process_video_sharded(video, points, mode, shard_count, cancel_event)
+            self._mark_processed(video.id, decoder.duration, frame_count, cancel_event)
+            self._finish_job(video.id, cancel_event)
+            return frame_count, frame_paths
+        
+        with decoder:
+            frame_paths = await self._extract_points(video, decoder, points, mode, 0, cancel_event)
+        self._mark_processed(video.id, decoder.duration, len(frame_paths), cancel_event)
+        self._finish_job(video.id, cancel_event)
+
+        stats = decoder.stats
+        print(
+            f"Extracted {stats.frames_emitted} frames from {video.id} with {decoder.name} in {stats.mode.value} mode: "
+            f"{stats.frames_per_second:.1f} frames/sec, {stats.decode_fps:.1f} decoded frames/sec"
+        )
+        return len(frame_paths), frame_paths
+
+    async def _process_video_scenes(
+        self,
+        video: VideoInDB,
+        decoder: OpenCVDecoder,
+        cancel_event=None
+    ) -> Tuple[int, List[str]]:
+        extractor = decoder.extractor
+        # Every score depends on the previous frame, so scene sampling always
+        # decodes the whole video in one process; progress counts scored frames
+        self.job_state_service.start(video.id, frames_expected=extractor.scene_sample_count())
+        progress = ProgressReporter(video.id, self.job_state_service)
         
-        current_second = 0
-        while current_second < duration:
-            frame_position = int(current_second * fps)
-            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_position)
-            ret, frame = cap.read()
+        frames = extractor.extract_scene_changes(on_sample=progress.advance)
+        with decoder:
+            frame_paths = await self._store_frames(video, frames, 0, cancel_event=cancel_event)
+        progress.flush()
+        self._mark_processed(video.id, extractor.duration, len(frame_paths), cancel_event)
+        self._finish_job(video.id, cancel_event, frames_done=len(frame_paths))
+
+        stats = extractor.stats
+        print(
+            f"Extracted {stats.frames_emitted} scene frames out of {stats.frames_scored} scored from {video.id}: "
+            f"{stats.decode_fps:.1f} decoded frames/sec, scoring took {100 * stats.scoring_share:.1f}% of the time"
+        )
+        return len(frame_paths), frame_paths
+
+    async def _process_youtube_video(self, video: VideoInDB, cancel_event=None) -> Tuple[int, List[str]]:
+        """
+        Download a YouTube video inside its extraction job. Interval sampling
+        extracts the samples already on disk every YOUTUBE_FOLLOW_INTERVAL
+        while the rest downloads; scene sampling scores every frame in order,
+        so it waits for the whole file.
+        """
+        download_started = time.perf_counter()
+        download = YouTubeDownload(
+            str(video.youtube_url), str(settings.VIDEO_DIR / f"{video.id}.%(ext)s"), cancel_event
+        ).start()
+        await asyncio.to_thread(download.wait_started)
+        
+        if video.sampling_mode == SamplingMode.SCENE or not (download.fps and download.duration):
+            await asyncio.to_thread(download.wait)
+            record_stage("video", "download", time.perf_counter() - download_started)
+            if download.file_path is None:
+                self._finish_job(video.id, cancel_event)
+                return 0, []
+            return await self._process_video(self._set_video_file(video, download.file_path), cancel_event)
+        
+        points = sample_points(download.fps, download.duration, video.frame_interval)
+        self.job_state_service.start(video.id, frames_expected=len(points))
+        progress = ProgressReporter(video.id, self.job_state_service)
+        started = time.perf_counter()
+        frame_paths: List[str] = []
+        stored: Set[float] = set()
+        rounds = 0
+        
+        while points:
+            finished = await asyncio.to_thread(download.wait, settings.YOUTUBE_FOLLOW_INTERVAL)
+            if cancel_event is not None and cancel_event.is_set():
+                break
             
-            if ret:
-                # Add timestamp text to frame
-                # Add black background rectangle for better text visibility
-                text = f"{int(current_second)} sec"
-                font = cv2.FONT_HERSHEY_SIMPLEX
-                font_scale = 1
-                thickness = 1
-                (text_width, text_height), _ = cv2.getTextSize(text, font, font_scale, thickness)
-                cv2.rectangle(frame, (5, 5), (text_width + 15, text_height + 15), (100, 100, 100), -1)
-                cv2.putText(frame, text, (10, 30), font, font_scale, (255, 255, 255), thickness)
-                
-                frame_path = settings.FRAME_DIR / f"{video.id}_{current_second}.jpg"
-                cv2.imwrite(str(frame_path), frame)
-                frame_paths.append(str(frame_path))
-                
-                # Create frame record
-                await self.frame_service.create_frame(
-                    video_id=video.id,
-                    timestamp=current_second,
-                    frame_number=len(frame_paths),
-                    file_path=str(frame_path)
-                )
+            ready = points if finished else [point for point in points if point[0] <= download.available_seconds]
+            # The final name only exists once the download is complete
+            path = download.file_path or download.partial_path
+            if not ready or path is None:
+                continue
+            try:
+                decoder = create_decoder(path)
+            except ValueError:
+                if finished:
+                    raise
+                # Container header not on disk yet, or stored at the end of the file
+                continue
             
-            current_second += frame_interval
+            mode = decoder.choose_mode(video.frame_interval)
+            if not finished and mode == ExtractionMode.SEQUENTIAL:
+                # Sequential decoding would start over from the first frame every round
+                mode = ExtractionMode.SEEK
+            with decoder:
+                frames = _skip_stored(decoder.extract_points(ready, mode), stored)
+                frame_paths += await self._store_frames(video, frames, len(frame_paths), progress, cancel_event)
+            rounds += 1
+            # Samples the partial file could not produce yet are retried next round, also ones
+            # before the newest frame, e.g. in a region of the file not flushed yet
+            if finished:
+                points = []
+            elif mode == ExtractionMode.KEYFRAME:
+                # Frames are labelled with the keyframe's time, at or before the sample, so
+                # only samples past the newest keyframe can still produce a new frame
+                last_stored = max(stored, default=-1.0)
+                points = [point for point in points if point[0] > last_stored]
+            else:
+                points = [point for point in points if point[0] not in stored]
         
-        cap.release()
+        progress.flush()
+        await asyncio.to_thread(download.wait)
+        record_stage("video", "download", time.perf_counter() - download_started)
+        if download.file_path is not None:
+            video = self._set_video_file(video, download.file_path)
+        self._mark_processed(video.id, download.duration, len(frame_paths), cancel_event)
+        self._finish_job(video.id, cancel_event)
+        
+        elapsed = time.perf_counter() - started
+        print(
+            f"Extracted {len(frame_paths)} frames from {video.id} in {rounds} rounds while downloading: "
+            f"{elapsed:.1f}s from first bytes to last frame"
+        )
+        return len(frame_paths), frame_paths
+
+    async def _extract_points(
+        self,
+        video: VideoInDB,
+        decoder: VideoDecoder,
+        points: List[Tuple[float, int]],
+        mode: ExtractionMode,
+        first_frame_number: int,
+        cancel_event=None
+    ) -> List[str]:
+        progress = ProgressReporter(video.id, self.job_state_service)
+        frames = decoder.extract_points(points, mode)
+        frame_paths = await self._store_frames(video, frames, first_frame_number, progress, cancel_event)
+        progress.flush()
+        return frame_paths
+
+    async def _store_frames(
+        self,
+        video: VideoInDB,
+        frames: Iterator[Tuple[float, np.ndarray]],
+        first_frame_number: int,
+        progress: Optional[ProgressReporter] = None,
+        cancel_event=None
+    ) -> List[str]:
+        """Encode, write and index extracted frames, advancing ``progress`` once per stored frame"""
+        frame_paths = []
+        
+        async with aclosing(self._write_frames(video, frames, progress, cancel_event)) as written:
+            async for encoded in written:
+                frame_paths.append(str(encoded.path))
+                await self._index_frame(
+                    video, encoded.timestamp, first_frame_number + len(frame_paths), encoded.path, encoded.content_hash
+                )
+        
+        return frame_paths
+
+    async def _write_frames(
+        self,
+        video: VideoInDB,
+        frames: Iterator[Tuple[float, np.ndarray]],
+        progress: Optional[ProgressReporter] = None,
+        cancel_event=None
+    ) -> AsyncIterator[EncodedFrame]:
+        """Encode extracted frames and write them to FRAME_DIR, advancing ``progress`` after each one is handled"""
+        output = FrameOutput.for_video(video)
+        variant_store = self.frame_service.variant_store if settings.ANALYSIS_VARIANTS_AT_EXTRACTION else None
+        encoded_frames = FramePipeline(output, variant_store).run(
+            frames, lambda second: settings.FRAME_DIR / f"{video.id}_{second}{output.extension}"
+        )
+        frame_count = 0
+        
+        async with aclosing(encoded_frames):
+            async for encoded in encoded_frames:
+                if cancel_event is not None and cancel_event.is_set():
+                    print(f"Extraction of {video.id} cancelled after {frame_count} frames")
+                    break
+                
+                with timed("video", "write"):
+                    encoded.path.write_bytes(encoded.data)
+                frame_count += 1
+                yield encoded
+                if progress is not None:
+                    progress.advance()
+
+    async def _index_frame(
+        self,
+        video: VideoInDB,
+        timestamp: float,
+        frame_number: int,
+        file_path: Path,
+        content_hash: str
+    ):
+        with timed("video", "index"):
+            await self.frame_service.create_frame(
+                video_id=video.id,
+                timestamp=timestamp,
+                frame_number=frame_number,
+                file_path=str(file_path),
+                content_hash=content_hash
+            )
+
+    def _finish_job(self, video_id: str, cancel_event=None, frames_done: Optional[int] = None):
+        if cancel_event is not None and cancel_event.is_set():
+            self.job_state_service.finish(video_id, JobStatus.CANCELLED)
+        else:
+            self.job_state_service.finish(video_id, JobStatus.COMPLETED, frames_done=frames_done)
+
+    def _shard_count(self, duration: float, sample_count: int) -> int:
+        """Number of time ranges to extract in parallel, 1 keeps the single-threaded path"""
+        if not settings.EXTRACTION_SHARDING or duration < settings.EXTRACTION_SHARD_MIN_DURATION:
+            return 1
+        
+        cores = (len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()) or 1
+        # This runs in one of the job runner's workers, leave a core to every other job running
+        free_cores = max(cores - (self.job_state_service.count_running() - 1), 1)
+        shard_count = min(settings.EXTRACTION_MAX_SHARDS or free_cores, free_cores)
+        # Keep every shard busy long enough to amortise opening its own capture
+        shard_count = min(shard_count, sample_count // settings.EXTRACTION_MIN_SAMPLES_PER_SHARD)
+        return max(shard_count, 1)
+
+    async def _process_video_sharded(
+        self,
+        video: VideoInDB,
+        points: List[Tuple[float, int]],
+        mode: ExtractionMode,
+        shard_count: int,
+        cancel_event=None
+    ) -> Tuple[int, List[str]]:
+        # Contiguous slices of the sample points, so every shard decodes its own time range.
+        # A shard owns the frames after the previous shard's last sample: with keyframes
+        # only, its first sample can land on a keyframe the previous shard already yields.
+        shard_size = -(-len(points) // shard_count)
+        shards = [
+            (points[start - 1][0] if start else None, points[start:start + shard_size])
+            for start in range(0, len(points), shard_size)
+        ]
+        started = time.perf_counter()
+        
+        # Threads of this worker process rather than a pool of their own: OpenCV and the
+        # encoders release the GIL, and the job keeps to the worker the scheduler gave it.
+        # Shards only write their frames, which are indexed here once all are written.
+        results = await asyncio.gather(*[
+            asyncio.to_thread(_extract_shard, video, shard_points, mode, after, cancel_event)
+            for after, shard_points in shards
+        ])
+        
+        # Shards are in time order and don't overlap, so frames are numbered as the
+        # single-threaded path numbers them
+        frame_paths = []
+        for timestamp, file_path, content_hash in (frame for shard_frames in results for frame in shard_frames):
+            frame_paths.append(str(file_path))
+            await self._index_frame(video, timestamp, len(frame_paths), file_path, content_hash)
+        
+        elapsed = time.perf_counter() - started
+        print(
+            f"Extracted {len(frame_paths)} frames from {video.id} in {len(shards)} {mode.value} shards: "
+            f"{len(frame_paths) / elapsed if elapsed else 0.0:.1f} frames/sec"
+        )
         return len(frame_paths), frame_paths
 
     async def get_video_info(self, video_path: Path) -> dict:
@@ -105,4 +635,51 @@ class VideoService:
         }
         
         cap.release()
-        return info 
\ No newline at end of file
+        return info 
+
+_YOUTUBE_ID_PATTERN = re.compile(
+    r"(?:youtube\.com/(?:watch\?(?:.*&)?v=|shorts/|embed/|live/|v/)|youtu\.be/)([A-Za-z0-9_-]{11})"
+)
+
+
+def _parse_youtube_id(url: str) -> Optional[str]:
+    match = _YOUTUBE_ID_PATTERN.search(url)
+    return match.group(1) if match else None
+
+
+def _skip_stored(frames: Iterator[Tuple[float, np.ndarray]], timestamps: Set[float]):
+    """Pass frames through unless an earlier round stored their timestamp, noting the timestamp of each one"""
+    for timestamp, frame in frames:
+        if timestamp in timestamps:
+            continue
+        timestamps.add(timestamp)
+        yield timestamp, frame
+
+
+def _extract_shard(
+    video: VideoInDB,
+    points: List[Tuple[float, int]],
+    mode: ExtractionMode,
+    after: Optional[float] = None,
+    cancel_event=None
+) -> List[Tuple[float, Path, str]]:
+    """
+    Write the frames of one time range of a video with its own decoder and event loop,
+    inside a shard thread. Frames at or before ``after`` belong to the previous shard.
+    Returns (timestamp, path, content hash) of each frame written, in time order.
+    """
+    async def write(frames: Iterator[Tuple[float, np.ndarray]]) -> List[Tuple[float, Path, str]]:
+        progress = ProgressReporter(video.id, service.job_state_service)
+        written = []
+        async with aclosing(service._write_frames(video, frames, progress, cancel_event)) as encoded_frames:
+            async for encoded in encoded_frames:
+                written.append((encoded.timestamp, encoded.path, encoded.content_hash))
+        progress.flush()
+        return written
+    
+    service = VideoService()
+    with create_decoder(video.file_path) as decoder:
+        frames = decoder.extract_points(points, mode)
+        if after is not None:
+            frames = ((timestamp, frame) for timestamp, frame in frames if timestamp > after)
+        return asyncio.run(write(frames))
@@ -0,0 +1,127 @@
+import threading
+from pathlib import Path
+from typing import Optional
+
+import yt_dlp
+from yt_dlp.utils import DownloadCancelled
+
+from app.core.config import settings
+
+
+def youtube_format(target_height: Optional[int] = None) -> str:
+    """
+    yt-dlp format selector for the smallest stream at least ``target_height``
+    tall, or the largest one when none is that tall.
+
+    Frames need no audio, so video-only streams qualify: they are smaller and
+    need no merge step, which keeps the download a single file that grows
+    front to back. H.264 in MP4 is preferred because every decoder backend
+    reads it.
+    """
+    height = target_height or settings.YOUTUBE_TARGET_HEIGHT
+    return "/".join([
+        f"wv*[height>={height}][vcodec^=avc1]",
+        "bv*[vcodec^=avc1]",
+        f"wv*[height>={height}][ext=mp4]",
+        "bv*[ext=mp4]",
+        "b",
+    ])
+
+
+class YouTubeDownload:
+    """
+    A yt-dlp download running in a background thread of the extraction worker.
+
+    Progress hooks record how much of the file is on disk, so extraction can
+    work on the partial file while the rest downloads. Setting
+    ``cancel_event`` aborts the download at the next progress update.
+    """
+
+    def __init__(self, url: str, output_template: str, cancel_event=None):
+        self.url = url
+        self.output_template = output_template
+        self.cancel_event = cancel_event
+        self.duration: Optional[float] = None
+        self.fps: Optional[float] = None
+        self.partial_path: Optional[Path] = None
+        self.file_path: Optional[Path] = None
+        self.downloaded_bytes = 0
+        self.total_bytes: Optional[int] = None
+        self.error: Optional[BaseException] = None
+        self._started = threading.Event()
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="youtube-download", daemon=True)
+
+    def start(self) -> "YouTubeDownload":
+        self._thread.start()
+        return self
+
+    @property
+    def finished(self) -> bool:
+        return self._done.is_set()
+
+    @property
+    def available_seconds(self) -> float:
+        """Seconds of video safely on disk, estimated from the share of bytes downloaded"""
+        if self.finished:
+            return float("inf")
+        if not self.duration or not self.total_bytes:
+            return 0.0
+        downloaded = self.duration * min(self.downloaded_bytes / self.total_bytes, 1.0)
+        return max(downloaded - settings.YOUTUBE_FOLLOW_MARGIN, 0.0)
+
+    def wait_started(self):
+        """Block until the first bytes arrive (or the download ends), raising its error if it failed"""
+        self._started.wait()
+        self._raise_error()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the download ends or ``timeout`` passes, True once it has ended"""
+        finished = self._done.wait(timeout)
+        self._raise_error()
+        return finished
+
+    def _raise_error(self):
+        # A cancelled download just ends, the job reports the cancellation
+        if self.error is not None and not isinstance(self.error, DownloadCancelled):
+            raise RuntimeError(f"Failed to download YouTube video: {self.error}") from self.error
+
+    def _run(self):
+        options = {
+            "format": youtube_format(),
+            "outtmpl": self.output_template,
+            "progress_hooks": [self._on_progress],
+            "quiet": True,
+            "noprogress": True,
+        }
+        try:
+            with yt_dlp.YoutubeDL(options) as ydl:
+                info = ydl.extract_info(self.url, download=True)
+                if self.file_path is None:
+                    self.file_path = Path(ydl.prepare_filename(info))
+                self._read_info(info)
+        except BaseException as e:
+            self.error = e
+            if self.partial_path is not None:
+                self.partial_path.unlink(missing_ok=True)
+        finally:
+            self._started.set()
+            self._done.set()
+
+    def _on_progress(self, progress: dict):
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise DownloadCancelled("Extraction cancelled")
+
+        self._read_info(progress.get("info_dict") or {})
+        self.total_bytes = progress.get("total_bytes") or progress.get("total_bytes_estimate") or self.total_bytes
+        if progress["status"] == "downloading":
+            self.downloaded_bytes = progress.get("downloaded_bytes") or 0
+            self.partial_path = Path(progress.get("tmpfilename") or progress["filename"])
+        elif progress["status"] == "finished":
+            self.file_path = Path(progress["filename"])
+            self.downloaded_bytes = self.total_bytes or self.downloaded_bytes
+        self._started.set()
+
+    def _read_info(self, info: dict):
+        self.duration = info.get("duration") or self.duration
+        self.fps = info.get("fps") or self.fps
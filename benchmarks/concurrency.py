@@ -0,0 +1,83 @@
+"""
+Measure how many concurrent frame analyses one API worker sustains.
+
+Start the stub first (see benchmarks/stub_openai.py), then:
+
+    OPENAI_API_KEY=stub OPENAI_BASE_URL=http://localhost:8100/v1 \
+        python -m benchmarks.concurrency --requests 64 --frames 8
+"""
+import argparse
+import asyncio
+import base64
+import io
+import statistics
+import time
+
+from PIL import Image
+
+from app.models.schemas.frame import FrameBatchAnalysis
+from app.services.openai.openai_service import OpenAIService
+
+
+def tiny_jpeg() -> str:
+    # The stub never looks at the pixels, keep the payload small
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), "white").save(buffer, format="JPEG")
+    return base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+
+def make_frames(count: int):
+    image = tiny_jpeg()
+    return [
+        {
+            "id": str(index),
+            "timestamp": float(index),
+            "file_path": f"frame_{index}.jpg",
+            "image_url": {"url": f"data:image/jpeg;base64,{image}"}
+        }
+        for index in range(count)
+    ]
+
+
+async def run(requests: int, frames: int, model: str):
+    service = OpenAIService()
+    batch = FrameBatchAnalysis(
+        video_id="benchmark",
+        frame_ids=[str(index) for index in range(frames)],
+        analysis_type="default",
+        sequence_prompt="Describe the chickens' behaviour.",
+        description="Synthetic benchmark",
+        messages=[],
+        model=model,
+        language="English"
+    )
+    latencies = []
+
+    async def one():
+        started = time.perf_counter()
+        result = await service.analyze_frames(make_frames(frames), batch)
+        latencies.append(time.perf_counter() - started)
+        return result["status"]
+
+    started = time.perf_counter()
+    statuses = await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+    await service.aclose()
+
+    latencies.sort()
+    print(f"requests: {requests}, frames/request: {frames}, succeeded: {statuses.count('success')}")
+    print(f"wall time: {elapsed:.2f}s, throughput: {requests / elapsed:.2f} analyses/s")
+    print(f"latency p50: {statistics.median(latencies):.2f}s, p95: {latencies[int(len(latencies) * 0.95) - 1]:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--frames", type=int, default=8)
+    parser.add_argument("--model", default="gpt-4o-mini")
+    args = parser.parse_args()
+    asyncio.run(run(args.requests, args.frames, args.model))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Compare one image per frame against contact sheets for a frame analysis.
+
+Synthetic frames are written to a temporary directory, then both ways of
+sending them are measured: estimated image tokens, payload size, packing
+time (cold and cached) and, unless --no-api is given, request latency and
+reported prompt tokens from the configured endpoint. Start the stub first
+(see benchmarks/stub_openai.py) to measure latency without spending tokens:
+
+    OPENAI_API_KEY=stub OPENAI_BASE_URL=http://localhost:8100/v1 \
+        python -m benchmarks.contact_sheets --frames 36 --repeats 5
+"""
+import argparse
+import asyncio
+import hashlib
+import statistics
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from app.core.config import settings
+from app.models.schemas.frame import FrameBatchAnalysis, FrameInDB
+from app.services.frame.analysis_variants import analysis_variant_store
+from app.services.frame.contact_sheets import ContactSheetPacker
+from app.services.frame.overlay import draw_timestamp
+from app.services.openai.openai_service import OpenAIService
+from app.services.openai.token_estimator import estimate_message_tokens
+
+
+def make_records(directory: Path, count: int, width: int, height: int, interval: float):
+    rng = np.random.default_rng(0)
+    background = rng.integers(60, 120, (height, width, 3), dtype=np.uint8)
+    records = []
+    for index in range(count):
+        timestamp = index * interval
+        frame = background.copy()
+        # A few moving blobs standing in for chickens
+        for blob in range(5):
+            x = int((width / 6) * (blob + 1) + 40 * np.sin(index / 3 + blob)) % width
+            y = int(height / 2 + 60 * np.cos(index / 4 + blob))
+            cv2.circle(frame, (x, y), max(height // 20, 4), (230, 230, 230), -1)
+        draw_timestamp(frame, timestamp)
+
+        path = directory / f"benchmark_{timestamp}.jpg"
+        _, encoded = cv2.imencode(".jpg", frame)
+        path.write_bytes(encoded.tobytes())
+        records.append(FrameInDB(
+            id=str(index),
+            video_id="benchmark",
+            frame_key=str(timestamp),
+            timestamp=timestamp,
+            frame_number=index + 1,
+            file_path=str(path),
+            content_hash=hashlib.sha256(encoded.tobytes()).hexdigest(),
+            created_at=datetime.now(timezone.utc)
+        ))
+    return records
+
+
+def per_frame_images(records):
+    images = []
+    for record in records:
+        variant = analysis_variant_store.get(Path(record.file_path))
+        images.append({
+            "id": record.frame_key,
+            "timestamp": record.timestamp,
+            "file_path": record.file_path,
+            "width": variant.width,
+            "height": variant.height,
+            "image_url": {"url": variant.data_url, "detail": "high"}
+        })
+    return images
+
+
+def describe(name: str, service: OpenAIService, images, batch: FrameBatchAnalysis):
+    messages = service._sequence_messages(images, batch)
+    sizes = [(image["width"], image["height"]) for image in images]
+    payload = sum(len(image["image_url"]["url"]) for image in images)
+    tokens = estimate_message_tokens(messages, sizes)
+    print(f"{name}: {len(images)} images, ~{tokens} estimated prompt tokens, {payload / 1024:.0f} KiB of base64")
+    return messages, sizes
+
+
+async def measure(name: str, service: OpenAIService, messages, sizes, model: str, repeats: int):
+    latencies = []
+    prompt_tokens = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        response = await service.create_chat_completion(
+            model=model, messages=messages, image_sizes=sizes, max_tokens=500
+        )
+        latencies.append(time.perf_counter() - started)
+        if response.usage is not None:
+            prompt_tokens = response.usage.prompt_tokens
+    print(
+        f"{name}: latency p50 {statistics.median(latencies):.2f}s, max {max(latencies):.2f}s, "
+        f"reported prompt tokens {prompt_tokens}"
+    )
+
+
+async def run(args):
+    with tempfile.TemporaryDirectory() as directory:
+        # Keep variants and sheets out of the real storage
+        settings.FRAME_DIR = Path(directory)
+        records = make_records(Path(directory), args.frames, args.width, args.height, args.interval)
+        batch = FrameBatchAnalysis(
+            video_id="benchmark",
+            frame_ids=[record.frame_key for record in records],
+            analysis_type="default",
+            sequence_prompt="Describe the chickens' behaviour.",
+            description="Synthetic benchmark",
+            messages=[],
+            model=args.model,
+            language="English"
+        )
+        service = OpenAIService()
+        packer = ContactSheetPacker()
+
+        started = time.perf_counter()
+        frames = per_frame_images(records)
+        print(f"per-frame variants: {time.perf_counter() - started:.3f}s")
+
+        started = time.perf_counter()
+        sheets = packer.pack(records)
+        cold = time.perf_counter() - started
+        started = time.perf_counter()
+        packer.pack(records)
+        warm = time.perf_counter() - started
+        print(f"contact sheets: {cold:.3f}s to compose, {warm:.3f}s from cache")
+
+        frame_messages, frame_sizes = describe("one image per frame", service, frames, batch)
+        sheet_messages, sheet_sizes = describe("contact sheets", service, sheets, batch)
+
+        if not args.no_api:
+            await measure("one image per frame", service, frame_messages, frame_sizes, args.model, args.repeats)
+            await measure("contact sheets", service, sheet_messages, sheet_sizes, args.model, args.repeats)
+        await service.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=36)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--interval", type=float, default=10.0, help="Seconds between synthetic frames")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--model", default="gpt-4o-mini")
+    parser.add_argument("--no-api", action="store_true", help="Only compare estimates, don't call the model")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Compare decoder backends on synthetic videos.
+
+Writes a synthetic video per resolution, re-encoded to H.264 with a long
+keyframe interval when ffmpeg is available (OpenCV's own mp4v writer puts a
+keyframe every few frames, which hides what keyframe-only decoding saves),
+then extracts it at each sampling interval with every available backend:
+
+    python -m benchmarks.decoders --duration 300 --intervals 2 10 30
+
+Backends that cannot run here (no av package, no ffmpeg binary) are skipped.
+"""
+import argparse
+import shutil
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+from app.core.config import settings
+from app.services.video.decoders import DECODER_BACKENDS, create_decoder
+from app.services.video.frame_extractor import ExtractionMode
+from benchmarks.synthetic import write_synthetic_video
+
+
+def write_video(path: Path, seconds: float, fps: int, width: int, height: int, gop_seconds: float) -> Path:
+    raw_path = write_synthetic_video(path.with_suffix(".raw.mp4"), seconds, fps, width, height)
+    if shutil.which(settings.FFMPEG_PATH) is None:
+        raw_path.rename(path)
+        return path
+    subprocess.run(
+        [
+            settings.FFMPEG_PATH, "-nostdin", "-loglevel", "error", "-y", "-i", str(raw_path),
+            "-c:v", "libx264", "-preset", "veryfast", "-g", str(int(fps * gop_seconds)), str(path)
+        ],
+        check=True
+    )
+    raw_path.unlink()
+    return path
+
+
+def available_backends():
+    backends = []
+    for name in DECODER_BACKENDS:
+        if name == "ffmpeg" and shutil.which(settings.FFMPEG_PATH) is None:
+            continue
+        if name == "pyav":
+            try:
+                import av  # noqa: F401
+            except ImportError:
+                continue
+        backends.append(name)
+    return backends
+
+
+def measure(video_path: Path, backend: str, interval: float, keyframes_only: bool):
+    settings.VIDEO_DECODER_KEYFRAMES_ONLY = keyframes_only
+    with create_decoder(video_path, backend) as decoder:
+        points = decoder.sample_points(interval)
+        mode = decoder.choose_mode(interval)
+        started = time.perf_counter()
+        frames = sum(1 for _ in decoder.extract_points(points, mode))
+        elapsed = time.perf_counter() - started
+        return mode, frames, decoder.stats.frames_decoded, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=120, help="Seconds of synthetic video")
+    parser.add_argument("--fps", type=int, default=25)
+    parser.add_argument("--resolutions", nargs="+", default=["640x360", "1280x720"])
+    parser.add_argument("--gop", type=float, default=4.0, help="Seconds between keyframes of the H.264 encode")
+    parser.add_argument("--intervals", nargs="+", type=float, default=[2, 10, 30])
+    args = parser.parse_args()
+
+    backends = available_backends()
+    print(f"backends: {', '.join(backends)}")
+    print(f"{'video':>10} {'interval':>8} {'backend':>8} {'mode':>10} {'frames':>6} {'decoded':>7} {'seconds':>8} {'frames/s':>9}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        for resolution in args.resolutions:
+            width, height = (int(value) for value in resolution.split("x"))
+            video_path = write_video(
+                Path(directory) / f"synthetic_{resolution}.mp4", args.duration, args.fps, width, height, args.gop
+            )
+            for interval in args.intervals:
+                for backend in backends:
+                    for keyframes_only in ([False] if backend == "opencv" else [True, False]):
+                        mode, frames, decoded, elapsed = measure(video_path, backend, interval, keyframes_only)
+                        label = mode.value if mode != ExtractionMode.SEEK or backend == "opencv" else "exact"
+                        print(
+                            f"{resolution:>10} {interval:>8g} {backend:>8} {label:>10} {frames:>6} {decoded:>7} "
+                            f"{elapsed:>8.2f} {frames / elapsed if elapsed else 0.0:>9.1f}"
+                        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Minimal stand-in for the OpenAI chat completions API.
+
+Run it with ``uvicorn benchmarks.stub_openai:app --port 8100`` and point the
+API at it with ``OPENAI_BASE_URL=http://localhost:8100/v1``. Latency and error
+injection are controlled with environment variables:
+
+- STUB_LATENCY_MS: base response latency (default 800)
+- STUB_LATENCY_PER_IMAGE_MS: extra latency per attached image (default 20)
+- STUB_ERROR_RATE: fraction of requests answered with 429 or 503 (default 0)
+- STUB_FIRST_TOKEN_MS: base time to the first chunk of streamed responses (default 300)
+- STUB_TOKEN_INTERVAL_MS: delay between streamed chunks (default 20)
+"""
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+app = FastAPI(title="OpenAI stub")
+
+LATENCY_MS = float(os.getenv("STUB_LATENCY_MS", "800"))
+LATENCY_PER_IMAGE_MS = float(os.getenv("STUB_LATENCY_PER_IMAGE_MS", "20"))
+ERROR_RATE = float(os.getenv("STUB_ERROR_RATE", "0"))
+FIRST_TOKEN_MS = float(os.getenv("STUB_FIRST_TOKEN_MS", "300"))
+TOKEN_INTERVAL_MS = float(os.getenv("STUB_TOKEN_INTERVAL_MS", "20"))
+
+stats = {"requests": 0, "in_flight": 0, "max_in_flight": 0, "errors": 0}
+
+
+def count_images(messages) -> int:
+    images = 0
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, list):
+            images += sum(1 for part in content if part.get("type") == "image_url")
+    return images
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    stats["requests"] += 1
+
+    if random.random() < ERROR_RATE:
+        stats["errors"] += 1
+        status_code = random.choice([429, 503])
+        return JSONResponse(
+            status_code=status_code,
+            content={"error": {"message": "Injected stub error", "type": "stub_error", "code": status_code}},
+            headers={"retry-after": "0.1"} if status_code == 429 else None
+        )
+
+    images = count_images(body.get("messages", []))
+    if body.get("stream"):
+        return StreamingResponse(stream_completion(body, images), media_type="text/event-stream")
+
+    stats["in_flight"] += 1
+    stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+    try:
+        await asyncio.sleep((LATENCY_MS + LATENCY_PER_IMAGE_MS * images) / 1000)
+    finally:
+        stats["in_flight"] -= 1
+
+    completion = f"Stub analysis of {images} images."
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "stub"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": completion},
+            "finish_reason": "stop"
+        }],
+        "usage": {
+            "prompt_tokens": 100 + 765 * images,
+            "completion_tokens": 8,
+            "total_tokens": 108 + 765 * images
+        }
+    }
+
+
+async def stream_completion(body: dict, images: int):
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+
+    def chunk(delta: dict, finish_reason=None, usage=None) -> str:
+        payload = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": body.get("model", "stub"),
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if usage is None else [],
+            "usage": usage
+        }
+        return f"data: {json.dumps(payload)}\n\n"
+
+    stats["in_flight"] += 1
+    stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+    try:
+        await asyncio.sleep((FIRST_TOKEN_MS + LATENCY_PER_IMAGE_MS * images) / 1000)
+        yield chunk({"role": "assistant", "content": ""})
+        words = f"Stub analysis of {images} images, streamed one word at a time.".split(" ")
+        for index, word in enumerate(words):
+            yield chunk({"content": word if index == 0 else f" {word}"})
+            await asyncio.sleep(TOKEN_INTERVAL_MS / 1000)
+        yield chunk({}, finish_reason="stop")
+        if (body.get("stream_options") or {}).get("include_usage"):
+            yield chunk({}, usage={
+                "prompt_tokens": 100 + 765 * images,
+                "completion_tokens": len(words),
+                "total_tokens": 100 + 765 * images + len(words)
+            })
+        yield "data: [DONE]\n\n"
+    finally:
+        stats["in_flight"] -= 1
+
+
+@app.get("/stats")
+async def get_stats():
+    return stats
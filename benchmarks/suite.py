@@ -0,0 +1,391 @@
+"""
+Reproducible benchmark suite for the ingestion and analysis pipeline.
+
+Every run starts from an empty temporary storage directory, synthetic videos
+written with cv2.VideoWriter and an in-process stub of the OpenAI API (see
+benchmarks/stub_openai.py), so results depend only on the code and the
+machine. Each benchmark runs in a process of its own, which makes the peak
+RSS it reports its own too:
+
+- process_video: VideoService.process_video on each synthetic video, frames/s
+- get_frames_by_video_id: FrameService frame index lookups, lookups/s
+- process_frames_batch: FrameService frame records to base64 payloads, batches/s
+- analyze: the full /api/v1/frames/analyze endpoint against the stub, requests/s
+
+Record a baseline, then check later runs against it:
+
+    python -m benchmarks.suite --save-baseline benchmarks/baseline.json
+    python -m benchmarks.suite --baseline benchmarks/baseline.json --threshold 0.2
+
+The check exits with status 1 when throughput falls, or p50/p95 latency or
+peak RSS grow, by more than the threshold. Baselines only compare between runs
+with the same options on the same machine; on a busy or shared machine, use
+--rounds 3 or more so that the best of each metric is compared.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import math
+import multiprocessing
+import os
+import platform
+import resource
+import socket
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+from benchmarks.synthetic import write_synthetic_video
+
+# Metric, and whether a larger value is better
+COMPARED_METRICS = [("throughput", True), ("p50_ms", False), ("p95_ms", False), ("peak_rss_mb", False)]
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile, the same on every run for the same samples"""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(q * len(ordered)) - 1, 0)]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    )
+    return round(peak * scale / 1024 / 1024, 1)
+
+
+async def measure(call, repeats: int, warmup: int) -> List[float]:
+    """Latencies of ``repeats`` awaited calls, after ``warmup`` unmeasured ones fill caches and pools"""
+    for _ in range(warmup):
+        await call()
+    latencies = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        await call()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def summarize(latencies: List[float], items: float, elapsed: float, unit: str) -> dict:
+    return {
+        "runs": len(latencies),
+        "throughput": round(items / elapsed, 3) if elapsed else 0.0,
+        "unit": unit,
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+
+def bench_process_video(video_path: str, frame_interval: int, repeats: int, warmup: int) -> Tuple[str, dict]:
+    from app.models.schemas.video import VideoCreate, VideoSource
+    from app.services.video.video_service import VideoService
+
+    async def run():
+        service = VideoService()
+        video_create = VideoCreate(title=Path(video_path).stem, source=VideoSource.UPLOAD, frame_interval=frame_interval)
+        video = await service.create_video(video_create, Path(video_path), frame_interval)
+        frame_counts = []
+
+        async def extract():
+            # Re-extracting overwrites the same frames and records
+            frame_count, _ = await service.process_video(video)
+            frame_counts.append(frame_count)
+
+        latencies = await measure(extract, repeats, warmup)
+        if not frame_counts[-1]:
+            raise RuntimeError(f"No frames extracted from {video_path}")
+        return video.id, summarize(latencies, frame_counts[-1] * repeats, sum(latencies), "frames/s")
+
+    return asyncio.run(run())
+
+
+def bench_get_frames(video_id: str, repeats: int, warmup: int) -> dict:
+    from app.services.frame.frame_service import FrameService
+
+    async def run():
+        service = FrameService()
+        latencies = await measure(lambda: service.get_frames_by_video_id(video_id), repeats, warmup)
+        return summarize(latencies, repeats, sum(latencies), "lookups/s")
+
+    return asyncio.run(run())
+
+
+def _batch_analysis(frame_ids: List[str], video_id: str):
+    from app.models.schemas.frame import FrameBatchAnalysis
+
+    return FrameBatchAnalysis(
+        video_id=video_id,
+        frame_ids=frame_ids,
+        analysis_type="default",
+        sequence_prompt="Describe the chickens' behaviour.",
+        description="Synthetic benchmark",
+        messages=[],
+        model="gpt-4o-mini",
+        language="English",
+        bypass_cache=True
+    )
+
+
+async def _frame_ids(video_id: str, batch_size: int) -> List[str]:
+    from app.services.frame.frame_service import FrameService
+
+    frames = await FrameService().get_frames_by_video_id(video_id)
+    return [frame.frame_key for frame in frames[:batch_size]]
+
+
+def bench_process_frames_batch(video_id: str, batch_size: int, repeats: int, warmup: int) -> dict:
+    from app.services.frame.frame_service import FrameService
+
+    async def run():
+        service = FrameService()
+        batch = _batch_analysis(await _frame_ids(video_id, batch_size), video_id)
+
+        async def encode():
+            frames = await service.process_frames_batch(batch)
+            if len(frames) != len(batch.frame_ids):
+                raise RuntimeError(f"Encoded {len(frames)} of {len(batch.frame_ids)} frames")
+
+        latencies = await measure(encode, repeats, warmup)
+        return summarize(latencies, repeats, sum(latencies), "batches/s")
+
+    return asyncio.run(run())
+
+
+def bench_analyze(video_id: str, batch_size: int, requests: int, concurrency: int, warmup: int) -> dict:
+    import httpx
+
+    from app.api.controllers.frame_controller import openai_service
+    from app.main import app
+
+    async def run():
+        body = _batch_analysis(await _frame_ids(video_id, batch_size), video_id).model_dump()
+        limit = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async def one(client: httpx.AsyncClient, measured: bool = True):
+            async with limit:
+                started = time.perf_counter()
+                response = await client.post("/api/v1/frames/analyze", json=body)
+                if measured:
+                    latencies.append(time.perf_counter() - started)
+            if response.status_code != 200 or response.json().get("status") != "success":
+                raise RuntimeError(f"Analyze failed with {response.status_code}: {response.text[:200]}")
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            for _ in range(warmup):
+                await one(client, measured=False)
+            started = time.perf_counter()
+            await asyncio.gather(*(one(client) for _ in range(requests)))
+            elapsed = time.perf_counter() - started
+        await openai_service.aclose()
+        return summarize(latencies, requests, elapsed, "requests/s")
+
+    return asyncio.run(run())
+
+
+def _quietly(function, verbose: bool, *args):
+    if verbose:
+        return function(*args)
+    # The services print per frame and per request
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        return function(*args)
+
+
+def run_isolated(function, verbose: bool, *args):
+    """Run a benchmark in a fresh spawned process, so imports and peak RSS start from zero"""
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(_quietly, function, verbose, *args).result()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.contextmanager
+def stub_server(latency_ms: float) -> Iterator[str]:
+    """The OpenAI stub in a background thread, yields its base URL"""
+    os.environ["STUB_LATENCY_MS"] = str(latency_ms)
+    os.environ["STUB_LATENCY_PER_IMAGE_MS"] = "0"
+    os.environ["STUB_ERROR_RATE"] = "0"
+    import uvicorn
+
+    from benchmarks import stub_openai
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(stub_openai.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, name="openai-stub", daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        if not thread.is_alive() or time.monotonic() > deadline:
+            raise RuntimeError("The OpenAI stub did not start")
+        time.sleep(0.05)
+    try:
+        yield f"http://127.0.0.1:{port}/v1"
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+def run_suite(args, storage: Path, base_url: str) -> Dict[str, dict]:
+    os.environ.update({
+        "STORAGE_DIR": str(storage),
+        "VIDEO_DIR": str(storage / "videos"),
+        "FRAME_DIR": str(storage / "frames"),
+        "DATABASE_PATH": str(storage / "metadata.db"),
+        "OPENAI_API_KEY": "stub",
+        "OPENAI_BASE_URL": base_url,
+        # Rate limits would measure the token buckets rather than the code
+        "OPENAI_REQUESTS_PER_MINUTE": "0",
+        "OPENAI_TOKENS_PER_MINUTE": "0",
+        "REQUEST_TIMING_LOG": "false"
+    })
+    (storage / "videos").mkdir(parents=True)
+    (storage / "frames").mkdir()
+
+    results = {}
+    video_ids = []
+    for resolution in args.resolutions:
+        width, height = (int(value) for value in resolution.split("x"))
+        name = f"synthetic_{resolution}_{args.fps}fps_{args.duration:g}s"
+        video_path = write_synthetic_video(storage / "videos" / f"{name}.mp4", args.duration, args.fps, width, height)
+        video_id, result = run_isolated(
+            bench_process_video, args.verbose, str(video_path), args.interval, args.video_repeats, args.warmup
+        )
+        results[f"process_video[{resolution}]"] = result
+        video_ids.append(video_id)
+        report(f"process_video[{resolution}]", result)
+
+    # Frame and analysis benchmarks use the frames of the first video
+    video_id = video_ids[0]
+    benchmarks = [
+        ("get_frames_by_video_id", bench_get_frames, (video_id, args.repeats, args.warmup)),
+        ("process_frames_batch", bench_process_frames_batch, (video_id, args.batch_size, args.repeats, args.warmup)),
+        ("analyze", bench_analyze, (video_id, args.batch_size, args.requests, args.concurrency, args.warmup)),
+    ]
+    for name, function, function_args in benchmarks:
+        results[name] = run_isolated(function, args.verbose, *function_args)
+        report(name, results[name])
+    return results
+
+
+def report(name: str, result: dict):
+    print(
+        f"{name:<32} {result['throughput']:>10.2f} {result['unit']:<11} p50 {result['p50_ms']:>9.2f} ms  "
+        f"p95 {result['p95_ms']:>9.2f} ms  peak RSS {result['peak_rss_mb']:>7.1f} MB  ({result['runs']} runs)"
+    )
+
+
+def best_of(rounds: List[Dict[str, dict]]) -> Dict[str, dict]:
+    """Best value of every metric over several rounds, which filters out machine noise"""
+    best = {}
+    for name in rounds[0]:
+        best[name] = dict(rounds[0][name])
+        for metric, higher_is_better in COMPARED_METRICS:
+            values = [results[name][metric] for results in rounds]
+            best[name][metric] = max(values) if higher_is_better else min(values)
+    return best
+
+
+def compare(results: Dict[str, dict], baseline: dict, threshold: float) -> List[str]:
+    """Print the change of every metric against ``baseline``, returns the regressions"""
+    regressions = []
+    print(f"\n{'benchmark':<32} {'metric':<12} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, result in results.items():
+        previous = baseline["results"].get(name)
+        if previous is None:
+            print(f"{name:<32} not in the baseline")
+            continue
+        for metric, higher_is_better in COMPARED_METRICS:
+            old, new = previous[metric], result[metric]
+            change = (new - old) / old if old else 0.0
+            regressed = change < -threshold if higher_is_better else change > threshold
+            flag = "  REGRESSION" if regressed else ""
+            print(f"{name:<32} {metric:<12} {old:>10.2f} {new:>10.2f} {change:>+7.1%}{flag}")
+            if regressed:
+                regressions.append(f"{name} {metric}: {old} -> {new} ({change:+.1%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of each synthetic video")
+    parser.add_argument("--resolutions", nargs="+", default=["640x360", "1280x720"])
+    parser.add_argument("--fps", type=int, default=25)
+    parser.add_argument("--interval", type=int, default=1, help="Seconds between extracted frames")
+    parser.add_argument("--video-repeats", type=int, default=3, help="Extractions of each video")
+    parser.add_argument("--repeats", type=int, default=200, help="Calls per frame service benchmark")
+    parser.add_argument("--batch-size", type=int, default=12, help="Frames per batch and analyze request")
+    parser.add_argument("--requests", type=int, default=24, help="Analyze requests")
+    parser.add_argument("--concurrency", type=int, default=4, help="Analyze requests in flight")
+    parser.add_argument("--rounds", type=int, default=1, help="Runs of the whole suite, the best of each metric counts")
+    parser.add_argument("--warmup", type=int, default=1, help="Unmeasured calls before each benchmark")
+    parser.add_argument("--stub-latency-ms", type=float, default=50, help="Response time of the OpenAI stub")
+    parser.add_argument("--baseline", type=Path, help="Baseline to check this run against")
+    parser.add_argument("--save-baseline", type=Path, help="Write this run's results as a baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative change counted as a regression")
+    parser.add_argument("--verbose", action="store_true", help="Show what the services print")
+    args = parser.parse_args()
+
+    # Everything that changes the work done, baselines only compare between equal configs
+    config = {
+        key: getattr(args, key)
+        for key in (
+            "duration", "resolutions", "fps", "interval", "video_repeats", "repeats", "warmup",
+            "batch_size", "requests", "concurrency", "stub_latency_ms"
+        )
+    }
+    baseline = None
+    if args.baseline is not None:
+        baseline = json.loads(args.baseline.read_text())
+        if baseline["config"] != config:
+            parser.error(f"{args.baseline} was recorded with different options: {baseline['config']}")
+
+    rounds = []
+    with stub_server(args.stub_latency_ms) as base_url:
+        for round_number in range(args.rounds):
+            if args.rounds > 1:
+                print(f"Round {round_number + 1} of {args.rounds}")
+            with tempfile.TemporaryDirectory(prefix="benchmark-") as directory:
+                rounds.append(run_suite(args, Path(directory), base_url))
+    results = best_of(rounds)
+
+    if args.save_baseline is not None:
+        args.save_baseline.write_text(json.dumps({
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "machine": {
+                "platform": platform.platform(),
+                "python": platform.python_version(),
+                "cpus": os.cpu_count()
+            },
+            "config": config,
+            "results": results
+        }, indent=2) + "\n")
+        print(f"\nBaseline written to {args.save_baseline}")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regressions beyond {args.threshold:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+"""Synthetic test videos, identical for the same arguments on every run"""
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+
+def write_synthetic_video(path: Path, seconds: float, fps: int, width: int, height: int) -> Path:
+    """
+    Write an mp4v video with cv2.VideoWriter: a fixed noise background and a
+    few moving blobs standing in for chickens, so frames differ and compress
+    like real footage rather than a flat colour.
+    """
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    if not writer.isOpened():
+        raise RuntimeError(f"Could not open a video writer for {path}")
+    rng = np.random.default_rng(0)
+    background = rng.integers(60, 120, (height, width, 3), dtype=np.uint8)
+    radius = max(height // 12, 4)
+    try:
+        for index in range(int(seconds * fps)):
+            frame = background.copy()
+            for blob in range(3):
+                x = int((index * 4 + blob * width / 3) % width)
+                y = int(height / 2 + height / 4 * np.sin(index / (fps or 1) + blob))
+                cv2.circle(frame, (x, y), radius, (230, 230, 230), -1)
+            writer.write(frame)
+    finally:
+        writer.release()
+    return path
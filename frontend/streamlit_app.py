@@ -1,16 +1,39 @@
 import streamlit as st
 import requests
+import json
 import time
+import uuid
 from pathlib import Path
 
 # API Configuration
 API_URL = "http://localhost:8000/api/v1"
+# Thumbnails rendered per page of the frame grid
+FRAMES_PER_PAGE = 20
+# Larger pages when collecting every frame key of a time range for the chat
+FRAME_KEYS_PAGE_SIZE = 1000
 
-def upload_video(file, title, description, frame_interval):
-    files = {"file": file}
-    params = {"title": title, "description": description, "frame_interval": frame_interval}
+@st.cache_resource
+def get_http_session():
+    """One pooled HTTP session shared across reruns, so API requests reuse connections"""
+    return requests.Session()
+
+def upload_video(file, title, description, frame_interval, sampling_mode="interval", frame_format="jpeg"):
+    params = {
+        "filename": file.name,
+        "title": title,
+        "description": description,
+        "frame_interval": frame_interval,
+        "sampling_mode": sampling_mode,
+        "frame_format": frame_format
+    }
     try:
-        response = requests.post(f"{API_URL}/videos/upload", files=files, params=params)
+        # Sent as the raw body, so the API can write it to disk while it arrives
+        response = get_http_session().post(
+            f"{API_URL}/videos/upload/raw",
+            data=file,
+            params=params,
+            headers={"Content-Type": "application/octet-stream"}
+        )
         response.raise_for_status()
     except requests.exceptions.RequestException as e:
         raise Exception(f"Failed to upload video: {str(e)}")
@@ -18,25 +41,87 @@ def upload_video(file, title, description, frame_interval):
     print(response.json())
     return response.json()
 
-def process_youtube_video(url, title, description, frame_interval):
+def process_youtube_video(url, title, description, frame_interval, sampling_mode="interval", frame_format="jpeg"):
     data = {
         "title": title,
         "description": description,
         "source": "youtube",
         "youtube_url": url,
-        "frame_interval": frame_interval
+        "frame_interval": frame_interval,
+        "sampling_mode": sampling_mode,
+        "frame_format": frame_format
     }
-    response = requests.post(f"{API_URL}/videos/youtube", json=data)
+    response = get_http_session().post(f"{API_URL}/videos/youtube", json=data)
     return response.json()
 
 def get_video_status(video_id):
-    response = requests.get(f"{API_URL}/videos/{video_id}/status")
+    response = get_http_session().get(f"{API_URL}/videos/{video_id}/status")
     return response.json()
 
-def get_video_frames(video_id):
-    response = requests.get(f"{API_URL}/videos/{video_id}/frames")
+def stream_video_status(video_id):
+    """Subscribe once to the status event stream instead of polling /status"""
+    with get_http_session().get(f"{API_URL}/videos/{video_id}/events", stream=True, timeout=(5, 60)) as response:
+        response.raise_for_status()
+        for line in response.iter_lines(decode_unicode=True):
+            if line and line.startswith("data: "):
+                yield json.loads(line[len("data: "):])
+
+def reset_frame_cache(video_id):
+    """Drop the pages and images of the previously shown video"""
+    if st.session_state.get("frames_video_id") != video_id:
+        st.session_state.frames_video_id = video_id
+        st.session_state.frame_pages = {}
+        st.session_state.frame_images = {}
+        st.session_state.frame_cursors = [None]
+
+def get_frames_page(video_id, cursor=None, start=None, end=None, limit=FRAMES_PER_PAGE):
+    """One page of frame metadata, fetched once per video as the frames don't change after processing"""
+    cache = st.session_state.setdefault("frame_pages", {})
+    key = (video_id, cursor, start, end, limit)
+    if key not in cache:
+        params = {"cursor": cursor, "start": start, "end": end, "limit": limit}
+        response = get_http_session().get(
+            f"{API_URL}/frames/{video_id}/page",
+            params={name: value for name, value in params.items() if value is not None}
+        )
+        response.raise_for_status()
+        cache[key] = response.json()
+    return cache[key]
+
+def get_frame_keys(video_id, start=None, end=None):
+    """Keys of every frame in the time range, for questions about it"""
+    keys, cursor = [], None
+    while True:
+        page = get_frames_page(video_id, cursor, start, end, limit=FRAME_KEYS_PAGE_SIZE)
+        keys.extend(frame["frame_key"] for frame in page["frames"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            return keys
+
+def get_frame_image(video_id, frame_key, size="thumb"):
+    """Frame JPEG bytes from the API, revalidated with the cached ETag on reruns"""
+    cache = st.session_state.setdefault("frame_images", {})
+    url = f"{API_URL}/frames/{video_id}/{frame_key}/image"
+    cached = cache.get((url, size))
+    headers = {"If-None-Match": cached[0]} if cached else {}
+    
+    response = get_http_session().get(url, params={"size": size}, headers=headers)
+    if response.status_code == 304 and cached:
+        return cached[1]
+    response.raise_for_status()
+    cache[(url, size)] = (response.headers.get("ETag"), response.content)
+    return response.content
+
+def request_captions(video_id, language):
+    """Have the API describe every frame once in the background, follow-up questions search these captions"""
+    response = get_http_session().post(f"{API_URL}/frames/{video_id}/captions", params={"language": language}, timeout=10)
+    response.raise_for_status()
     return response.json()
 
+def is_follow_up(messages):
+    # The first question looks at every frame, later ones only at the frames they are about
+    return any(message["role"] == "assistant" for message in messages)
+
 def analyze_frames(session_state, frame_ids, sequence_prompt, description):
     video_id = session_state.video_id
     messages = session_state.messages
@@ -50,13 +135,42 @@ def analyze_frames(session_state, frame_ids, sequence_prompt, description):
         "sequence_prompt": sequence_prompt,
         "description": description,
         "messages": messages,
+        "conversation_id": session_state.get("conversation_id"),
+        "retrieve_frames": is_follow_up(messages),
         "model": model,
         "language": language
     }
     print("data", data)
-    response = requests.post(f"{API_URL}/frames/analyze", json=data)
+    response = get_http_session().post(f"{API_URL}/frames/analyze", json=data)
     return response.json()
 
+def analyze_frames_stream(session_state, frame_ids, sequence_prompt, description, result):
+    """Yield the answer text as it streams in, the final result is stored in ``result``"""
+    data = {
+        "video_id": session_state.video_id,
+        "frame_ids": frame_ids,
+        "analysis_type": "default",
+        "sequence_prompt": sequence_prompt,
+        "description": description,
+        "messages": session_state.messages,
+        "conversation_id": session_state.get("conversation_id"),
+        "retrieve_frames": is_follow_up(session_state.messages),
+        "model": session_state.model,
+        "language": session_state.language
+    }
+    with get_http_session().post(f"{API_URL}/frames/analyze/stream", json=data, stream=True, timeout=(5, 300)) as response:
+        response.raise_for_status()
+        event = None
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                payload = json.loads(line[len("data: "):])
+                if event == "delta":
+                    yield payload["content"]
+                elif event in ("done", "error"):
+                    result.update(payload)
+
 # Streamlit UI
 st.title("Video Processing Dashboard")
 
@@ -77,6 +191,24 @@ frame_interval = st.sidebar.number_input(
 # Store language in session state
 st.session_state.frame_interval = frame_interval
 
+# Add sampling selection
+sampling_mode = st.sidebar.selectbox(
+    "Select frame sampling",
+    ("interval", "scene"),
+    format_func=lambda mode: "Fixed interval" if mode == "interval" else "Scene changes and motion",
+    help="Scene sampling keeps a frame only when the picture changes, the interval is ignored"
+)
+st.session_state.sampling_mode = sampling_mode
+
+# Add frame image format selection
+frame_format = st.sidebar.selectbox(
+    "Select frame image format",
+    ("jpeg", "webp"),
+    format_func=str.upper,
+    help="WebP frames take less disk space than JPEG at similar quality"
+)
+st.session_state.frame_format = frame_format
+
 
 # Add language selection
 language = st.sidebar.selectbox(
@@ -113,7 +245,11 @@ if upload_option == "Upload Video File":
                     print("uploaded_file", uploaded_file)
                     print("title", title)
                     print("description", description)
-                    result = upload_video(uploaded_file, title, description, st.session_state.frame_interval)
+                    result = upload_video(
+                        uploaded_file, title, description,
+                        st.session_state.frame_interval, st.session_state.sampling_mode,
+                        st.session_state.frame_format
+                    )
                     st.session_state.video_id = result["id"]
                     st.success("Video uploaded successfully!")
                 except Exception as e:
@@ -128,7 +264,11 @@ else:  # YouTube URL
         if st.button("Process Video"):
             with st.spinner("Processing YouTube video..."):
                 try:
-                    result = process_youtube_video(youtube_url, title, description, st.session_state.frame_interval)
+                    result = process_youtube_video(
+                        youtube_url, title, description,
+                        st.session_state.frame_interval, st.session_state.sampling_mode,
+                        st.session_state.frame_format
+                    )
                     st.session_state.video_id = result["id"]
                     st.success("YouTube video processing started!")
                 except Exception as e:
@@ -138,11 +278,20 @@ else:  # YouTube URL
 # Display processing status and frames
 if "video_id" in st.session_state:
     st.header("Processing Status")
-    status = get_video_status(st.session_state.video_id)
-    
     progress_bar = st.progress(0)
     status_text = st.empty()
     
+    # Only follow the event stream until processing ends, reruns reuse the final status
+    status = st.session_state.get("video_status")
+    if not status or status["video_id"] != st.session_state.video_id or status["status"] not in ("completed", "failed", "cancelled"):
+        try:
+            for status in stream_video_status(st.session_state.video_id):
+                progress_bar.progress(status["progress"] / 100)
+                status_text.text(f"Status: {status['status']} - {status['message']}")
+        except requests.exceptions.RequestException:
+            status = get_video_status(st.session_state.video_id)
+        st.session_state.video_status = status
+    
     # Update progress
     progress = status["progress"] / 100
     progress_bar.progress(progress)
@@ -150,18 +299,54 @@ if "video_id" in st.session_state:
     
     if status["status"] == "completed":
         st.header("Extracted Frames")
-        frames = get_video_frames(st.session_state.video_id)
+        video_id = st.session_state.video_id
+        reset_frame_cache(video_id)
+        if st.session_state.get("captioned_video_id") != st.session_state.video_id:
+            try:
+                request_captions(st.session_state.video_id, st.session_state.language)
+                st.session_state.captioned_video_id = st.session_state.video_id
+            except requests.exceptions.RequestException as e:
+                # Follow-up questions caption the frames they need instead
+                print(f"Failed to request frame captions: {str(e)}")
+
+        # Time range of the frames shown and asked about, an end of 0 means the end of the video
+        range_cols = st.columns(2)
+        start = range_cols[0].number_input("From (sec)", min_value=0.0, value=0.0, step=1.0)
+        end = range_cols[1].number_input("To (sec)", min_value=0.0, value=0.0, step=1.0)
+        start, end = start or None, end or None
+        if st.session_state.get("frame_range") != (start, end):
+            st.session_state.frame_range = (start, end)
+            st.session_state.frame_cursors = [None]
 
-        # Display frames in a grid
+        # Display one page of frames in a grid, only its thumbnails are fetched
+        cursors = st.session_state.frame_cursors
+        page = get_frames_page(video_id, cursors[-1], start, end)
+        total = get_frames_page(video_id, None, start, end)["total"]
         columns = 5
         cols = st.columns(columns)
-        for idx, frame_path in enumerate(frames):
+        for idx, frame in enumerate(page["frames"]):
             with cols[idx % columns]:
-                st.image(frame_path, caption=f"Frame {idx + 1}")
+                # Thumbnails come through the API, the storage volume is not needed here
+                st.image(
+                    get_frame_image(video_id, frame["frame_key"]),
+                    caption=f"Frame {frame['frame_number']} ({frame['timestamp']} sec)"
+                )
+
+        first = (len(cursors) - 1) * FRAMES_PER_PAGE
+        nav_cols = st.columns([1, 2, 1])
+        if nav_cols[0].button("Previous", disabled=len(cursors) == 1):
+            cursors.pop()
+            st.rerun()
+        nav_cols[1].caption(f"Frames {min(first + 1, total)}-{first + len(page['frames'])} of {total}")
+        if nav_cols[2].button("Next", disabled=not page["next_cursor"]):
+            cursors.append(page["next_cursor"])
+            st.rerun()
         
         # Initialize chat history in session state if it doesn't exist
         if "messages" not in st.session_state:
             st.session_state.messages = []
+            # Lets the API reuse its summary of older turns instead of resending them all
+            st.session_state.conversation_id = uuid.uuid4().hex
 
         # Display chat history
         for message in st.session_state.messages:
@@ -178,26 +363,31 @@ if "video_id" in st.session_state:
 
             # Generate and display assistant response
             with st.chat_message("assistant"):
-                with st.spinner("Analyzing ..."):
-                    frame_ids = [Path(frame).stem.split("_")[1] for frame in frames]
-                    analysis_results = analyze_frames(st.session_state, frame_ids, prompt, description)
-                    
-                    if analysis_results.get("status") == "success":
-                        analysis_text = analysis_results["sequence_analysis"]
-                        st.write(analysis_text)
-                        # Add assistant response to history
-                        st.session_state.messages.append({"role": "assistant", "content": analysis_text})
-                    else:
-                        error_message = f"Analysis failed: {analysis_results.get('error', 'Unknown error')}"
-                        st.error(error_message)
-                        # Add error message to history
-                        st.session_state.messages.append({"role": "assistant", "content": error_message})
+                frame_ids = get_frame_keys(video_id, start, end)
+                analysis_results = {}
+                try:
+                    # Render the answer token by token as the model writes it
+                    st.write_stream(
+                        analyze_frames_stream(st.session_state, frame_ids, prompt, description, analysis_results)
+                    )
+                except requests.exceptions.RequestException as e:
+                    analysis_results = {"status": "error", "error": str(e)}
+                
+                if analysis_results.get("status") == "success":
+                    # Add assistant response to history
+                    st.session_state.messages.append({"role": "assistant", "content": analysis_results["sequence_analysis"]})
+                else:
+                    error_message = f"Analysis failed: {analysis_results.get('error', 'Unknown error')}"
+                    st.error(error_message)
+                    # Add error message to history
+                    st.session_state.messages.append({"role": "assistant", "content": error_message})
         
         # Add a button to clear chat history
         if len(st.session_state.messages) > 0:
             if st.button("Clear Chat History", key="clear_chat"):
                 # Clear the messages from session state
                 st.session_state.messages = []
+                st.session_state.conversation_id = uuid.uuid4().hex
                 
                 # Display the previous chat history with a "Cleared" indicator
                 st.info("Chat history has been cleared")
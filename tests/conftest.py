@@ -0,0 +1,15 @@
+import pytest
+
+from app.core import database
+from app.core.config import settings
+
+
+@pytest.fixture(autouse=True)
+def metadata_db(tmp_path, monkeypatch):
+    """A fresh metadata database per test, created on first use like the real one"""
+    monkeypatch.setattr(settings, "DATABASE_PATH", tmp_path / "metadata.db")
+    monkeypatch.setattr(database, "_engine", None)
+    monkeypatch.setattr(database, "_session_factory", None)
+    yield
+    if database._engine is not None:
+        database._engine.dispose()
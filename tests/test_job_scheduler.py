@@ -0,0 +1,169 @@
+import threading
+from concurrent.futures import Future
+
+import pytest
+
+from app.core.config import settings
+from app.models.schemas.video import JobPriority
+from app.services.jobs.job_runner import PRIORITY_RANKS, ExtractionJob, ExtractionJobRunner, QueueFullError
+from app.services.jobs.job_state_service import JobStateService, JobStatus
+
+INTERACTIVE = PRIORITY_RANKS[JobPriority.INTERACTIVE]
+BULK = PRIORITY_RANKS[JobPriority.BULK]
+
+
+@pytest.fixture
+def jobs():
+    return JobStateService()
+
+
+@pytest.fixture
+def runner():
+    return ExtractionJobRunner(max_workers=2, max_queue_size=2)
+
+
+def dispatch(runner: ExtractionJobRunner, jobs: JobStateService, video_id: str, tenant: str = "default"):
+    """Mark a queued job as handed to a worker, without a process pool"""
+    jobs.start(video_id, frames_expected=10)
+    runner._jobs[video_id] = ExtractionJob(
+        video_id=video_id, tenant=tenant, future=Future(), cancel_event=threading.Event()
+    )
+
+
+def status_of(jobs: JobStateService, video_id: str) -> str:
+    return jobs.get_status(video_id).status
+
+
+def test_interactive_jobs_start_before_older_bulk_jobs(runner, jobs):
+    jobs.create("a-bulk", BULK)
+    jobs.create("b-interactive", INTERACTIVE)
+
+    assert runner._next_job().video_id == "b-interactive"
+
+
+def test_oldest_job_of_a_tenant_starts_first(runner, jobs):
+    jobs.create("a-first", INTERACTIVE)
+    jobs.create("b-second", INTERACTIVE)
+
+    assert runner._next_job().video_id == "a-first"
+
+
+def test_tenant_with_fewer_running_jobs_goes_first(runner, jobs):
+    jobs.create("a-1", BULK, tenant="backfill")
+    jobs.create("a-2", BULK, tenant="backfill")
+    jobs.create("b-1", BULK, tenant="other")
+    dispatch(runner, jobs, "a-1", tenant="backfill")
+
+    assert runner._next_job().video_id == "b-1"
+
+
+def test_tenants_take_turns_when_running_the_same_number_of_jobs(runner, jobs):
+    jobs.create("a-1", BULK, tenant="first")
+    jobs.create("b-1", BULK, tenant="second")
+    runner._last_started = {"first": 2.0, "second": 1.0}
+
+    # "second" was served least recently, although its job is younger
+    assert runner._next_job().video_id == "b-1"
+
+
+def test_tenant_limit_holds_back_a_tenants_jobs(runner, jobs, monkeypatch):
+    monkeypatch.setattr(settings, "EXTRACTION_TENANT_MAX_RUNNING", 1)
+    jobs.create("a-1", INTERACTIVE, tenant="busy")
+    jobs.create("a-2", INTERACTIVE, tenant="busy")
+    dispatch(runner, jobs, "a-1", tenant="busy")
+
+    assert runner._next_job() is None
+
+    jobs.create("b-1", BULK, tenant="idle")
+    assert runner._next_job().video_id == "b-1"
+
+
+def test_dispatched_and_finished_jobs_are_not_picked_again(runner, jobs):
+    jobs.create("a-1", INTERACTIVE)
+    jobs.create("b-1", INTERACTIVE)
+    jobs.create("c-1", INTERACTIVE)
+    dispatch(runner, jobs, "a-1")
+    jobs.finish("b-1", JobStatus.CANCELLED)
+
+    assert runner._next_job().video_id == "c-1"
+
+
+def test_has_capacity_counts_free_workers_and_queue_limit(runner, jobs):
+    # Two free workers and two queue places
+    for index in range(4):
+        assert runner.has_capacity(JobPriority.INTERACTIVE)
+        jobs.create(f"job-{index}", INTERACTIVE)
+    assert not runner.has_capacity(JobPriority.INTERACTIVE)
+
+    # Dispatched jobs leave the queue but take the workers
+    dispatch(runner, jobs, "job-0")
+    dispatch(runner, jobs, "job-1")
+    assert not runner.has_capacity(JobPriority.INTERACTIVE)
+
+
+def test_has_capacity_limits_each_priority_separately(runner, jobs):
+    runner.max_bulk_queue_size = 1
+    dispatch(runner, jobs, "busy-1")
+    dispatch(runner, jobs, "busy-2")
+
+    jobs.create("bulk-1", BULK)
+    assert not runner.has_capacity(JobPriority.BULK)
+    # A full bulk queue leaves interactive uploads their own places
+    assert runner.has_capacity(JobPriority.INTERACTIVE)
+
+    jobs.create("interactive-1", INTERACTIVE)
+    jobs.create("interactive-2", INTERACTIVE)
+    assert not runner.has_capacity(JobPriority.INTERACTIVE)
+
+
+def test_ensure_capacity_raises_when_full(runner, jobs):
+    for index in range(4):
+        jobs.create(f"job-{index}", INTERACTIVE)
+    with pytest.raises(QueueFullError):
+        runner.ensure_capacity(JobPriority.INTERACTIVE)
+
+
+def test_requeue_after_restart_takes_only_processing_jobs(jobs):
+    for video_id in ("processing", "completed", "cancelled", "waiting"):
+        jobs.create(video_id)
+    jobs.start("processing", frames_expected=10)
+    jobs.advance("processing", 4)
+    jobs.start("completed", frames_expected=10)
+    jobs.finish("completed", JobStatus.COMPLETED)
+    jobs.finish("cancelled", JobStatus.CANCELLED)
+
+    assert jobs.requeue() == 1
+    assert status_of(jobs, "processing") == JobStatus.PENDING
+    assert jobs.get_status("processing").frames_done == 0
+    assert status_of(jobs, "completed") == JobStatus.COMPLETED
+    assert status_of(jobs, "cancelled") == JobStatus.CANCELLED
+
+
+def test_requeue_of_given_jobs_never_restarts_completed_ones(jobs):
+    for video_id in ("interrupted", "stopped", "completed", "failed"):
+        jobs.create(video_id)
+        jobs.start(video_id, frames_expected=10)
+    jobs.finish("stopped", JobStatus.CANCELLED)
+    jobs.finish("completed", JobStatus.COMPLETED)
+    jobs.finish("failed", JobStatus.FAILED, error="broken")
+
+    assert jobs.requeue(["interrupted", "stopped", "completed", "failed"]) == 2
+    assert status_of(jobs, "interrupted") == JobStatus.PENDING
+    assert status_of(jobs, "stopped") == JobStatus.PENDING
+    assert status_of(jobs, "completed") == JobStatus.COMPLETED
+    assert status_of(jobs, "failed") == JobStatus.FAILED
+
+
+def test_shutdown_requeues_interrupted_jobs_only(runner, jobs):
+    for video_id in ("interrupted", "finished-meanwhile", "cancelled-by-user"):
+        jobs.create(video_id)
+        dispatch(runner, jobs, video_id)
+    jobs.finish("finished-meanwhile", JobStatus.COMPLETED)
+    runner._jobs["cancelled-by-user"].cancel_requested = True
+    jobs.finish("cancelled-by-user", JobStatus.CANCELLED)
+
+    runner.shutdown()
+
+    assert status_of(jobs, "interrupted") == JobStatus.PENDING
+    assert status_of(jobs, "finished-meanwhile") == JobStatus.COMPLETED
+    assert status_of(jobs, "cancelled-by-user") == JobStatus.CANCELLED
@@ -0,0 +1,67 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+from app.core.config import settings
+from app.models.schemas.video import VideoInDB, VideoSource
+from app.services.video.video_service import VideoService
+from benchmarks.synthetic import write_synthetic_video
+
+
+@pytest.fixture
+def video_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "FRAME_DIR", tmp_path / "frames")
+    settings.FRAME_DIR.mkdir()
+    # mp4v puts a keyframe every 12 frames, so 1s samples at 10fps share keyframes
+    return write_synthetic_video(tmp_path / "video.mp4", seconds=30, fps=10, width=160, height=120)
+
+
+def extract(video_id: str, video_file):
+    service = VideoService()
+    video = VideoInDB(
+        id=video_id,
+        title=video_id,
+        source=VideoSource.UPLOAD,
+        created_at=datetime.now(timezone.utc),
+        file_path=str(video_file),
+        frame_interval=1,
+    )
+    asyncio.run(service.process_video(video))
+    frames = asyncio.run(service.frame_service.get_frames_by_video_id(video_id))
+    return [(frame.timestamp, frame.frame_number, frame.frame_key) for frame in frames]
+
+
+@pytest.mark.parametrize("backend, keyframes_only", [("pyav", True), ("opencv", False)])
+def test_sharded_extraction_matches_single_threaded(video_file, monkeypatch, backend, keyframes_only):
+    if backend == "pyav":
+        pytest.importorskip("av")
+    monkeypatch.setattr(settings, "VIDEO_DECODER_BACKEND", backend)
+    monkeypatch.setattr(settings, "VIDEO_DECODER_KEYFRAMES_ONLY", keyframes_only)
+    monkeypatch.setattr(settings, "EXTRACTION_SHARD_MIN_DURATION", 0)
+    monkeypatch.setattr(settings, "EXTRACTION_MIN_SAMPLES_PER_SHARD", 1)
+    monkeypatch.setattr("os.sched_getaffinity", lambda pid: set(range(4)), raising=False)
+
+    monkeypatch.setattr(settings, "EXTRACTION_SHARDING", False)
+    single = extract("single", video_file)
+    monkeypatch.setattr(settings, "EXTRACTION_SHARDING", True)
+    sharded = extract("sharded", video_file)
+
+    assert [number for _, number, _ in single] == list(range(1, len(single) + 1))
+    assert sharded == single
+
+
+def test_shard_count_leaves_a_core_to_every_other_running_job(monkeypatch):
+    monkeypatch.setattr("os.sched_getaffinity", lambda pid: set(range(8)), raising=False)
+    monkeypatch.setattr(settings, "EXTRACTION_MAX_SHARDS", None)
+    service = VideoService()
+    service.job_state_service.start("this-job", frames_expected=1000)
+
+    assert service._shard_count(3600, 1000) == 8
+
+    for index in range(3):
+        service.job_state_service.start(f"other-{index}", frames_expected=1000)
+    assert service._shard_count(3600, 1000) == 5
+
+    monkeypatch.setattr(settings, "EXTRACTION_MAX_SHARDS", 2)
+    assert service._shard_count(3600, 1000) == 2